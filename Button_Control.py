@@ -1,11 +1,40 @@
 # Button_Control.py - 按鍵定義與消抖工具集中管理
 # 提供按鍵腳位、彈跳處理與長按偵測，主程式僅需匯入使用。
+# init_irq() 後改為中斷驅動：腳位變化由 IRQ 推入預先配置的環形佇列，
+# 主迴圈只需 pop_event() 取出 press/release/hold/repeat 事件，不再輪詢或等待放開。
+# 每顆鍵各自有消抖、長按與自動連發狀態，互不干擾。
 
 import time
+from array import array
 from machine import Pin
 
-DEBOUNCE_MS = 160
-KEYHOLD_MS = 600
+import metrics
+
+try:
+    from config import (
+        KEY_DEBOUNCE_MS,
+        KEY_HOLD_MS,
+        KEY_REPEAT_DELAY_MS,
+        KEY_REPEAT_START_MS,
+        KEY_REPEAT_MIN_MS,
+        KEY_REPEAT_ACCEL_PCT,
+        KEY_REPEAT_KEYS,
+    )
+except ImportError:
+    KEY_DEBOUNCE_MS = 30
+    KEY_HOLD_MS = 600
+    KEY_REPEAT_DELAY_MS = 400
+    KEY_REPEAT_START_MS = 180
+    KEY_REPEAT_MIN_MS = 40
+    KEY_REPEAT_ACCEL_PCT = 80
+    KEY_REPEAT_KEYS = ("UP", "DN", "LEFT", "RIGHT", "A")
+
+DEBOUNCE_MS = KEY_DEBOUNCE_MS  # 同一顆鍵兩次電位變化的最短間隔（接點彈跳）
+KEYHOLD_MS = KEY_HOLD_MS  # 按住多久送出 HOLD
+REPEAT_DELAY_MS = KEY_REPEAT_DELAY_MS  # 按住多久開始自動連發
+REPEAT_START_MS = KEY_REPEAT_START_MS  # 第一次連發間隔
+REPEAT_MIN_MS = KEY_REPEAT_MIN_MS  # 連發間隔下限
+REPEAT_ACCEL_PCT = max(1, min(100, KEY_REPEAT_ACCEL_PCT))  # 每次連發後間隔乘上此百分比（越小加速越快）
 
 # 按鍵腳位（X/Y 取代左右）
 keyA = Pin(15, Pin.IN, Pin.PULL_UP)  # Home: Scan；Connect: DEL
@@ -18,41 +47,12 @@ keyLEFT = Pin(16, Pin.IN, Pin.PULL_UP)  # Move Left
 keyRIGHT = Pin(20, Pin.IN, Pin.PULL_UP)  # Move Right
 keyCTRL = Pin(3, Pin.IN, Pin.PULL_UP)  # Connect: Hold 600ms is OK
 
-_last = 0
-
 
 def pressed(p: Pin) -> bool:
     """判斷按鍵是否被按下（低電位觸發）。"""
     return p.value() == 0
 
 
-def wait_release(p: Pin, timeout_ms: int = KEYHOLD_MS) -> None:
-    """等待按鍵放開，避免誤觸。"""
-    t0 = time.ticks_ms()
-    while pressed(p) and time.ticks_diff(time.ticks_ms(), t0) < timeout_ms:
-        time.sleep_ms(5)
-
-
-def debounce() -> bool:
-    """簡易消抖：距離上次按鍵若未滿 DEBOUNCE_MS 則忽略。"""
-    global _last
-    now = time.ticks_ms()
-    if time.ticks_diff(now, _last) < DEBOUNCE_MS:
-        return False
-    _last = now
-    return True
-
-
-def key_hold() -> bool:
-    """長按檢查：距離上次紀錄滿 KEYHOLD_MS 才回 True。"""
-    global _last
-    now = time.ticks_ms()
-    if time.ticks_diff(now, _last) < KEYHOLD_MS:
-        return False
-    _last = now
-    return True
-
-
 # 方便主程式集中管理的按鍵列表
 KEYS = {
     "A": keyA,
@@ -65,3 +65,141 @@ KEYS = {
     "RIGHT": keyRIGHT,
     "CTRL": keyCTRL,
 }
+
+
+# =============== 中斷驅動事件佇列 ===============
+EV_PRESS = 1
+EV_RELEASE = 2
+EV_HOLD = 3
+EV_REPEAT = 4
+
+# 事件以索引表示按鍵，KEY_NAMES[i] 為名稱
+KEY_NAMES = ("A", "B", "X", "Y", "UP", "DN", "LEFT", "RIGHT", "CTRL")
+_PINS = tuple(KEYS[n] for n in KEY_NAMES)
+_NKEYS = len(KEY_NAMES)
+
+QUEUE_LEN = 32  # 2 的次方，方便以位元遮罩取餘數
+_q_key = bytearray(QUEUE_LEN)
+_q_ev = bytearray(QUEUE_LEN)
+_q_t = array("i", [0] * QUEUE_LEN)
+_q_head = 0  # 下一個要讀的位置
+_q_tail = 0  # 下一個要寫的位置
+
+# ---------- 每顆鍵的狀態機 ----------
+_down = bytearray(_NKEYS)  # 1=目前按住（已消抖）
+_down_t = array("i", [0] * _NKEYS)  # 按下時間（ticks_ms）
+_edge_t = array("i", [0] * _NKEYS)  # 上次接受的電位變化時間
+_unsettled = bytearray(_NKEYS)  # 消抖期間有被忽略的變化，需事後補判電位
+_hold_sent = bytearray(_NKEYS)  # 本次按住是否已送出 HOLD
+_next_rep = array("i", [0] * _NKEYS)  # 下次連發時間
+_rep_iv = array("H", [0] * _NKEYS)  # 目前連發間隔
+# 按住時自動連發的鍵（KEY_REPEAT_KEYS）
+_repeat_on = bytearray(1 if n in KEY_REPEAT_KEYS else 0 for n in KEY_NAMES)
+_irq_ready = False
+
+
+def _push(i: int, ev: int, t: int) -> None:
+    """寫入佇列（只在 IRQ 中呼叫，主迴圈只移動 head，單寫單讀免鎖）；滿了就丟棄並計數（metrics.KEY_DROPPED）。"""
+    global _q_tail
+    nxt = (_q_tail + 1) & (QUEUE_LEN - 1)
+    if nxt == _q_head:
+        metrics.inc(metrics.KEY_DROPPED)
+        return
+    _q_key[_q_tail] = i
+    _q_ev[_q_tail] = ev
+    _q_t[_q_tail] = t
+    _q_tail = nxt
+
+
+def _set_state(i: int, down: int, now: int) -> bool:
+    """更新第 i 顆鍵的消抖後狀態；狀態有變才回 True。"""
+    if down == _down[i]:
+        return False
+    _down[i] = down
+    _edge_t[i] = now
+    if down:
+        _down_t[i] = now
+        _hold_sent[i] = 0
+        _next_rep[i] = time.ticks_add(now, REPEAT_DELAY_MS)
+        _rep_iv[i] = REPEAT_START_MS
+    return True
+
+
+def _on_edge(i: int) -> None:
+    """腳位變化：消抖窗口內的變化先記下，之後由 pop_event() 補判最終電位。"""
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _edge_t[i]) < DEBOUNCE_MS:
+        _unsettled[i] = 1
+        return
+    _unsettled[i] = 0
+    down = 1 if _PINS[i].value() == 0 else 0
+    if _set_state(i, down, now):
+        _push(i, EV_PRESS if down else EV_RELEASE, now)
+
+
+def _make_handler(i: int):
+    # 每顆鍵一個閉包，只在 init_irq() 建立一次
+    def handler(_pin):
+        _on_edge(i)
+
+    return handler
+
+
+def init_irq() -> None:
+    """註冊所有按鍵的上下緣中斷（soft IRQ，於 VM 排程中執行）。"""
+    global _irq_ready
+    if _irq_ready:
+        return
+    now = time.ticks_ms()
+    for i, p in enumerate(_PINS):
+        # 開機時已按住的鍵也要記錄（不送 PRESS），避免之後只收到 release
+        _edge_t[i] = time.ticks_add(now, -DEBOUNCE_MS)
+        _set_state(i, 1 if p.value() == 0 else 0, now)
+        p.irq(handler=_make_handler(i), trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+    _irq_ready = True
+
+
+def pop_event(now=None):
+    """取出一個事件 (key_name, ev, ticks_ms)，都沒有回 None。
+    佇列空時才處理時間驅動的事件：消抖後補判、HOLD、自動連發（這些沒有電位變化，IRQ 無從得知）。"""
+    global _q_head
+    if _q_head != _q_tail:
+        h = _q_head
+        ev = (KEY_NAMES[_q_key[h]], _q_ev[h], _q_t[h])
+        _q_head = (h + 1) & (QUEUE_LEN - 1)
+        return ev
+    if now is None:
+        now = time.ticks_ms()
+    for i in range(_NKEYS):
+        if _unsettled[i] and time.ticks_diff(now, _edge_t[i]) >= DEBOUNCE_MS:
+            # 消抖期間曾被忽略的變化：以目前電位為準補送事件
+            _unsettled[i] = 0
+            down = 1 if _PINS[i].value() == 0 else 0
+            if _set_state(i, down, now):
+                return (KEY_NAMES[i], EV_PRESS if down else EV_RELEASE, now)
+        if not _down[i]:
+            continue
+        if not _hold_sent[i] and time.ticks_diff(now, _down_t[i]) >= KEYHOLD_MS:
+            _hold_sent[i] = 1
+            return (KEY_NAMES[i], EV_HOLD, now)
+        if _repeat_on[i] and time.ticks_diff(now, _next_rep[i]) >= 0:
+            iv = _rep_iv[i]
+            _next_rep[i] = time.ticks_add(now, iv)
+            _rep_iv[i] = max(REPEAT_MIN_MS, iv * REPEAT_ACCEL_PCT // 100)
+            return (KEY_NAMES[i], EV_REPEAT, now)
+    return None
+
+
+def is_down(name: str) -> bool:
+    """依 IRQ 記錄的狀態判斷按鍵是否按住。"""
+    return bool(_down[KEY_NAMES.index(name)])
+
+
+def held_ms(name: str, now=None) -> int:
+    """按鍵已按住多久（毫秒）；未按住回 0。"""
+    i = KEY_NAMES.index(name)
+    if not _down[i]:
+        return 0
+    if now is None:
+        now = time.ticks_ms()
+    return time.ticks_diff(now, _down_t[i])
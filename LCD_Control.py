@@ -1,14 +1,21 @@
 # LCD_Control.py - LCD 驅動 + 控制輔助整合版
 # 已將 pico_lcd_1_3 原始驅動合併進來，對外僅需匯入 lcd、顏色與繪圖小工具即可。
 
+import time
 from array import array
 from machine import Pin, SPI, PWM
 import framebuf
 
+import metrics
+
 try:
     from config import FORCE_HEADLESS
 except ImportError:
     FORCE_HEADLESS = False
+try:
+    from config import LCD_MAX_FPS
+except ImportError:
+    LCD_MAX_FPS = 30
 
 # =============== LCD 硬體腳位 ===============
 BL = 13
@@ -49,6 +56,9 @@ class _DummyLCD:
     def show(self, *args, **kwargs):
         pass
 
+    def show_region(self, *args, **kwargs):
+        pass
+
 
 class LCD_1inch3(framebuf.FrameBuffer):
     """Pico-LCD-1.3 的驅動實作，直接繼承 FrameBuffer。"""
@@ -66,6 +76,9 @@ class LCD_1inch3(framebuf.FrameBuffer):
         self.dc = Pin(DC, Pin.OUT)
         self.dc(1)
         self.buffer = bytearray(self.height * self.width * 2)
+        self._mv = memoryview(self.buffer)
+        self._win = bytearray(4)
+        self._byte = bytearray(1)  # write_cmd / write_data 共用的單一位元組緩衝
         super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
         self.init_display()
 
@@ -73,14 +86,18 @@ class LCD_1inch3(framebuf.FrameBuffer):
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        b = self._byte
+        b[0] = cmd
+        self.spi.write(b)
         self.cs(1)
 
     def write_data(self, buf):
         self.cs(1)
         self.dc(1)
         self.cs(0)
-        self.spi.write(bytearray([buf]))
+        b = self._byte
+        b[0] = buf
+        self.spi.write(b)
         self.cs(1)
 
     def init_display(self):
@@ -164,26 +181,65 @@ class LCD_1inch3(framebuf.FrameBuffer):
         self.write_cmd(0x11)
         self.write_cmd(0x29)
 
-    def show(self):
-        """將 frame buffer 寫入螢幕。"""
+    def _set_window(self, x0, y0, x1, y1):
+        """設定 CASET/RASET 寫入視窗（含端點），接著送 RAMWR。"""
+        win = self._win
         self.write_cmd(0x2A)
-        self.write_data(0x00)
-        self.write_data(0x00)
-        self.write_data(0x00)
-        self.write_data(0xEF)
+        win[0] = x0 >> 8
+        win[1] = x0 & 0xFF
+        win[2] = x1 >> 8
+        win[3] = x1 & 0xFF
+        self._write_buf(win)
 
         self.write_cmd(0x2B)
-        self.write_data(0x00)
-        self.write_data(0x00)
-        self.write_data(0x00)
-        self.write_data(0xEF)
+        win[0] = y0 >> 8
+        win[1] = y0 & 0xFF
+        win[2] = y1 >> 8
+        win[3] = y1 & 0xFF
+        self._write_buf(win)
 
         self.write_cmd(0x2C)
 
+    def _write_buf(self, buf):
         self.cs(1)
         self.dc(1)
         self.cs(0)
-        self.spi.write(self.buffer)
+        self.spi.write(buf)
+        self.cs(1)
+
+    def show(self):
+        """將 frame buffer 寫入螢幕。"""
+        self._set_window(0, 0, self.width - 1, self.height - 1)
+        self._write_buf(self.buffer)
+
+    def show_region(self, x, y, w, h):
+        """只送出指定矩形區域（局部刷新），大幅減少 SPI 傳輸量。"""
+        if x < 0:
+            w += x
+            x = 0
+        if y < 0:
+            h += y
+            y = 0
+        w = min(w, self.width - x)
+        h = min(h, self.height - y)
+        if w <= 0 or h <= 0:
+            return
+        self._set_window(x, y, x + w - 1, y + h - 1)
+        stride = self.width * 2
+        mv = self._mv
+        self.cs(1)
+        self.dc(1)
+        self.cs(0)
+        if w == self.width:
+            # 整列寬度：記憶體連續，一次送完
+            self.spi.write(mv[y * stride : (y + h) * stride])
+        else:
+            # 部分寬度：逐列送出該列的片段（memoryview 切片不配置新緩衝）
+            off = y * stride + x * 2
+            n = w * 2
+            for _ in range(h):
+                self.spi.write(mv[off : off + n])
+                off += stride
         self.cs(1)
 
 
@@ -217,6 +273,76 @@ else:
 
 _HAS_POLY = hasattr(lcd, "poly")
 
+# =============== 畫面排程（合併刷新） ===============
+# UI 只呼叫 mark_dirty() 標記需要更新的區域；主迴圈每輪呼叫一次 present()，
+# 最多依 LCD_MAX_FPS 送出一次 SPI，同一輪的多次繪圖自動合併。
+_MAX_RECTS = 4
+_dirty = array("h", [0] * (_MAX_RECTS * 4))  # x0, y0, x1, y1（不含端點）
+_dirty_n = 0
+_frame_interval_ms = 1000 // LCD_MAX_FPS if LCD_MAX_FPS > 0 else 0
+_last_frame_ms = 0
+
+
+def mark_dirty(x: int = 0, y: int = 0, w: int = W, h: int = H) -> None:
+    """標記需要刷新的矩形；超過 _MAX_RECTS 個時合併成外框。"""
+    global _dirty_n
+    x0 = max(0, x)
+    y0 = max(0, y)
+    x1 = min(W, x + w)
+    y1 = min(H, y + h)
+    if x1 <= x0 or y1 <= y0:
+        return
+    d = _dirty
+    for i in range(0, _dirty_n * 4, 4):
+        # 已被既有區域涵蓋就不用再記
+        if d[i] <= x0 and d[i + 1] <= y0 and d[i + 2] >= x1 and d[i + 3] >= y1:
+            return
+    if _dirty_n < _MAX_RECTS:
+        i = _dirty_n * 4
+        d[i] = x0
+        d[i + 1] = y0
+        d[i + 2] = x1
+        d[i + 3] = y1
+        _dirty_n += 1
+        return
+    # 區域太多：全部合併成一個外框
+    for i in range(0, _dirty_n * 4, 4):
+        x0 = min(x0, d[i])
+        y0 = min(y0, d[i + 1])
+        x1 = max(x1, d[i + 2])
+        y1 = max(y1, d[i + 3])
+    d[0] = x0
+    d[1] = y0
+    d[2] = x1
+    d[3] = y1
+    _dirty_n = 1
+
+
+def present(force: bool = False) -> bool:
+    """送出累積的髒區域；未到下一幀時間則延後（force=True 立即送）。回傳是否有刷新。
+    實際刷新的次數與 SPI 耗時計入 metrics（GET /metrics 的 gateway_lcd_flush_us）。"""
+    global _dirty_n, _last_frame_ms
+    if not _dirty_n:
+        return False
+    now = time.ticks_ms()
+    if not force and _frame_interval_ms and time.ticks_diff(now, _last_frame_ms) < _frame_interval_ms:
+        return False
+    t0 = time.ticks_us()
+    d = _dirty
+    if _dirty_n == 1 and d[0] == 0 and d[1] == 0 and d[2] == W and d[3] == H:
+        lcd.show()
+        metrics.inc(metrics.LCD_FULL_FLUSHES)
+    else:
+        for i in range(0, _dirty_n * 4, 4):
+            lcd.show_region(d[i], d[i + 1], d[i + 2] - d[i], d[i + 3] - d[i + 1])
+    _dirty_n = 0
+    _last_frame_ms = now
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    metrics.inc(metrics.LCD_FLUSH_US_SUM, dt)
+    metrics.inc(metrics.LCD_FLUSHES)
+    return True
+
+
 # 可選背光控制：預設不動作，若需要可自行呼叫 set_backlight()
 _backlight_pwm = None
 
@@ -246,18 +372,26 @@ def footer_clear() -> None:
 
 
 def trim(s: str, n: int) -> str:
-    """過長字串以省略號縮短。"""
-    return s if len(s) <= n else (s[: max(0, n - 1)] + "…")
+    """過長字串以 "~" 縮短（8x8 字型畫不出 Unicode 省略號）。"""
+    return s if len(s) <= n else (s[: max(0, n - 1)] + "~")
+
+
+# 捲軸區域（局部刷新時需要知道範圍）
+SCROLLBAR_X = W - 8
+SCROLLBAR_Y = 44
+SCROLLBAR_W = 6
+SCROLLBAR_H = H - SCROLLBAR_Y - 28
 
 
 def draw_scrollbar(total: int, first_idx: int, page_size: int) -> None:
-    """列表捲軸顯示，依資料量計算滑塊比例。"""
+    """列表捲軸顯示，依資料量計算滑塊比例；會先清掉舊滑塊以便局部重繪。"""
     if total <= page_size:
         return
-    x = W - 8
-    y0 = 44
-    h = H - y0 - 28
-    lcd.rect(x, y0, 6, h, GRAY)
+    x = SCROLLBAR_X
+    y0 = SCROLLBAR_Y
+    h = SCROLLBAR_H
+    lcd.fill_rect(x, y0, SCROLLBAR_W, h, WHITE)
+    lcd.rect(x, y0, SCROLLBAR_W, h, GRAY)
     thumb_h = max(10, int(h * page_size / total))
     max_first = total - page_size
     thumb_y = y0 + int((h - thumb_h) * (first_idx / max_first))
@@ -4,6 +4,8 @@
 
 from machine import UART, Pin
 
+import metrics
+
 UART_PINS = {
     0: {"tx": Pin(0), "rx": Pin(1)},
     1: {"tx": Pin(4), "rx": Pin(5)},
@@ -34,17 +36,29 @@ def send(ch: int, data: bytes | str):
     uart = _get_uart(ch)
     if isinstance(data, str):
         data = data.encode()
-    return uart.write(data)
+    try:
+        n = uart.write(data) or 0
+    except Exception:
+        metrics.inc(metrics.RS_ERR + ch)
+        raise
+    metrics.inc(metrics.RS_TX + ch, n)
+    return n
 
 
 def recv(ch: int, max_bytes: int = 256) -> bytes:
     """非阻塞讀取通道資料，回傳 bytes（可能為空）。"""
     uart = _get_uart(ch)
-    n = uart.any()
-    if not n:
-        return b""
-    n = min(n, max_bytes)
-    return uart.read(n) or b""
+    try:
+        n = uart.any()
+        if not n:
+            return b""
+        n = min(n, max_bytes)
+        data = uart.read(n) or b""
+    except Exception:
+        metrics.inc(metrics.RS_ERR + ch)
+        raise
+    metrics.inc(metrics.RS_RX + ch, len(data))
+    return data
 
 
 def flush_input(ch: int):
@@ -171,6 +171,11 @@ def read_battery(force: bool = False):
         return _batt_cache
 
 
+def cached_battery():
+    """最後一次成功讀到的電量（不觸發 I2C），沒有則為 None；供其他核心或指標輸出使用。"""
+    return _batt_cache
+
+
 def battery_gauge_text():
     """回傳電量百分比文字，供抬頭列顯示。"""
     batt = _batt_cache or read_battery()
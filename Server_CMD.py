@@ -2,16 +2,89 @@
 # handle_cmd 專責解析指令；start/poll 管理非阻塞 TCP 伺服器。
 
 import socket
+import time
 from machine import Pin
 
-from wifi_Scan_Connect import wlan
+from wifi_Scan_Connect import net_state
+from net_poller import ClientSet, would_block
 import Pico_RS485 as rs485
+import perf
+import memprof
+import metrics
 
 SERVER_PORT = 12345  # 可依需求調整
 server_sock = None
+SEND_TIMEOUT_S = 2
+# 已接受、等待指令的連線：最多 4 條，連上後 5 秒內沒送出指令就關閉
+_clients = ClientSet("cmd", 4, 5000)
+
+
+# perf / memprof 分開計時的子指令；不在表內的一律併成 "<指令> ?"
+_SUBCMDS = {
+    "SYS": ("STATUS", "WIFI", "PING", "PERF", "MEM", "BOOT", "HELP"),
+    "LED": ("ON", "OFF"),
+    "MB": ("R", "W"),
+    "RS": ("SEND", "RECV"),
+}
+
+
+def _perf_key(cmd: str) -> str:
+    """啟用 perf 時依「指令 + 子指令」分開計時；指令與子指令都只取固定清單，
+    未知指令記為 other、未知子指令記為 "<指令> ?"，亂打的指令不會佔滿槽位。"""
+    parts = cmd.split()
+    if not parts:
+        return "other"
+    verb = parts[0].upper()
+    subs = _SUBCMDS.get(verb)
+    if subs is None:
+        return verb if verb in metrics.VERBS else "other"
+    if len(parts) > 1:
+        sub = parts[1].upper()
+        if sub in subs:
+            return verb + " " + sub
+    return verb + " ?"
 
 
 def handle_cmd(cmd: str) -> str:
+    """執行一筆指令並回傳回應字串；啟用 perf / memprof 時記錄耗時與配置量。"""
+    t0 = perf.start()
+    m0 = memprof.start()
+    resp = _handle_cmd(cmd)
+    if t0 or m0 >= 0:
+        key = _perf_key(cmd)
+        perf.stop(perf.CMD, key, t0)
+        memprof.stop(memprof.CMD, key, m0)
+    return resp
+
+
+def _mb_done(slot: int, t0: int) -> None:
+    """記錄一筆完成的 Modbus 交易與耗時（目前 MB 指令仍是示範資料，耗時僅含指令處理）。"""
+    metrics.inc(slot)
+    metrics.inc(metrics.MB_LAT_SUM, time.ticks_diff(time.ticks_us(), t0))
+    metrics.inc(metrics.MB_LAT_COUNT)
+
+
+def _stats_cmd(label: str, mod, args) -> str:
+    """SYS PERF / SYS MEM [ON|OFF|RESET]：顯示或控制 perf（耗時 us）/ memprof（配置 bytes）統計。"""
+    if len(args) > 1:
+        sub = args[1].upper()
+        if sub == "ON":
+            mod.enable(True)
+            return "OK SYS %s ON" % label
+        if sub == "OFF":
+            mod.enable(False)
+            return "OK SYS %s OFF" % label
+        if sub == "RESET":
+            mod.reset()
+            return "OK SYS %s RESET" % label
+        return "ERR SYS %s %s" % (label, args[1])
+    lines = ["OK SYS %s %s" % (label, "ON" if mod.enabled() else "OFF")]
+    for line in mod.report_lines():
+        lines.append(line)
+    return " \n".join(lines)
+
+
+def _handle_cmd(cmd: str) -> str:
     """核心指令解析：SYS / MB 兩大類，保留原本行為並加上中文註解。"""
     cmd = cmd.strip()
     if not cmd:
@@ -20,6 +93,10 @@ def handle_cmd(cmd: str) -> str:
     parts = cmd.split()
     name = parts[0].upper()
     args = parts[1:]
+    metrics.inc(metrics.CMD + metrics.verb_index(name))
+    if name == "STATUS":
+        # 傳統指令兼容：等同 SYS STATUS
+        name, args = "SYS", ["STATUS"]
 
     # ---------- SYS 類 ----------
     if name == "SYS":
@@ -29,20 +106,31 @@ def handle_cmd(cmd: str) -> str:
 
         if sub == "STATUS":
             try:
-                ip, nm, gw, dns = wlan.ifconfig()
+                ip, nm, gw, dns = net_state.get().ifconfig
                 return f"OK SYS STATUS \nIP={ip} \nNETMASK={nm} \nGW={gw} \nDNS={dns}"
             except Exception as e:
                 return "ERR SYS STATUS " + str(e)[:60]
 
         elif sub == "WIFI":
             try:
-                active = wlan.active()
-                conn = wlan.isconnected()
-                ip, nm, gw, dns = wlan.ifconfig()
-                try:
-                    rssi = wlan.status("rssi")
-                except Exception:
-                    rssi = None
+                st = net_state.get()
+                active = st.sta_active
+                conn = st.sta_connected
+                ip = st.sta_ip
+                rssi = st.rssi
+                if len(args) > 1 and args[1].upper() == "HIST":
+                    import linkmon
+
+                    n = 30
+                    if len(args) > 2:
+                        try:
+                            n = int(args[2])
+                        except ValueError:
+                            return "ERR SYS WIFI HIST NUM"
+                    lines = ["OK SYS WIFI HIST"]
+                    for line in linkmon.report_lines(n):
+                        lines.append(line)
+                    return " \n".join(lines)
                 return f"OK SYS WIFI \nACTIVE={active} \nCONNECTED={conn} \nIP={ip} \nRSSI={rssi}"
             except Exception as e:
                 return "ERR SYS WIFI " + str(e)[:60]
@@ -50,8 +138,22 @@ def handle_cmd(cmd: str) -> str:
         elif sub == "PING":
             return "OK SYS PING"
 
+        elif sub == "PERF":
+            return _stats_cmd("PERF", perf, args)
+
+        elif sub == "MEM":
+            return _stats_cmd("MEM", memprof, args)
+
+        elif sub == "BOOT":
+            import bootprof
+
+            lines = ["OK SYS BOOT"]
+            for line in bootprof.report_lines():
+                lines.append(line)
+            return " \n".join(lines)
+
         elif sub == "HELP":
-            return "OK SYS CMDS: \nSYS STATUS \nSYS WIFI \nSYS PING \nSYS HELP \nSYS MB R/W HR \nSYS COIL \nSYS LED ON/OFF"
+            return "OK SYS CMDS: \nSYS STATUS \nSYS WIFI [HIST [N]] \nSYS PING \nSYS PERF [ON/OFF/RESET] \nSYS MEM [ON/OFF/RESET] \nSYS BOOT \nSYS HELP \nSYS MB R/W HR \nSYS COIL \nSYS LED ON/OFF"
 
         else:
             return "ERR SYS UNKNOWN " + args[0]
@@ -72,6 +174,7 @@ def handle_cmd(cmd: str) -> str:
 
     # ---------- Modbus：MB 類 ----------
     elif name == "MB":
+        t_mb = time.ticks_us()
         if len(args) < 4:
             return "ERR MB ARG"
 
@@ -94,6 +197,7 @@ def handle_cmd(cmd: str) -> str:
             # 預留 Modbus 讀取接口，目前回傳假資料做示範
             values = [1234 + i for i in range(count)]
             vals_str = " ".join(str(v) for v in values)
+            _mb_done(metrics.MB_READ, t_mb)
             return f"OK MB R HR {slave} {addr} {vals_str}"
 
         elif rw == "W" and area == "HR":
@@ -105,6 +209,7 @@ def handle_cmd(cmd: str) -> str:
                 return "ERR MB WHR NUM"
 
             # 預留 Modbus 寫入接口
+            _mb_done(metrics.MB_WRITE, t_mb)
             return f"OK MB W HR {slave} {addr} {value}"
 
         else:
@@ -152,17 +257,15 @@ def handle_cmd(cmd: str) -> str:
         else:
             return "ERR RS UNKNOWN " + sub
 
-    # ---------- 傳統指令兼容 ----------
-    elif name == "STATUS":
-        return handle_cmd("SYS STATUS")
-
     else:
         return "ERR UNKNOWN CMD: " + cmd
 
 
 def start_cmd_server():
-    """啟動非阻塞 TCP 伺服器（12345），失敗時會丟出例外便於偵錯。"""
+    """啟動非阻塞 TCP 伺服器（12345），已啟動則不重複綁定；失敗時會丟出例外便於偵錯。"""
     global server_sock
+    if server_sock is not None:
+        return
     addr = socket.getaddrinfo("0.0.0.0", SERVER_PORT)[0][-1]
     s = socket.socket()
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -174,8 +277,7 @@ def start_cmd_server():
 
 
 def poll_cmd_server():
-    """非阻塞檢查是否有遠端連線，有的話收一筆指令並回覆。"""
-    global server_sock
+    """監聽 socket 可讀時呼叫：接受新連線，交給 poll 迴圈；指令到了才由 service_client() 處理。"""
     if server_sock is None:
         return
 
@@ -185,18 +287,40 @@ def poll_cmd_server():
         return
 
     print("client connected from", addr)
+    _clients.add(cl)
+    # 多數用戶端連線時就帶著指令，先試讀一次，不必再等下一輪 poll
+    service_client(cl)
+
+
+def client_socks():
+    """等待指令中的連線（供 NetPoller 監看）。"""
+    return _clients.socks()
 
+
+def service_client(cl) -> None:
+    """連線可讀時呼叫：一次 recv 即一筆指令（與原本的行為相同），回覆後關閉；還沒有資料就留著等下一次。"""
+    if cl not in _clients:
+        return
     try:
-        cl.settimeout(30)
         data = cl.recv(1024)
-        if not data:
-            cl.close()
-            return
-        cmd = data.decode("utf-8", "ignore")
-        resp = handle_cmd(cmd) + "\n"
-        # 直接回應後關閉 socket，不維持長連線以節省資源
-        cl.send(resp.encode("utf-8"))
     except OSError as e:
-        print("poll_cmd_server recv/send error:", e)
+        if not would_block(e):
+            print("poll_cmd_server recv error:", e)
+            _clients.drop(cl)
+        return
+    t0 = perf.start()
+    m0 = memprof.start()
+    try:
+        if data:
+            resp = handle_cmd(data.decode("utf-8", "ignore")) + "\n"
+            # 回覆很短：改回有逾時的阻塞模式送完；直接回應後關閉，不維持長連線以節省資源
+            cl.settimeout(SEND_TIMEOUT_S)
+            try:
+                cl.send(resp.encode("utf-8"))
+            except OSError as e:
+                metrics.inc(metrics.NET_TX_ERR)
+                print("poll_cmd_server send error:", e)
     finally:
-        cl.close()
+        _clients.drop(cl)
+        perf.stop(perf.LOOP, "cmd_server", t0)
+        memprof.stop(memprof.LOOP, "cmd_server", m0)
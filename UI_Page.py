@@ -3,6 +3,7 @@
 
 import time
 
+from kernels import fmt_bssid
 from LCD_Control import (
     lcd,
     W,
@@ -21,20 +22,35 @@ from LCD_Control import (
     footer_clear,
     trim,
     draw_scrollbar,
+    SCROLLBAR_X,
+    SCROLLBAR_Y,
+    SCROLLBAR_W,
+    SCROLLBAR_H,
     icon_arrow_left,
     icon_arrow_right,
     icon_cursor_right,
+    mark_dirty,
+    present,
 )
 from wifi_Scan_Connect import (
-    wlan,
     scan_visible,
-    connect_to_ap,
+    connector,
     read_status,
     CONNECT_TIMEOUT_MS,
+    CS_JOINING,
+    CS_DHCP,
+    CS_CONNECTED,
+    CS_NO_AP,
+    CS_WRONG_PASSWORD,
+    CS_FAILED,
+    CS_TIMEOUT,
 )
 from Pico_UPS import read_battery, battery_gauge_text, tick_battery, last_battery_error
 
 PAGE_ROWS = 10
+LIST_Y0 = 26
+ROW_H = 18
+ROW_W = W - 12
 
 # Connect Setup 網格設定（6 欄較能排下 A-Z）
 KEYPAD_COLS = 6
@@ -48,7 +64,7 @@ scan_list = []
 visible_list = []
 sel = 0
 first = 0
-mode = "home"  # home | list | detail | connect | status
+mode = "home"  # home | list | detail | connect | connecting | status
 stack = []
 
 # Connect Setup 狀態
@@ -102,25 +118,24 @@ _last_gauge = ""
 
 
 def refresh_battery_gauge(force: bool = False, commit: bool = False):
-    """在標頭更新電量百分比；commit=True 立即 lcd.show()，避免頻繁閃爍。"""
+    """在標頭更新電量百分比；commit=True 標記該區域待刷新（由主迴圈 present() 統一送出）。"""
     global _last_gauge
     gauge = battery_gauge_text()
+    x = W - 60
     if not gauge:
         if _last_gauge:
-            x = W - 60
             lcd.fill_rect(x, 0, 60, 22, BLUE)
             if commit:
-                lcd.show()
+                mark_dirty(x, 0, 60, 22)
             _last_gauge = ""
         return
     if not force and gauge == _last_gauge:
         return
     _last_gauge = gauge
-    x = W - 60
     lcd.fill_rect(x, 0, 60, 22, BLUE)
     lcd.text(gauge, x + 4, 6, YELLOW)
     if commit:
-        lcd.show()
+        mark_dirty(x, 0, 60, 22)
 
 
 def auth_mode_to_str(m):
@@ -130,11 +145,6 @@ def auth_mode_to_str(m):
     )
 
 
-def fmt_bssid(b):
-    """BSSID 轉字串。"""
-    return ":".join("{:02X}".format(x) for x in b)
-
-
 def show_home():
     """首頁提示按鍵用途。"""
     global mode
@@ -151,7 +161,7 @@ def show_home():
     lcd.fill_rect(W // 2, H - 20, W // 2, 20, PINK)
     icon_arrow_right(W // 2 + 12, H - 10, BLACK)
     lcd.text("(B) Status", W // 2 + 24, H - 16, BLACK)
-    lcd.show()
+    mark_dirty()
 
 
 def do_scan():
@@ -160,7 +170,8 @@ def do_scan():
     fill_header("Scanning...")
     refresh_battery_gauge(force=True, commit=False)
     lcd.text("Please wait", 6, 40, GRAY)
-    lcd.show()
+    mark_dirty()
+    present(force=True)
     try:
         print("Scan result:")
         filtered = scan_visible()
@@ -182,30 +193,42 @@ def do_scan():
         first = 0
         fill_header("Scan failed")
         lcd.text(str(e)[:30], 6, 60, RED)
-        lcd.show()
+        mark_dirty()
+        present(force=True)
         time.sleep_ms(1200)
 
 
+def _draw_list_row(slot: int) -> None:
+    """重畫列表第 slot 列（清底 + 文字 + 游標），不觸發刷新。"""
+    y = LIST_Y0 + slot * ROW_H
+    idx = first + slot
+    if idx == sel and idx < len(visible_list):
+        lcd.fill_rect(2, y - 2, ROW_W, ROW_H, HL)
+        icon_cursor_right(10, y + 6, BLACK)
+    else:
+        lcd.fill_rect(2, y - 2, ROW_W, ROW_H, WHITE)
+    if idx < len(visible_list):
+        ssid = (visible_list[idx][0] or b"").decode("utf-8", "ignore")
+        lcd.text(trim(ssid, 26), 20, y, BLACK)
+
+
+def _mark_list_row(slot: int) -> None:
+    """標記單列區域待刷新。"""
+    mark_dirty(2, LIST_Y0 + slot * ROW_H - 2, ROW_W, ROW_H)
+
+
 def render_list():
     """顯示掃描結果列表；同時畫出游標與右側捲軸。"""
     global mode
     mode = "list"
     fill_header("Scan Results")
     refresh_battery_gauge(force=True, commit=False)
-    y = 26
-    row_h = 18
-    page = visible_list[first : first + PAGE_ROWS]
-    if not page:
-        lcd.text("未找到 AP，按 A 重新掃描", 12, y, GRAY)
+    if not visible_list:
+        # LCD 內建 8x8 字型只有 ASCII，中文會變成方塊
+        lcd.text("No AP found", 12, LIST_Y0, GRAY)
     else:
-        for i, n in enumerate(page):
-            idx = first + i
-            ssid = (n[0] or b"").decode("utf-8", "ignore")
-            if idx == sel:
-                lcd.fill_rect(2, y - 2, W - 12, row_h, HL)
-                icon_cursor_right(10, y + 6, BLACK)
-            lcd.text(trim(ssid, 26), 20, y, BLACK)
-            y += row_h
+        for i in range(min(PAGE_ROWS, len(visible_list) - first)):
+            _draw_list_row(i)
     draw_scrollbar(len(visible_list), first, PAGE_ROWS)
     footer_clear()
     lcd.fill_rect(0, H - 20, W // 2, 20, PINK)
@@ -214,28 +237,43 @@ def render_list():
     lcd.fill_rect(W // 2, H - 20, W // 2, 20, PINK)
     icon_arrow_right(W // 2 + 12, H - 10, BLACK)
     lcd.text("(B) Details", W // 2 + 24, H - 16, BLACK)
-    lcd.show()
+    mark_dirty()
 
 
 def move_selection(delta: int):
-    """列表游標移動並重繪。"""
+    """列表游標移動；只重畫新舊兩列，翻頁時才重畫整個列表區與捲軸。"""
     global sel, first
     total = len(visible_list)
     if total == 0:
         return
+    prev_sel, prev_first = sel, first
     sel = max(0, min(total - 1, sel + delta))
     if sel < first:
         first = sel
     elif sel >= first + PAGE_ROWS:
         first = sel - (PAGE_ROWS - 1)
-    render_list()
+    if mode != "list":
+        render_list()
+        return
+    if sel == prev_sel:
+        return
+    if first != prev_first:
+        # 頁面偏移改變：每列內容都會位移，只重畫列表區與捲軸滑塊
+        for i in range(PAGE_ROWS):
+            _draw_list_row(i)
+        draw_scrollbar(total, first, PAGE_ROWS)
+        mark_dirty(2, LIST_Y0 - 2, ROW_W, PAGE_ROWS * ROW_H)
+        mark_dirty(SCROLLBAR_X, SCROLLBAR_Y, SCROLLBAR_W, SCROLLBAR_H)
+        return
+    for slot in (prev_sel - first, sel - first):
+        _draw_list_row(slot)
+        _mark_list_row(slot)
 
 
 def show_detail():
     """顯示當前 AP 詳細資訊。"""
     global mode
     mode = "detail"
-    print("show_detail: enter")
     if not visible_list:
         show_home()
         return
@@ -265,7 +303,7 @@ def show_detail():
     lcd.fill_rect(0, H - 20, W // 2, 20, PINK)
     icon_arrow_left(12, H - 10, BLACK)
     lcd.text("(X) Back", 24, H - 16, BLACK)
-    lcd.show()
+    mark_dirty()
 
 
 def show_connect_setup():
@@ -290,8 +328,28 @@ def current_page_keys():
     return base
 
 
+def _draw_key_cell(idx: int, label: str) -> None:
+    """畫單一鍵盤格（含高亮底色與外框），不觸發刷新。"""
+    x = GRID_START_X + (idx % KEYPAD_COLS) * CELL_W
+    y = GRID_START_Y + (idx // KEYPAD_COLS) * CELL_H
+    # 目前游標所在位置加上高亮底色
+    lcd.fill_rect(x + 1, y + 1, CELL_W - 2, CELL_H - 2, HL if idx == keypad_idx else WHITE)
+    lcd.rect(x + 1, y + 1, CELL_W - 2, CELL_H - 2, PINK)
+    tx = x + (CELL_W // 2 - 4 if len(label) == 1 else CELL_W // 2 - 8)
+    lcd.text(label, tx, y + 8, BLACK)
+
+
+def _mark_key_cell(idx: int) -> None:
+    """標記單一鍵盤格區域待刷新。"""
+    x = GRID_START_X + (idx % KEYPAD_COLS) * CELL_W
+    y = GRID_START_Y + (idx // KEYPAD_COLS) * CELL_H
+    mark_dirty(x + 1, y + 1, CELL_W - 2, CELL_H - 2)
+
+
 def render_connect():
     """重繪 Connect Setup 畫面。"""
+    global mode
+    mode = "connect"
     fill_header("Connect Setup")
     refresh_battery_gauge(force=True, commit=False)
     y = 26
@@ -302,28 +360,18 @@ def render_connect():
     lcd.text(f"Page: {page_name}", 140, y + 20, GRAY)
     lcd.text("A: DEL   B: CLR", 6, y + 40, GRAY)
 
-    keys = current_page_keys()
-    for idx, label in enumerate(keys):
-        col = idx % KEYPAD_COLS
-        row = idx // KEYPAD_COLS
-        x = GRID_START_X + col * CELL_W
-        y = GRID_START_Y + row * CELL_H
-        if idx == keypad_idx:
-            # 目前游標所在位置加上高亮底色
-            lcd.fill_rect(x + 1, y + 1, CELL_W - 2, CELL_H - 2, HL)
-        lcd.rect(x + 1, y + 1, CELL_W - 2, CELL_H - 2, PINK)
-        tx = x + (CELL_W // 2 - 4 if len(label) == 1 else CELL_W // 2 - 8)
-        lcd.text(label, tx, y + 8, BLACK)
+    for idx, label in enumerate(current_page_keys()):
+        _draw_key_cell(idx, label)
 
     footer_clear()
     lcd.fill_rect(0, H - 20, W // 2, 20, PINK)
     icon_arrow_left(12, H - 10, BLACK)
     lcd.text("(X) Back", 24, H - 16, BLACK)
-    lcd.show()
+    mark_dirty()
 
 
 def keypad_move(dx: int, dy: int):
-    """在鍵盤網格中移動游標。"""
+    """在鍵盤網格中移動游標；只重畫新舊兩格。"""
     global keypad_idx
     keys = current_page_keys()
     cols = KEYPAD_COLS
@@ -333,10 +381,16 @@ def keypad_move(dx: int, dy: int):
     col = max(0, min(cols - 1, col + dx))
     row = max(0, min(rows - 1, row + dy))
     idx = row * cols + col
-    if idx >= len(keys):
+    if idx >= len(keys) or idx == keypad_idx:
         return
+    prev = keypad_idx
     keypad_idx = idx
-    render_connect()
+    if mode != "connect":
+        render_connect()
+        return
+    for i in (prev, idx):
+        _draw_key_cell(i, keys[i])
+        _mark_key_cell(i)
 
 
 def keypad_press(on_connected=None):
@@ -387,51 +441,85 @@ def clear_psk():
         render_connect()
 
 
+# 連線進度對應的畫面文字
+_CONNECT_TEXT = {
+    CS_JOINING: "Joining AP...",
+    CS_DHCP: "Getting IP (DHCP)...",
+    CS_CONNECTED: "Connected",
+    CS_NO_AP: "AP not found",
+    CS_WRONG_PASSWORD: "Wrong password",
+    CS_FAILED: "Connect failed",
+    CS_TIMEOUT: "Timed out",
+}
+CONNECT_FAIL_SHOW_MS = 1200  # 失敗訊息停留多久後回到輸入畫面
+_on_connected = None
+_shown_state = None
+_fail_until = None
+
+
 def attempt_connect(on_connected=None):
-    """嘗試連線，成功時可執行 on_connected 回呼；失敗會提示狀態碼。"""
+    """送出連線（不阻塞）並切到連線中畫面；主迴圈推進連線、每輪呼叫 tick_connect() 更新畫面，成功時執行 on_connected。"""
+    global mode, _on_connected, _shown_state, _fail_until
+    mode = "connecting"
+    _on_connected = on_connected
+    _shown_state = None
+    _fail_until = None
     fill_header("Connecting...")
     lcd.text(f"SSID: {trim(connect_ssid, 20)}", 6, 46, BLACK)
-    lcd.text("Please wait", 6, 66, GRAY)
-    lcd.show()
-
-    status_code = None
-    try:
-        status_code = wlan.status()
-    except Exception:
-        status_code = None
+    lcd.text("(X) Cancel", 6, H - 16, BLACK)
+    mark_dirty()
+    connector.start(connect_ssid, psk_input, timeout_ms=CONNECT_TIMEOUT_MS)
+    tick_connect()
+
+
+def _draw_connect_state(state):
+    """只重畫進度列；失敗時改成失敗抬頭並附上狀態碼方便診斷。"""
+    if connector.busy or state == CS_CONNECTED:
+        lcd.fill_rect(0, 60, W, 20, WHITE)
+        lcd.text(_CONNECT_TEXT.get(state, state), 6, 66, GRAY)
+        mark_dirty(0, 60, W, 20)
+        return
+    fill_header("Connect failed")
+    lcd.text(f"SSID: {trim(connect_ssid, 20)}", 6, 46, BLACK)
+    msg = _CONNECT_TEXT.get(state, state)
+    if connector.status is not None:
+        msg += f" (status {connector.status})"
+    lcd.text(msg[:28], 12, 66, RED)
+    mark_dirty()
 
-    success = connect_to_ap(connect_ssid, psk_input, CONNECT_TIMEOUT_MS)
-    # 以 isconnected + status 判斷，避免半連線狀態誤判成功
-    try:
-        status_code = wlan.status()
-    except Exception:
-        pass
-    if not (wlan.isconnected() and (status_code in (3, None))):
-        success = False
 
-    if success:
-        if on_connected:
+def tick_connect():
+    """連線中畫面每輪呼叫：狀態改變才重畫；成功切到狀態頁，失敗顯示原因一段時間後回輸入畫面。"""
+    global _shown_state, _fail_until
+    if mode != "connecting":
+        return
+    if _fail_until is not None:
+        if time.ticks_diff(time.ticks_ms(), _fail_until) >= 0:
+            _fail_until = None
+            render_connect()
+        return
+    # 連線由主迴圈的 connector.step() 推進，這裡只讀 state
+    state = connector.state
+    if state != _shown_state:
+        _shown_state = state
+        _draw_connect_state(state)
+    if state == CS_CONNECTED:
+        if _on_connected:
             try:
-                on_connected()
+                _on_connected()
             except Exception as e:
                 print("server start error:", e)
         # 連線成功後切到狀態畫面，並把上一頁資訊推入 stack 方便返回
         stack.append("connect")
         show_status()
-        return True
+    elif not connector.busy:
+        _fail_until = time.ticks_add(time.ticks_ms(), CONNECT_FAIL_SHOW_MS)
 
-    # 失敗時提示並回到輸入畫面，附帶 status code 方便診斷
-    fill_header("Connect failed")
-    msg = "Check password or signal"
-    if status_code is not None:
-        msg += f" (status {status_code})"
-    lcd.text(msg[:28], 12, 60, RED)
-    if len(msg) > 28:
-        lcd.text(msg[28:56], 12, 80, RED)
-    lcd.show()
-    time.sleep_ms(1200)
+
+def cancel_connect():
+    """連線中按 X：放棄連線並回到輸入畫面。"""
+    connector.cancel()
     render_connect()
-    return False
 
 
 def show_status():
@@ -481,4 +569,4 @@ def show_status():
     lcd.fill_rect(0, H - 20, W // 2, 20, PINK)
     icon_arrow_left(12, H - 10, BLACK)
     lcd.text("(X) Back", 24, H - 16, BLACK)
-    lcd.show()
+    mark_dirty()
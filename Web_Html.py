@@ -0,0 +1,346 @@
+# Web_Html.py - 內建 Web UI 的 HTML/JS（約 9 KB）
+# 由 Web_Page 在第一次請求主頁時才匯入並編碼成 bytes，開機與純 API 使用時不佔 RAM。
+
+# 網頁內容與原本 main.py 相同，便於手機/瀏覽器遠端操控
+WEB_PAGE = """<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="UTF-8" />
+<title>Pico Modbus Gateway</title>
+<meta name="viewport" content="width=device-width, initial-scale=1.0" />
+<style>
+  :root {
+    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
+    background: #f5f5f5;
+    color: #222;
+  }
+  body {
+    margin: 0;
+    padding: 0;
+  }
+  .wrap {
+    max-width: 480px;
+    margin: 0 auto;
+    padding: 16px;
+  }
+  h1 {
+    font-size: 20px;
+    margin: 0 0 8px 0;
+  }
+  h2 {
+    font-size: 16px;
+    margin: 16px 0 8px 0;
+  }
+  .card {
+    background: #ffffff;
+    border-radius: 12px;
+    padding: 12px;
+    margin-bottom: 12px;
+    box-shadow: 0 1px 3px rgba(0,0,0,.1);
+  }
+  .btn-row {
+    display: flex;
+    flex-wrap: wrap;
+    gap: 6px;
+    margin-bottom: 4px;
+  }
+  button {
+    flex: 1;
+    min-width: 80px;
+    padding: 8px 6px;
+    border-radius: 999px;
+    border: none;
+    background: #007bff;
+    color: #fff;
+    font-size: 13px;
+  }
+  button.secondary {
+    background: #6c757d;
+  }
+  button.danger {
+    background: #dc3545;
+  }
+  button:active {
+    opacity: 0.8;
+  }
+  label {
+    display: block;
+    font-size: 13px;
+    margin-bottom: 4px;
+  }
+  input[type="text"], input[type="number"] {
+    width: 100%;
+    padding: 6px 8px;
+    border-radius: 8px;
+    border: 1px solid #ccc;
+    font-size: 13px;
+    box-sizing: border-box;
+    margin-bottom: 6px;
+  }
+  #cmd-input {
+    width: 100%;
+    padding: 8px;
+    border-radius: 8px;
+    border: 1px solid #ccc;
+    font-size: 13px;
+    box-sizing: border-box;
+  }
+  #log {
+    width: 100%;
+    min-height: 150px;
+    max-height: 260px;
+    padding: 8px;
+    border-radius: 8px;
+    border: 1px solid #ccc;
+    background: #111;
+    color: #0f0;
+    font-family: "SF Mono", ui-monospace, Menlo, monospace;
+    font-size: 12px;
+    box-sizing: border-box;
+    overflow-y: auto;
+    white-space: pre-wrap;
+  }
+  .small {
+    font-size: 11px;
+    color: #666;
+  }
+</style>
+</head>
+<body>
+<div class="wrap">
+  <h1>Pico Modbus Gateway</h1>
+  <div class="small">透過 Wi-Fi 控制 Pico：SYS / LED / Modbus 指令。</div>
+
+  <div class="card">
+    <h2>快速操作</h2>
+    <div class="btn-row">
+      <button onclick="sendCmd('SYS STATUS')">SYS STATUS</button>
+      <button onclick="sendCmd('SYS WIFI')">SYS WIFI</button>
+    </div>
+    <div class="btn-row">
+      <button onclick="sendCmd('LED ON')">LED ON</button>
+      <button onclick="sendCmd('LED OFF')">LED OFF</button>
+    </div>
+    <div class="btn-row">
+      <button class="secondary" onclick="sendCmd('SYS HELP')">SYS HELP</button>
+      <button class="secondary" onclick="sendCmd('SYS PING')">SYS PING</button>
+    </div>
+  </div>
+
+  <div class="card">
+    <h2>Modbus 指令（HR 範例）</h2>
+    <label>Slave ID</label>
+    <input type="number" id="mb-slave" value="1" min="1" max="247" />
+    <label>Address (起始位址)</label>
+    <input type="number" id="mb-addr" value="0" min="0" />
+    <label>Count (讀取筆數)</label>
+    <input type="number" id="mb-count" value="2" min="1" />
+    <div class="btn-row">
+      <button onclick="mbReadHR()">MB R HR</button>
+    </div>
+    <label>Write Value</label>
+    <input type="number" id="mb-value" value="1234" />
+    <div class="btn-row">
+      <button class="danger" onclick="mbWriteHR()">MB W HR</button>
+    </div>
+    <div class="small">實際格式：MB R HR &lt;slave&gt; &lt;addr&gt; &lt;count&gt; / MB W HR &lt;slave&gt; &lt;addr&gt; &lt;value&gt;</div>
+  </div>
+
+  <div class="card">
+    <h2>Wi-Fi 設定（無 LCD 時使用）</h2>
+    <div class="small">1) 手機連上 Pico 的 AP（預設：PicoSetup / 密碼 pico1234）</div>
+    <div class="small">2) 點「掃描可用 AP」選擇 SSID，輸入密碼並送出</div>
+    <div class="btn-row" style="margin-top:6px;">
+      <button onclick="refreshStatus()">更新狀態</button>
+      <button onclick="refreshScan()">掃描可用 AP</button>
+    </div>
+    <div id="wifi-status" class="small"></div>
+    <label style="margin-top:8px;">選擇可用 SSID</label>
+    <select id="wifi-ssid" style="width:100%;padding:8px;border-radius:8px;border:1px solid #ccc;">
+      <option value="">(尚未掃描)</option>
+    </select>
+    <label>密碼（若為開放網路可留空）</label>
+    <input type="text" id="wifi-psk" placeholder="Wi-Fi Password" />
+    <div class="btn-row">
+      <button onclick="connectWifi()">送出連線</button>
+    </div>
+    <div id="wifi-msg" class="small"></div>
+  </div>
+
+  <div class="card">
+    <h2>自訂指令</h2>
+    <input id="cmd-input" type="text" placeholder="例如：SYS STATUS 或 MB R HR 1 0 3" />
+    <div class="btn-row">
+      <button onclick="sendCmdFromInput()">送出</button>
+      <button class="secondary" onclick="clearLog()">清除 Log</button>
+    </div>
+  </div>
+
+  <div class="card">
+    <h2>回應 Log</h2>
+    <div id="log"></div>
+  </div>
+
+</div>
+
+<script>
+  function appendLog(line) {
+    var log = document.getElementById('log');
+    var now = new Date();
+    var ts = now.toLocaleTimeString();
+    log.textContent += '[' + ts + '] ' + line + '\\n';
+    log.scrollTop = log.scrollHeight;
+  }
+
+  function sendCmd(cmd) {
+    appendLog('> ' + cmd);
+
+    var xhr = new XMLHttpRequest();
+    xhr.onreadystatechange = function() {
+      if (xhr.readyState === 4) {
+        var text = xhr.responseText || '';
+        appendLog('< ' + text.trim());
+      }
+    };
+    xhr.open('POST', '/cmd', true);
+    xhr.setRequestHeader('Content-Type', 'text/plain');
+    xhr.send(cmd);
+  }
+
+  function sendCmdFromInput() {
+    var inp = document.getElementById('cmd-input');
+    var cmd = inp.value.trim();
+    if (!cmd) return;
+    sendCmd(cmd);
+  }
+
+  function clearLog() {
+    document.getElementById('log').textContent = '';
+  }
+
+  function mbReadHR() {
+    var slave = document.getElementById('mb-slave').value || '1';
+    var addr  = document.getElementById('mb-addr').value  || '0';
+    var cnt   = document.getElementById('mb-count').value || '1';
+    var cmd = 'MB R HR ' + slave + ' ' + addr + ' ' + cnt;
+    sendCmd(cmd);
+  }
+
+  function mbWriteHR() {
+    var slave = document.getElementById('mb-slave').value || '1';
+    var addr  = document.getElementById('mb-addr').value  || '0';
+    var val   = document.getElementById('mb-value').value || '0';
+    var cmd = 'MB W HR ' + slave + ' ' + addr + ' ' + val;
+    sendCmd(cmd);
+  }
+
+  window.onload = function() {
+    appendLog('Web UI ready');
+    refreshStatus();
+    refreshScan();
+  };
+
+  function refreshStatus() {
+    fetch('/wifi/status')
+      .then(r => r.json())
+      .then(d => {
+        var txt = [];
+        txt.push('STA connected: ' + d.connected + (d.ip ? ' / IP ' + d.ip : ''));
+        if (d.rssi !== null && d.rssi !== undefined) txt.push('RSSI ' + d.rssi + ' dBm');
+        txt.push('AP active: ' + d.ap_active + (d.ap_essid ? ' (' + d.ap_essid + ')' : ''));
+        document.getElementById('wifi-status').textContent = txt.join(' | ');
+      })
+      .catch(() => {
+        document.getElementById('wifi-status').textContent = '無法取得狀態';
+      });
+  }
+
+  function refreshScan(tries) {
+    var sel = document.getElementById('wifi-ssid');
+    tries = tries || 0;
+    if (!tries) sel.innerHTML = '<option>掃描中...</option>';
+    fetch('/wifi/scan')
+      .then(r => r.json())
+      .then(d => {
+        var list = d.aps || [];
+        // 閘道器在背景掃描：先顯示舊結果，稍後再查
+        var again = d.scanning && tries < 8;
+        if (again) setTimeout(() => refreshScan(tries + 1), 1500);
+        if (again && !list.length) return;
+        sel.innerHTML = '';
+        if (!list.length) {
+          sel.innerHTML = '<option value=\"\">找不到 AP</option>';
+          return;
+        }
+        list.forEach(ap => {
+          var opt = document.createElement('option');
+          opt.value = ap.ssid;
+          opt.textContent = ap.ssid + ' (' + ap.rssi + 'dBm, ' + ap.auth + ')';
+          sel.appendChild(opt);
+        });
+      })
+      .catch(() => {
+        sel.innerHTML = '<option value=\"\">掃描失敗</option>';
+      });
+  }
+
+  function connectWifi() {
+    var ssid = document.getElementById('wifi-ssid').value;
+    var psk = document.getElementById('wifi-psk').value;
+    var msg = document.getElementById('wifi-msg');
+    if (!ssid) { msg.textContent = '請先選擇 SSID'; return; }
+    msg.textContent = '連線中...';
+    fetch('/wifi/connect', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ssid: ssid, psk: psk })
+    })
+      .then(r => r.json())
+      .then(d => {
+        if (d.ok && d.state === 'queued') {
+          // 連線要求排給另一核心執行：稍候再開始查進度，避免讀到上一次的結果
+          msg.textContent = CONNECT_TEXT.joining;
+          setTimeout(function() { pollConnect(msg, 0); }, 1000);
+        } else if (d.ok) {
+          pollConnect(msg, 0);
+        } else {
+          msg.textContent = '連線失敗：' + (d.state || d.error || 'unknown');
+        }
+      })
+      .catch(() => {
+        msg.textContent = '連線請求失敗';
+      });
+  }
+
+  var CONNECT_TEXT = {
+    joining: '連線中...', dhcp: '取得 IP 中...', no_ap: '找不到 AP',
+    wrong_password: '密碼錯誤', failed: '連線失敗', timeout: '連線逾時'
+  };
+
+  // 連線在裝置上非阻塞進行，每 500ms 查一次進度直到成功或失敗
+  function pollConnect(msg, n) {
+    fetch('/wifi/status')
+      .then(r => r.json())
+      .then(d => {
+        var c = d.connect || {};
+        if (c.state === 'connected') {
+          msg.textContent = '連線成功，IP: ' + (d.ip || '(取得中)');
+          refreshStatus();
+        } else if (c.state === 'joining' || c.state === 'dhcp') {
+          msg.textContent = CONNECT_TEXT[c.state];
+          if (n < 60) setTimeout(function() { pollConnect(msg, n + 1); }, 500);
+        } else {
+          msg.textContent = '連線失敗：' + (CONNECT_TEXT[c.state] || c.state) +
+            (c.status !== null && c.status !== undefined ? ' (status ' + c.status + ')' : '');
+          refreshStatus();
+        }
+      })
+      .catch(() => {
+        // 連線切換期間手機可能短暫斷線，稍後再試
+        if (n < 60) setTimeout(function() { pollConnect(msg, n + 1); }, 1000);
+      });
+  }
+</script>
+</body>
+</html>
+"""
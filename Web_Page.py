@@ -1,333 +1,68 @@
 # Web_Page.py - 提供內建 Web UI 與簡易 HTTP 伺服器
-# HTTP 伺服器會回傳內嵌的控制頁面，並透過 POST /cmd 呼叫指令處理器。
+# HTTP 伺服器會回傳控制頁面（Web_Html，第一次請求才載入），並透過 POST /cmd 呼叫指令處理器。
 
 import socket
+import sys
 import json
-import time
+import perf
+import memprof
+import metrics
+from net_poller import ClientSet, would_block
 from Server_CMD import handle_cmd as default_handler
 from wifi_Scan_Connect import (
-    scan_visible,
-    connect_to_ap,
+    cached_scan,
+    request_scan,
+    connector,
     read_status,
     start_config_ap,
+    net_state,
 )
 
 HTTP_PORT = 80
 http_sock = None
+MAX_REQUEST = 4096  # 單一請求（標頭 + 本文）上限，超過回 400
+SEND_TIMEOUT_S = 2
+SCAN_FRESH_MS = 15000  # /wifi/scan 直接沿用這麼新的掃描結果，較舊才要求重新掃描
+# 請求尚未收齊的連線：最多 4 條，連上後 5 秒內沒送完請求就關閉
+_clients = ClientSet("HTTP", 4, 5000)
 _cmd_handler = default_handler
+# 設定時 POST /wifi/connect 改呼叫 connect_handler(ssid, psk)，不直接動 connector；
+# NET_ON_CORE1 時由 core1_net 設定，把連線要求排給 core 0（connector 只在 core 0 推進）
+connect_handler = None
+_page = None  # 主頁編碼後的 bytes；第一次請求時才從 Web_Html 載入
 
-# 網頁內容與原本 main.py 相同，便於手機/瀏覽器遠端操控
-WEB_PAGE = """<!DOCTYPE html>
-<html lang="zh-Hant">
-<head>
-<meta charset="UTF-8" />
-<title>Pico Modbus Gateway</title>
-<meta name="viewport" content="width=device-width, initial-scale=1.0" />
-<style>
-  :root {
-    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-    background: #f5f5f5;
-    color: #222;
-  }
-  body {
-    margin: 0;
-    padding: 0;
-  }
-  .wrap {
-    max-width: 480px;
-    margin: 0 auto;
-    padding: 16px;
-  }
-  h1 {
-    font-size: 20px;
-    margin: 0 0 8px 0;
-  }
-  h2 {
-    font-size: 16px;
-    margin: 16px 0 8px 0;
-  }
-  .card {
-    background: #ffffff;
-    border-radius: 12px;
-    padding: 12px;
-    margin-bottom: 12px;
-    box-shadow: 0 1px 3px rgba(0,0,0,.1);
-  }
-  .btn-row {
-    display: flex;
-    flex-wrap: wrap;
-    gap: 6px;
-    margin-bottom: 4px;
-  }
-  button {
-    flex: 1;
-    min-width: 80px;
-    padding: 8px 6px;
-    border-radius: 999px;
-    border: none;
-    background: #007bff;
-    color: #fff;
-    font-size: 13px;
-  }
-  button.secondary {
-    background: #6c757d;
-  }
-  button.danger {
-    background: #dc3545;
-  }
-  button:active {
-    opacity: 0.8;
-  }
-  label {
-    display: block;
-    font-size: 13px;
-    margin-bottom: 4px;
-  }
-  input[type="text"], input[type="number"] {
-    width: 100%;
-    padding: 6px 8px;
-    border-radius: 8px;
-    border: 1px solid #ccc;
-    font-size: 13px;
-    box-sizing: border-box;
-    margin-bottom: 6px;
-  }
-  #cmd-input {
-    width: 100%;
-    padding: 8px;
-    border-radius: 8px;
-    border: 1px solid #ccc;
-    font-size: 13px;
-    box-sizing: border-box;
-  }
-  #log {
-    width: 100%;
-    min-height: 150px;
-    max-height: 260px;
-    padding: 8px;
-    border-radius: 8px;
-    border: 1px solid #ccc;
-    background: #111;
-    color: #0f0;
-    font-family: "SF Mono", ui-monospace, Menlo, monospace;
-    font-size: 12px;
-    box-sizing: border-box;
-    overflow-y: auto;
-    white-space: pre-wrap;
-  }
-  .small {
-    font-size: 11px;
-    color: #666;
-  }
-</style>
-</head>
-<body>
-<div class="wrap">
-  <h1>Pico Modbus Gateway</h1>
-  <div class="small">透過 Wi-Fi 控制 Pico：SYS / LED / Modbus 指令。</div>
-
-  <div class="card">
-    <h2>快速操作</h2>
-    <div class="btn-row">
-      <button onclick="sendCmd('SYS STATUS')">SYS STATUS</button>
-      <button onclick="sendCmd('SYS WIFI')">SYS WIFI</button>
-    </div>
-    <div class="btn-row">
-      <button onclick="sendCmd('LED ON')">LED ON</button>
-      <button onclick="sendCmd('LED OFF')">LED OFF</button>
-    </div>
-    <div class="btn-row">
-      <button class="secondary" onclick="sendCmd('SYS HELP')">SYS HELP</button>
-      <button class="secondary" onclick="sendCmd('SYS PING')">SYS PING</button>
-    </div>
-  </div>
-
-  <div class="card">
-    <h2>Modbus 指令（HR 範例）</h2>
-    <label>Slave ID</label>
-    <input type="number" id="mb-slave" value="1" min="1" max="247" />
-    <label>Address (起始位址)</label>
-    <input type="number" id="mb-addr" value="0" min="0" />
-    <label>Count (讀取筆數)</label>
-    <input type="number" id="mb-count" value="2" min="1" />
-    <div class="btn-row">
-      <button onclick="mbReadHR()">MB R HR</button>
-    </div>
-    <label>Write Value</label>
-    <input type="number" id="mb-value" value="1234" />
-    <div class="btn-row">
-      <button class="danger" onclick="mbWriteHR()">MB W HR</button>
-    </div>
-    <div class="small">實際格式：MB R HR &lt;slave&gt; &lt;addr&gt; &lt;count&gt; / MB W HR &lt;slave&gt; &lt;addr&gt; &lt;value&gt;</div>
-  </div>
-
-  <div class="card">
-    <h2>Wi-Fi 設定（無 LCD 時使用）</h2>
-    <div class="small">1) 手機連上 Pico 的 AP（預設：PicoSetup / 密碼 pico1234）</div>
-    <div class="small">2) 點「掃描可用 AP」選擇 SSID，輸入密碼並送出</div>
-    <div class="btn-row" style="margin-top:6px;">
-      <button onclick="refreshStatus()">更新狀態</button>
-      <button onclick="refreshScan()">掃描可用 AP</button>
-    </div>
-    <div id="wifi-status" class="small"></div>
-    <label style="margin-top:8px;">選擇可用 SSID</label>
-    <select id="wifi-ssid" style="width:100%;padding:8px;border-radius:8px;border:1px solid #ccc;">
-      <option value="">(尚未掃描)</option>
-    </select>
-    <label>密碼（若為開放網路可留空）</label>
-    <input type="text" id="wifi-psk" placeholder="Wi-Fi Password" />
-    <div class="btn-row">
-      <button onclick="connectWifi()">送出連線</button>
-    </div>
-    <div id="wifi-msg" class="small"></div>
-  </div>
-
-  <div class="card">
-    <h2>自訂指令</h2>
-    <input id="cmd-input" type="text" placeholder="例如：SYS STATUS 或 MB R HR 1 0 3" />
-    <div class="btn-row">
-      <button onclick="sendCmdFromInput()">送出</button>
-      <button class="secondary" onclick="clearLog()">清除 Log</button>
-    </div>
-  </div>
-
-  <div class="card">
-    <h2>回應 Log</h2>
-    <div id="log"></div>
-  </div>
-
-</div>
-
-<script>
-  function appendLog(line) {
-    var log = document.getElementById('log');
-    var now = new Date();
-    var ts = now.toLocaleTimeString();
-    log.textContent += '[' + ts + '] ' + line + '\\n';
-    log.scrollTop = log.scrollHeight;
-  }
-
-  function sendCmd(cmd) {
-    appendLog('> ' + cmd);
-
-    var xhr = new XMLHttpRequest();
-    xhr.onreadystatechange = function() {
-      if (xhr.readyState === 4) {
-        var text = xhr.responseText || '';
-        appendLog('< ' + text.trim());
-      }
-    };
-    xhr.open('POST', '/cmd', true);
-    xhr.setRequestHeader('Content-Type', 'text/plain');
-    xhr.send(cmd);
-  }
-
-  function sendCmdFromInput() {
-    var inp = document.getElementById('cmd-input');
-    var cmd = inp.value.trim();
-    if (!cmd) return;
-    sendCmd(cmd);
-  }
-
-  function clearLog() {
-    document.getElementById('log').textContent = '';
-  }
-
-  function mbReadHR() {
-    var slave = document.getElementById('mb-slave').value || '1';
-    var addr  = document.getElementById('mb-addr').value  || '0';
-    var cnt   = document.getElementById('mb-count').value || '1';
-    var cmd = 'MB R HR ' + slave + ' ' + addr + ' ' + cnt;
-    sendCmd(cmd);
-  }
-
-  function mbWriteHR() {
-    var slave = document.getElementById('mb-slave').value || '1';
-    var addr  = document.getElementById('mb-addr').value  || '0';
-    var val   = document.getElementById('mb-value').value || '0';
-    var cmd = 'MB W HR ' + slave + ' ' + addr + ' ' + val;
-    sendCmd(cmd);
-  }
-
-  window.onload = function() {
-    appendLog('Web UI ready');
-    refreshStatus();
-    refreshScan();
-  };
-
-  function refreshStatus() {
-    fetch('/wifi/status')
-      .then(r => r.json())
-      .then(d => {
-        var txt = [];
-        txt.push('STA connected: ' + d.connected + (d.ip ? ' / IP ' + d.ip : ''));
-        if (d.rssi !== null && d.rssi !== undefined) txt.push('RSSI ' + d.rssi + ' dBm');
-        txt.push('AP active: ' + d.ap_active + (d.ap_essid ? ' (' + d.ap_essid + ')' : ''));
-        document.getElementById('wifi-status').textContent = txt.join(' | ');
-      })
-      .catch(() => {
-        document.getElementById('wifi-status').textContent = '無法取得狀態';
-      });
-  }
-
-  function refreshScan() {
-    var sel = document.getElementById('wifi-ssid');
-    sel.innerHTML = '<option>掃描中...</option>';
-    fetch('/wifi/scan')
-      .then(r => r.json())
-      .then(d => {
-        sel.innerHTML = '';
-        var list = d.aps || [];
-        if (!list.length) {
-          sel.innerHTML = '<option value=\"\">找不到 AP</option>';
-          return;
-        }
-        list.forEach(ap => {
-          var opt = document.createElement('option');
-          opt.value = ap.ssid;
-          opt.textContent = ap.ssid + ' (' + ap.rssi + 'dBm, ' + ap.auth + ')';
-          sel.appendChild(opt);
-        });
-      })
-      .catch(() => {
-        sel.innerHTML = '<option value=\"\">掃描失敗</option>';
-      });
-  }
-
-  function connectWifi() {
-    var ssid = document.getElementById('wifi-ssid').value;
-    var psk = document.getElementById('wifi-psk').value;
-    var msg = document.getElementById('wifi-msg');
-    if (!ssid) { msg.textContent = '請先選擇 SSID'; return; }
-    msg.textContent = '連線中...';
-    fetch('/wifi/connect', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ ssid: ssid, psk: psk })
-    })
-      .then(r => r.json())
-      .then(d => {
-        if (d.ok) {
-          msg.textContent = '連線成功，IP: ' + (d.ip || '(取得中)');
-        } else {
-          msg.textContent = '連線失敗：' + (d.error || 'unknown');
-        }
-        refreshStatus();
-      })
-      .catch(() => {
-        msg.textContent = '連線請求失敗';
-      });
-  }
-</script>
-</body>
-</html>
-"""
+
+def page_bytes() -> bytes:
+    """取得主頁 HTML（bytes）；第一次呼叫才匯入 Web_Html，編碼後釋放原始字串模組。"""
+    global _page
+    if _page is None:
+        import Web_Html
+
+        _page = Web_Html.WEB_PAGE.encode("utf-8")
+        # 只保留編碼後的 bytes，避免字串與 bytes 兩份同時佔用堆積
+        sys.modules.pop("Web_Html", None)
+    return _page
+
+
+def _send_page(send_all):
+    body_bytes = page_bytes()
+    hdr = (
+        "HTTP/1.1 200 OK\r\n"
+        "Content-Type: text/html; charset=UTF-8\r\n"
+        f"Content-Length: {len(body_bytes)}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    )
+    send_all(hdr.encode())
+    send_all(body_bytes)
 
 
 def start_http_server(cmd_handler=default_handler):
-    """啟動非阻塞 HTTP 伺服器，預設使用 Server_CMD.handle_cmd。"""
+    """啟動非阻塞 HTTP 伺服器，預設使用 Server_CMD.handle_cmd；已啟動則只更新指令處理器。"""
     global http_sock, _cmd_handler
     _cmd_handler = cmd_handler
+    if http_sock is not None:
+        return
     addr = socket.getaddrinfo("0.0.0.0", HTTP_PORT)[0][-1]
     s = socket.socket()
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -339,8 +74,7 @@ def start_http_server(cmd_handler=default_handler):
 
 
 def poll_http_server():
-    """非阻塞 HTTP：GET / 回頁面；POST /cmd 交由指令處理器。"""
-    global http_sock
+    """監聽 socket 可讀時呼叫：接受新連線，交給 poll 迴圈；請求收齊後才由 service_client() 處理。"""
     if http_sock is None:
         return
 
@@ -352,6 +86,63 @@ def poll_http_server():
         return
 
     print("HTTP client from", addr)
+    _clients.add(cl, bytearray())
+    service_client(cl)
+
+
+def client_socks():
+    """請求尚未收齊的連線（供 NetPoller 監看）。"""
+    return _clients.socks()
+
+
+def service_client(cl) -> None:
+    """連線可讀時呼叫：讀一段資料累積到該連線的緩衝；標頭（POST 另加 Content-Length 的本文）收齊才回應並關閉。
+    每次只讀目前已到的資料，慢速或不送資料的用戶端不會卡住 poll 迴圈，逾時由 _clients 關閉。"""
+    buf = _clients.state(cl)
+    if buf is None:
+        return
+    try:
+        chunk = cl.recv(512)
+    except OSError as e:
+        if not would_block(e):
+            print("HTTP recv error:", e)
+            _clients.drop(cl)
+        return
+    buf += chunk
+    if len(buf) > MAX_REQUEST:
+        print("HTTP request too large")
+        _reply_and_close(cl, send_bad_request)
+        return
+    req = bytes(buf)
+    if chunk:
+        # 還沒收齊就等下一次可讀；對方關閉寫入端（chunk 為空）時以目前收到的內容處理
+        if b"\r\n\r\n" not in req and b"\n\n" not in req:
+            return
+        head, sep, body = req.partition(b"\r\n\r\n")
+        if head.startswith(b"POST") and parse_content_length(head) > len(body):
+            return
+    elif not req:
+        _clients.drop(cl)
+        return
+    _reply_and_close(cl, lambda send_all: _respond(req, send_all))
+
+
+def _respond(req: bytes, send_all) -> None:
+    head, sep, body = req.partition(b"\r\n\r\n")
+    try:
+        method, path = parse_request_line(head)
+        print("HTTP request:", method, path)
+    except Exception as e:
+        print("HTTP parse error:", e)
+        send_bad_request(send_all)
+        return
+    handle_request(method, path, body, send_all)
+
+
+def _reply_and_close(cl, respond) -> None:
+    """改回有逾時的阻塞模式送出回應（respond(send_all)），之後關閉連線。"""
+    t0 = perf.start()
+    m0 = memprof.start()
 
     def send_all(buf: bytes):
         """確保資料送出完畢，避免部分瀏覽器顯示空白；分段重送直到全部送出或出錯。"""
@@ -363,206 +154,294 @@ def poll_http_server():
                 n = cl.send(mv[sent:])
             except OSError as e:
                 print("HTTP send error:", e)
+                metrics.inc(metrics.NET_TX_ERR)
                 break
             if not n:
                 break
             sent += n
 
     try:
-        cl.settimeout(5)
-        req = b""
-        start_ts = time.time()
-        while (b"\r\n\r\n" not in req and b"\n\n" not in req) and (time.time() - start_ts) < 5:
-            try:
-                chunk = cl.recv(512)
-            except OSError as e:
-                print("HTTP recv header error:", e)
-                return
-            if not chunk:
-                break
-            req += chunk
+        cl.settimeout(SEND_TIMEOUT_S)
+        respond(send_all)
+    except OSError as e:
+        print("poll_http_server error:", e)
+    finally:
+        _clients.drop(cl)
+        perf.stop(perf.LOOP, "http_server", t0)
+        memprof.stop(memprof.LOOP, "http_server", m0)
 
-        if not req:
-            return
 
-        head, sep, body = req.partition(b"\r\n\r\n")
+BAD_REQUEST = (
+    b"HTTP/1.1 400 Bad Request\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 11\r\n"
+    b"Connection: close\r\n"
+    b"\r\nBad Request"
+)
 
-        try:
-            first_line = head.split(b"\r\n", 1)[0].decode()
-            method, path, _ = first_line.split(" ", 2)
-            print("HTTP request:", method, path)
-        except Exception as e:
-            print("HTTP parse error:", e)
-            resp = (
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: text/plain\r\n"
-                "Content-Length: 11\r\n"
-                "Connection: close\r\n"
-                "\r\nBad Request"
-            )
-            send_all(resp.encode())
-            return
 
-        content_length = 0
-        for line in head.split(b"\r\n")[1:]:
-            line_low = line.lower()
-            if line_low.startswith(b"content-length:"):
-                try:
-                    content_length = int(line.split(b":", 1)[1].strip() or b"0")
-                except Exception:
-                    content_length = 0
-                break
+def send_bad_request(send_all):
+    """請求列無法解析：回 400，並計入 other 路徑的請求與錯誤。"""
+    other = len(metrics.ROUTES) - 1
+    metrics.inc(metrics.HTTP_REQ + other)
+    metrics.inc(metrics.HTTP_ERR + other)
+    send_all(BAD_REQUEST)
 
-        if method == "POST" and content_length > len(body):
-            need = content_length - len(body)
-            start_body_ts = time.time()
-            while need > 0 and (time.time() - start_body_ts) < 5:
-                try:
-                    chunk = cl.recv(512)
-                except OSError as e:
-                    print("HTTP recv body error:", e)
-                    break
-                if not chunk:
-                    break
-                body += chunk
-                need -= len(chunk)
-
-        def send_json(obj, status="200 OK"):
-            body_bytes = json.dumps(obj).encode("utf-8")
-            resp = (
-                f"HTTP/1.1 {status}\r\n"
-                "Content-Type: application/json; charset=UTF-8\r\n"
-                f"Content-Length: {len(body_bytes)}\r\n"
-                "Connection: close\r\n"
-                "\r\n"
-            )
-            send_all(resp.encode())
-            send_all(body_bytes)
-
-        # ======= Web UI: GET / =======
-        if method == "GET" and (path == "/" or path.startswith("/index")):
-            body_bytes = WEB_PAGE.encode("utf-8")
-            hdr = (
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: text/html; charset=UTF-8\r\n"
-                f"Content-Length: {len(body_bytes)}\r\n"
-                "Connection: close\r\n"
-                "\r\n"
-            )
-            send_all(hdr.encode())
-            send_all(body_bytes)
-            return
 
-        # ======= Wi-Fi API =======
-        if method == "GET" and path == "/wifi/scan":
-            aps = []
-            try:
-                for ap in scan_visible():
-                    ssid = (ap[0] or b"").decode("utf-8", "ignore").strip()
-                    aps.append({"ssid": ssid, "rssi": ap[3], "auth": ap[4]})
-            except Exception as e:
-                send_json({"aps": [], "error": str(e)[:80]}, status="500 Internal Server Error")
-                return
-            send_json({"aps": aps})
-            return
+def parse_request_line(head: bytes):
+    """取出 (method, path)；格式錯誤會丟例外。"""
+    first_line = head.split(b"\r\n", 1)[0].decode()
+    method, path, _ = first_line.split(" ", 2)
+    return method, path
 
-        if method == "GET" and path == "/wifi/status":
-            st = read_status()
-            ip = ""
+
+def parse_content_length(head: bytes) -> int:
+    """從標頭取 Content-Length，沒有或格式錯誤回 0。"""
+    for line in head.split(b"\r\n")[1:]:
+        if line.lower().startswith(b"content-length:"):
             try:
-                ip = st.get("ifconfig", ("", ""))[0]
+                return int(line.split(b":", 1)[1].strip() or b"0")
             except Exception:
-                ip = ""
-            send_json(
-                {
-                    "connected": st.get("connected", False),
-                    "ip": ip,
-                    "rssi": st.get("rssi"),
-                    "ap_active": st.get("ap_active", False),
-                    "ap_essid": st.get("ap_essid", ""),
-                }
-            )
+                return 0
+    return 0
+
+
+# ---------- 作業系統連線檢查（captive portal 偵測） ----------
+# 手機/電腦連上 AP 後會反覆請求這些路徑；預先組好的極短回應，在其他路由之前直接送出，
+# 不再落到「未知路徑回主頁」送出整份 HTML。
+PORTAL_URL = "http://192.168.4.1/"
+
+
+def _canned(status: str, ctype: str = "", body: bytes = b"") -> bytes:
+    hdr = "HTTP/1.1 %s\r\n" % status
+    if ctype:
+        hdr += "Content-Type: %s\r\n" % ctype
+    hdr += "Content-Length: %d\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n" % len(body)
+    return hdr.encode() + body
+
+
+_NO_CONTENT = _canned("204 No Content")
+_APPLE_OK = _canned("200 OK", "text/html", b"<HTML><HEAD><TITLE>Success</TITLE></HEAD><BODY>Success</BODY></HTML>")
+
+# 路徑 -> STA 已連線（設定完成）時的「可上網」回應；設定尚未完成時一律回 _PROBE_REDIRECT
+_PROBES = {
+    "/generate_204": _NO_CONTENT,  # Android / Chrome
+    "/gen_204": _NO_CONTENT,
+    "/hotspot-detect.html": _APPLE_OK,  # iOS / macOS
+    "/library/test/success.html": _APPLE_OK,
+    "/connecttest.txt": _canned("200 OK", "text/plain", b"Microsoft Connect Test"),  # Windows 10+
+    "/ncsi.txt": _canned("200 OK", "text/plain", b"Microsoft NCSI"),  # 舊版 Windows
+    "/success.txt": _canned("200 OK", "text/plain", b"success\n"),  # Firefox
+}
+_PROBE_REDIRECT = (
+    "HTTP/1.1 302 Found\r\n"
+    "Location: %s\r\n"
+    "Content-Length: 0\r\n"
+    "Cache-Control: no-store\r\n"
+    "Connection: close\r\n"
+    "\r\n" % PORTAL_URL
+).encode()
+_PROBE_ROUTE = metrics.ROUTES.index("probe")
+
+
+def probe_response(path: str):
+    """連線檢查路徑的預組回應；不是連線檢查回 None。
+    STA 尚未連上時回 302 導向設定頁，讓系統跳出登入頁；連上後回各系統預期的成功內容。"""
+    ok = _PROBES.get(path)
+    if ok is None:
+        return None
+    return ok if net_state.get().sta_connected else _PROBE_REDIRECT
+
+
+def handle_request(method: str, path: str, body: bytes, send_all):
+    """路由與回應：同步輪詢與 asyncio 伺服器共用，send_all(bytes) 負責實際寫出。
+    依路徑累計請求/錯誤次數（metrics），啟用 perf / memprof 時並記錄耗時與配置量。"""
+    t0 = perf.start()
+    m0 = memprof.start()
+    key = path.split("?", 1)[0]
+    if method == "GET":
+        probe = probe_response(key)
+        if probe is not None:
+            metrics.inc(metrics.HTTP_REQ + _PROBE_ROUTE)
+            send_all(probe)
+            perf.stop(perf.HTTP, "probe", t0)
+            memprof.stop(memprof.HTTP, "probe", m0)
             return
+    ri = metrics.route_index(key)
+    metrics.inc(metrics.HTTP_REQ + ri)
+    status = [b""]
 
-        if method == "POST" and path == "/wifi/connect":
-            payload = {}
-            try:
-                payload = json.loads(body or b"{}")
-            except Exception:
-                try:
-                    txt = body.decode("utf-8", "ignore")
-                    for part in txt.split("&"):
-                        if "=" in part:
-                            k, v = part.split("=", 1)
-                            payload[k] = v
-                except Exception:
-                    payload = {}
-            ssid = payload.get("ssid") or ""
-            psk = payload.get("psk") or payload.get("password") or ""
-            if not ssid:
-                send_json({"ok": False, "error": "missing ssid"}, status="400 Bad Request")
-                return
-            ok = connect_to_ap(ssid, psk)
-            st = read_status()
+    def _send(buf):
+        # 第一段是狀態列，取 "HTTP/1.1 " 之後的第一碼判斷是否 2xx
+        if not status[0]:
+            status[0] = bytes(buf[9:10])
+        send_all(buf)
+
+    try:
+        _route(method, path, body, _send)
+    except Exception:
+        metrics.inc(metrics.HTTP_ERR + ri)
+        raise
+    if status[0] != b"2":
+        metrics.inc(metrics.HTTP_ERR + ri)
+    perf.stop(perf.HTTP, metrics.ROUTES[ri], t0)
+    memprof.stop(memprof.HTTP, metrics.ROUTES[ri], m0)
+
+
+def _send_metrics(send_all):
+    """GET /metrics：Prometheus 文字格式，邊產生邊送出（不帶 Content-Length，以關閉連線結束）。"""
+    send_all(
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+        b"Connection: close\r\n"
+        b"\r\n"
+    )
+    rssi = net_state.get().rssi
+    # 只在 UPS 模組已載入時讀快取，不為了指標而載入或觸發 I2C
+    ups = sys.modules.get("Pico_UPS")
+    battery = ups.cached_battery() if ups is not None else None
+    metrics.render(send_all, battery=battery, rssi=rssi)
+
+
+def _route(method: str, path: str, body: bytes, send_all):
+
+    def send_json(obj, status="200 OK"):
+        body_bytes = json.dumps(obj).encode("utf-8")
+        resp = (
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: application/json; charset=UTF-8\r\n"
+            f"Content-Length: {len(body_bytes)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        )
+        send_all(resp.encode())
+        send_all(body_bytes)
+
+    # ======= Web UI: GET / =======
+    if method == "GET" and (path == "/" or path.startswith("/index")):
+        _send_page(send_all)
+        return
+
+    # ======= Wi-Fi API =======
+    if method == "GET" and path == "/wifi/scan":
+        # 不在 HTTP 處理中呼叫會阻塞的 wlan.scan()：回最近的結果，太舊就要求主迴圈重新掃描，
+        # 以 scanning=true 告知網頁稍後再查
+        found, age = cached_scan()
+        scanning = age is None or age > SCAN_FRESH_MS
+        if scanning:
+            request_scan()
+        aps = []
+        for ap in found:
+            ssid = (ap[0] or b"").decode("utf-8", "ignore").strip()
+            aps.append({"ssid": ssid, "rssi": ap[3], "auth": ap[4]})
+        send_json({"aps": aps, "scanning": scanning})
+        return
+
+    if method == "GET" and path == "/wifi/status":
+        st = read_status()
+        ip = ""
+        try:
+            ip = st.get("ifconfig", ("", ""))[0]
+        except Exception:
             ip = ""
+        send_json(
+            {
+                "connected": st.get("connected", False),
+                "ip": ip,
+                "rssi": st.get("rssi"),
+                "ap_active": st.get("ap_active", False),
+                "ap_essid": st.get("ap_essid", ""),
+                "connect": st.get("connect"),
+            }
+        )
+        return
+
+    if method == "GET" and path == "/wifi/history":
+        import linkmon
+
+        send_json(linkmon.history())
+        return
+
+    if method == "POST" and path == "/wifi/connect":
+        payload = {}
+        try:
+            payload = json.loads(body or b"{}")
+        except Exception:
             try:
-                ip = st.get("ifconfig", ("", ""))[0]
+                txt = body.decode("utf-8", "ignore")
+                for part in txt.split("&"):
+                    if "=" in part:
+                        k, v = part.split("=", 1)
+                        payload[k] = v
             except Exception:
-                ip = ""
-            if ok:
-                send_json({"ok": True, "ip": ip})
+                payload = {}
+        ssid = payload.get("ssid") or ""
+        psk = payload.get("psk") or payload.get("password") or ""
+        if not ssid:
+            send_json({"ok": False, "error": "missing ssid"}, status="400 Bad Request")
+            return
+        # 只送出連線就回應，不佔住 HTTP 服務；進度與結果由 GET /wifi/status 的 connect 欄位查詢
+        if connect_handler is not None:
+            if connect_handler(ssid, psk):
+                send_json({"ok": True, "state": "queued"})
             else:
-                send_json({"ok": False, "error": "connect failed"})
+                send_json({"ok": False, "state": "busy", "error": "connect queue full"}, status="503 Service Unavailable")
             return
+        connector.start(ssid, psk)
+        info = connector.info()
+        if connector.busy:
+            send_json({"ok": True, "state": info["state"]})
+        else:
+            send_json({"ok": False, "state": info["state"], "error": "connect failed"})
+        return
 
-        # ======= 指令 API: POST /cmd =======
-        if method == "POST" and path == "/cmd":
-            cmd_str = body.decode("utf-8", "ignore").strip()
-            print("HTTP cmd:", repr(cmd_str))
-            handler = _cmd_handler or default_handler
-            result = handler(cmd_str)
-            body_bytes = (result + "\n").encode("utf-8")
-            resp = (
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: text/plain; charset=UTF-8\r\n"
-                f"Content-Length: {len(body_bytes)}\r\n"
-                "Connection: close\r\n"
-                "\r\n"
-            )
-            send_all(resp.encode())
-            send_all(body_bytes)
-            return
+    # ======= 監控指標：GET /metrics =======
+    if method == "GET" and path == "/metrics":
+        _send_metrics(send_all)
+        return
 
-        # ======= 瀏覽器自動請求的圖示，回空白避免噪音 =======
-        if method == "GET" and (
-            path.startswith("/favicon.ico")
-            or path.startswith("/apple-touch-icon.png")
-            or path.startswith("/apple-touch-icon-precomposed.png")
-        ):
-            resp = (
-                "HTTP/1.1 204 No Content\r\n"
-                "Content-Length: 0\r\n"
-                "Connection: close\r\n"
-                "\r\n"
-            )
-            send_all(resp.encode())
-            return
+    # ======= 耗時統計：GET /perf（單位 us） =======
+    if method == "GET" and path == "/perf":
+        send_json(perf.snapshot())
+        return
+
+    # ======= 堆積/配置統計：GET /mem =======
+    if method == "GET" and path == "/mem":
+        send_json(memprof.snapshot())
+        return
 
-        # ======= 未知路徑：回主頁 =======
-        body_bytes = WEB_PAGE.encode("utf-8")
-        hdr = (
+    # ======= 指令 API: POST /cmd =======
+    if method == "POST" and path == "/cmd":
+        cmd_str = body.decode("utf-8", "ignore").strip()
+        print("HTTP cmd:", repr(cmd_str))
+        handler = _cmd_handler or default_handler
+        result = handler(cmd_str)
+        body_bytes = (result + "\n").encode("utf-8")
+        resp = (
             "HTTP/1.1 200 OK\r\n"
-            "Content-Type: text/html; charset=UTF-8\r\n"
+            "Content-Type: text/plain; charset=UTF-8\r\n"
             f"Content-Length: {len(body_bytes)}\r\n"
             "Connection: close\r\n"
             "\r\n"
         )
-        send_all(hdr.encode())
+        send_all(resp.encode())
         send_all(body_bytes)
-    except OSError as e:
-        print("poll_http_server error:", e)
-    finally:
-        try:
-            cl.close()
-        except Exception:
-            pass
+        return
+
+    # ======= 瀏覽器自動請求的圖示，回空白避免噪音 =======
+    if method == "GET" and (
+        path.startswith("/favicon.ico")
+        or path.startswith("/apple-touch-icon.png")
+        or path.startswith("/apple-touch-icon-precomposed.png")
+    ):
+        resp = (
+            "HTTP/1.1 204 No Content\r\n"
+            "Content-Length: 0\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        )
+        send_all(resp.encode())
+        return
+
+    # ======= 未知路徑：回主頁 =======
+    _send_page(send_all)
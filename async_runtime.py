@@ -0,0 +1,193 @@
+# async_runtime.py - 以 asyncio（MicroPython 為 uasyncio）取代手寫超級迴圈
+# TCP 指令、HTTP、Captive DNS、mDNS、電量更新與 UI 按鍵各為一個 task，
+# 只在有 I/O 或計時到期時才被喚醒，彼此不會因為固定 sleep 而互相拖延。
+# 由 main.py 在 config.USE_ASYNCIO=True 時呼叫 run()。
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+import Pico_UPS
+import wifi_Scan_Connect as wsc
+import linkmon
+import udp_service
+from Server_CMD import SERVER_PORT, handle_cmd
+import Web_Page
+
+REQUEST_TIMEOUT_S = 5
+UI_TICK_MS = 15
+BATTERY_TICK_MS = 2000
+
+if hasattr(asyncio, "sleep_ms"):
+    _sleep_ms = asyncio.sleep_ms
+else:  # CPython（主機端模擬）
+
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+
+# ---------- UDP 可讀等待 ----------
+# asyncio 沒有 UDP stream；MicroPython 直接把 socket 掛進 I/O 佇列，CPython 用 add_reader。
+try:
+    from asyncio import core as _core
+
+    def _readable(sock):
+        yield _core._io_queue.queue_read(sock)
+
+except ImportError:
+
+    async def _readable(sock):
+        loop = asyncio.get_event_loop()
+        fut = loop.create_future()
+        loop.add_reader(sock, fut.set_result, None)
+        try:
+            await fut
+        finally:
+            loop.remove_reader(sock)
+
+
+async def _close(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+# ---------- TCP 指令（12345） ----------
+async def _cmd_client(reader, writer):
+    """一次連線處理一筆指令後關閉，與 poll_cmd_server 行為相同。"""
+    try:
+        data = await asyncio.wait_for(reader.read(1024), 30)
+        if data:
+            resp = handle_cmd(data.decode("utf-8", "ignore")) + "\n"
+            writer.write(resp.encode("utf-8"))
+            await writer.drain()
+    except Exception as e:
+        print("cmd client error:", e)
+    finally:
+        await _close(writer)
+
+
+# ---------- HTTP（80） ----------
+async def _read_head(reader):
+    """讀到空行為止，回傳原始標頭 bytes（不含空行）。"""
+    lines = []
+    while len(lines) < 64:
+        line = await reader.readline()
+        if not line or line in (b"\r\n", b"\n"):
+            break
+        lines.append(line.rstrip(b"\r\n"))
+    return b"\r\n".join(lines)
+
+
+async def _http_client(reader, writer):
+    try:
+        head = await asyncio.wait_for(_read_head(reader), REQUEST_TIMEOUT_S)
+        if not head:
+            return
+        try:
+            method, path = Web_Page.parse_request_line(head)
+        except Exception:
+            Web_Page.send_bad_request(writer.write)
+            await writer.drain()
+            return
+        body = b""
+        need = Web_Page.parse_content_length(head) if method == "POST" else 0
+        while len(body) < need:
+            chunk = await asyncio.wait_for(reader.read(need - len(body)), REQUEST_TIMEOUT_S)
+            if not chunk:
+                break
+            body += chunk
+        # 路由與同步版共用；寫入先進 stream 緩衝，最後一次 drain
+        Web_Page.handle_request(method, path, body, writer.write)
+        await writer.drain()
+    except Exception as e:
+        print("HTTP client error:", e)
+    finally:
+        await _close(writer)
+
+
+# ---------- UDP：udp_service（Captive DNS / mDNS） ----------
+async def _udp_task(name):
+    """等 udp_service 的 name 服務啟動後，在 socket 可讀時才呼叫 service()；閒置時不佔 CPU。"""
+    while True:
+        sock = udp_service.sock_of(name)
+        if sock is None:
+            # AP 尚未開啟、mDNS 尚未啟動等情況：稍後再看
+            await _sleep_ms(500)
+            continue
+        await _readable(sock)
+        udp_service.service(name)
+
+
+async def _mdns_task(hostname):
+    """STA 連上後才載入並啟動 mDNS；封包由 mdns 的 _udp_task 在可讀時服務，這裡只推進計時工作。"""
+    while not wsc.net_state.get().sta_connected:
+        await _sleep_ms(1000)
+    from mdns_service import MDNSResponder
+
+    mdns = MDNSResponder(hostname=hostname, ip_getter=wsc.sta_ip)
+    mdns.start()
+    # 名稱探測、公告與延遲回應的計時；tick() 回傳下次需要喚醒的時間
+    while True:
+        await _sleep_ms(mdns.tick())
+
+
+# ---------- 週期性工作 ----------
+async def _battery_task(refresh_gauge=None):
+    while True:
+        Pico_UPS.tick_battery()
+        if refresh_gauge is not None:
+            refresh_gauge()
+        await _sleep_ms(BATTERY_TICK_MS)
+
+
+async def _station_task():
+    """AP 上裝置加入/離開時記錄（非阻塞，不影響其他服務啟動）。"""
+    while True:
+        wsc.watch_ap_stations()
+        await _sleep_ms(wsc.STATION_POLL_MS)
+
+
+async def _reconnect_task():
+    """推進進行中的 Wi-Fi 連線；STA 斷線時以已存設定檔自動重連；取樣連線品質；執行網頁要求的掃描。"""
+    while True:
+        wsc.connector.step()
+        wsc.auto_reconnect()
+        linkmon.tick()
+        wsc.service_scan()
+        await _sleep_ms(wsc.RECONNECT_POLL_MS)
+
+
+async def _ui_task(ui_tick):
+    while True:
+        ui_tick()
+        await _sleep_ms(UI_TICK_MS)
+
+
+async def _main(headless, ui_tick, refresh_gauge, mdns_hostname):
+    await asyncio.start_server(_cmd_client, "0.0.0.0", SERVER_PORT)
+    print("async cmd server listening on port", SERVER_PORT)
+    await asyncio.start_server(_http_client, "0.0.0.0", Web_Page.HTTP_PORT)
+    print("async HTTP server listening on port", Web_Page.HTTP_PORT)
+
+    tasks = [asyncio.create_task(_udp_task(name)) for name in udp_service.SLOTS]
+    tasks += [
+        asyncio.create_task(_battery_task(None if headless else refresh_gauge)),
+        asyncio.create_task(_station_task()),
+        asyncio.create_task(_reconnect_task()),
+    ]
+    if mdns_hostname:
+        tasks.append(asyncio.create_task(_mdns_task(mdns_hostname)))
+    if not headless and ui_tick is not None:
+        tasks.append(asyncio.create_task(_ui_task(ui_tick)))
+    # 目前專案尚無 Modbus 輪詢引擎（MB 指令仍為示範資料），接上後在此加入對應 task
+    await asyncio.gather(*tasks)
+
+
+def run(headless=False, ui_tick=None, refresh_gauge=None, mdns_hostname="pico"):
+    """啟動所有服務並進入事件迴圈（不會返回）。
+    Captive DNS 在開 AP 時建立並登記到 udp_service，之後由對應的 _udp_task 服務。"""
+    asyncio.run(_main(headless, ui_tick, refresh_gauge, mdns_hostname))
@@ -0,0 +1,152 @@
+# bench_kernels.py - kernels 微基準：每個 kernel 與原本寫法、純 Python 版本的耗時比較
+# 裝置上：mpremote run bench_kernels.py（kernels 使用 viper 版本）
+# 主機上：python bench_kernels.py（只有純 Python 版本，speedup 反映相對原本寫法的改善）
+#
+# 欄位：legacy = 改寫前的程式碼，python = kernels 的 _py_* 版本，kernel = 目前選用的版本；
+# 單位 us/次；speedup = legacy / kernel。
+
+import time
+
+import kernels
+
+try:
+    _now = time.ticks_us
+    _diff = time.ticks_diff
+except AttributeError:
+
+    def _now():
+        return int(time.perf_counter() * 1000000)
+
+    def _diff(a, b):
+        return a - b
+
+
+# ---------- 測試資料 ----------
+# 查詢 pico.local 的 A 記錄（與 mDNS/Captive DNS 收到的封包相同格式）
+_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x04pico\x05local\x00\x00\x01\x00\x01"
+_WIRE = kernels.wire_name("pico.local")
+_IP = "192.168.123.234"
+_BSSID = b"\xa4\x2b\xb0\xfe\x01\x9c"
+_FRAME = bytes(range(64)) * 4  # 256 bytes 的 RS485 封包
+_PIXELS = bytes(i & 15 for i in range(240))  # 一列 240 點、16 色索引
+_PAL = bytes(range(32))
+_DST = bytearray(480)
+_OUT4 = bytearray(4)
+_OUT17 = bytearray(17)
+
+
+# ---------- 改寫前的寫法（對照組） ----------
+def _legacy_qname(data):
+    idx = 12
+    labels = []
+    l = data[idx]
+    while l and idx < len(data):
+        idx += 1
+        labels.append(data[idx : idx + l])
+        idx += l
+        l = data[idx]
+    return b".".join(labels).lower() == b"pico.local"
+
+
+def _legacy_aton(ip):
+    parts = (ip or "0.0.0.0").split(".")
+    return bytes(int(p) & 0xFF for p in parts)
+
+
+def _legacy_bssid(b):
+    return ":".join("{:02X}".format(x) for x in b)
+
+
+def _legacy_crc16(buf):
+    crc = 0xFFFF
+    for c in buf:
+        crc ^= c
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def _legacy_rgb565(src, pal, dst):
+    for i, c in enumerate(src):
+        dst[2 * i : 2 * i + 2] = pal[2 * c : 2 * c + 2]
+
+
+# ---------- 各 kernel 的呼叫方式 ----------
+def _cases():
+    k = kernels
+    ip = _IP.encode()
+    n = len(_QUERY)
+    return (
+        (
+            "qname walk+match",
+            lambda: _legacy_qname(_QUERY),
+            lambda: k._py_qname_end(_QUERY, 12, n) > 0 and k._py_name_eq(_QUERY, 12, n, _WIRE),
+            lambda: k.qname_end(_QUERY, 12, n) > 0 and k.name_eq(_QUERY, 12, n, _WIRE),
+        ),
+        (
+            "inet_aton",
+            lambda: _legacy_aton(_IP),
+            lambda: k._py_aton(ip, len(ip), _OUT4),
+            lambda: k.aton(ip, len(ip), _OUT4),
+        ),
+        (
+            "fmt_bssid",
+            lambda: _legacy_bssid(_BSSID),
+            lambda: k._py_hex_colon(_BSSID, 6, _OUT17),
+            lambda: k.hex_colon(_BSSID, 6, _OUT17),
+        ),
+        (
+            "crc16 (256 B)",
+            lambda: _legacy_crc16(_FRAME),
+            lambda: k._py_crc16(_FRAME, len(_FRAME)),
+            lambda: k.crc16(_FRAME, len(_FRAME)),
+        ),
+        (
+            "rgb565 row (240 px)",
+            lambda: _legacy_rgb565(_PIXELS, _PAL, _DST),
+            lambda: k._py_expand_rgb565(_PIXELS, len(_PIXELS), _PAL, _DST),
+            lambda: k.expand_rgb565(_PIXELS, len(_PIXELS), _PAL, _DST),
+        ),
+    )
+
+
+def _time(fn, loops):
+    t0 = _now()
+    for _ in range(loops):
+        fn()
+    return _diff(_now(), t0) / loops
+
+
+def _check():
+    """先確認各版本結果一致，避免量到錯的東西。"""
+    k = kernels
+    assert k.crc16(b"\x01\x03\x00\x00\x00\x01", 6) == 0x0A84
+    assert k._py_crc16(_FRAME, len(_FRAME)) == k.crc16(_FRAME, len(_FRAME)) == _legacy_crc16(_FRAME)
+    assert k.inet_aton(_IP) == _legacy_aton(_IP)
+    assert k.fmt_bssid(_BSSID) == _legacy_bssid(_BSSID)
+    assert k.qname_end(_QUERY, 12, len(_QUERY)) == len(_QUERY) - 4
+    assert k.name_eq(_QUERY, 12, len(_QUERY), k.wire_name("PICO.local"))
+    a = bytearray(480)
+    _legacy_rgb565(_PIXELS, _PAL, a)
+    k.expand_rgb565(_PIXELS, len(_PIXELS), _PAL, _DST)
+    assert a == _DST
+
+
+def main(loops=200):
+    _check()
+    print("kernels: %s" % ("viper" if kernels.COMPILED else "pure Python fallback"))
+    print("%-22s %9s %9s %9s %8s" % ("kernel", "legacy", "python", "kernel", "speedup"))
+    for name, legacy, py, kern in _cases():
+        t_legacy = _time(legacy, loops)
+        t_py = _time(py, loops)
+        t_kern = _time(kern, loops)
+        print(
+            "%-22s %9.1f %9.1f %9.1f %7.1fx"
+            % (name, t_legacy, t_py, t_kern, t_legacy / t_kern if t_kern else 0)
+        )
+
+
+main()
@@ -0,0 +1,35 @@
+# bootprof.py - 開機階段計時：記錄每個匯入/初始化階段完成時的 ticks_ms 與可用堆積
+# main.py 在各階段後呼叫 mark()；SYS BOOT 可事後查看。
+# config.BOOT_PROFILE=True 時每階段先 gc.collect() 讓堆積數字可比較，並即時印出。
+
+import gc
+import time
+
+try:
+    from config import BOOT_PROFILE
+except ImportError:
+    BOOT_PROFILE = False
+
+stages = []  # [(名稱, ticks_ms, mem_free), ...]；ticks_ms 從上電起算
+
+
+def mark(stage: str) -> None:
+    if BOOT_PROFILE:
+        gc.collect()
+    now = time.ticks_ms()
+    free = gc.mem_free()
+    stages.append((stage, now, free))
+    if BOOT_PROFILE:
+        print("[boot] %6d ms  free=%7d  %s" % (now, free, stage))
+
+
+def report_lines():
+    """逐行產生：累計時間、與上一階段的差、可用堆積。"""
+    prev_t = None
+    prev_free = None
+    for stage, t, free in stages:
+        dt = time.ticks_diff(t, prev_t) if prev_t is not None else t
+        dfree = free - prev_free if prev_free is not None else 0
+        yield "%s t=%dms +%dms free=%d (%+d)" % (stage, t, dt, free, dfree)
+        prev_t = t
+        prev_free = free
@@ -4,3 +4,53 @@ FORCE_HEADLESS = False
 # 開機時自動開 AP (PicoSetup/pico1234) + HTTP 設定頁，方便手機設定 Wi-Fi。
 # 若不需要可設 False。
 AUTO_CONFIG_AP_ON_BOOT = True
+
+# LCD 每秒最多刷新幾次；同一輪主迴圈內的多次繪圖會合併成一次 SPI 傳輸。
+LCD_MAX_FPS = 30
+
+# 按鍵：消抖、長按（HOLD）與按住自動連發的時間（ms）；連發間隔每次乘上 KEY_REPEAT_ACCEL_PCT% 直到下限。
+KEY_DEBOUNCE_MS = 30
+KEY_HOLD_MS = 600
+KEY_REPEAT_DELAY_MS = 400
+KEY_REPEAT_START_MS = 180
+KEY_REPEAT_MIN_MS = 40
+KEY_REPEAT_ACCEL_PCT = 80
+# 按住時會自動連發的鍵；確認/返回類按鍵連發容易誤觸，預設只有方向鍵與 A（刪字）。
+KEY_REPEAT_KEYS = ("UP", "DN", "LEFT", "RIGHT", "A")
+
+# True：改用 asyncio 事件迴圈（async_runtime.py），各服務為獨立 task；False：沿用輪詢主迴圈。
+USE_ASYNCIO = False
+
+# True：TCP 指令/HTTP/DNS/mDNS 改在 RP2350 第二核心（_thread）執行，UI 與按鍵留在 core 0；
+# 與 USE_ASYNCIO 同時開啟時以 USE_ASYNCIO 為準。
+NET_ON_CORE1 = False
+
+# True：開機即記錄主迴圈各步驟、每種指令、每個 HTTP 路徑的耗時（SYS PERF / GET /perf 查看）；
+# 也可在執行中用 SYS PERF ON/OFF 切換。
+PERF_ENABLED = False
+
+# True：開機即記錄各服務呼叫/指令/HTTP 路徑的堆積配置量與 GC 次數（SYS MEM / GET /mem 查看）；
+# 量測本身較耗時，只建議除錯時開啟，也可用 SYS MEM ON/OFF 切換。
+MEMPROF_ENABLED = False
+
+# True：開機時印出每個匯入/初始化階段的時間與可用堆積（每階段先 gc.collect()，開機略慢）；
+# 不論設定為何都可用 SYS BOOT 查看各階段紀錄。
+BOOT_PROFILE = False
+
+# True：STA 斷線或開機時，以 wifi_profiles.json 內曾成功連線的設定檔自動重連（指數退避重試）；
+# 每次手動連線成功都會存成設定檔。
+WIFI_AUTO_RECONNECT = True
+
+# True：STA 訊號持續偏弱、且最近的掃描結果中同 SSID 有明顯較強的 AP 時，主動漫遊過去（linkmon.py）。
+WIFI_ROAM_ENABLED = True
+
+# True：STA 連上上游網路後，Captive DNS 只在本機回答 DNS_LOCAL_NAMES（與各系統的連線檢查名稱），
+# 其他名稱轉送給 STA 取得的 DNS 伺服器並快取結果，AP 上的手機也能查到其他主機；False：一律回 Pico 的 IP。
+DNS_FORWARD = True
+DNS_LOCAL_NAMES = ("pico.pi.com", "www.pico.pi.com")
+
+# 韌體版本：放在 mDNS/DNS-SD 的 TXT 記錄（fw=…），瀏覽網段時可一次看出各閘道器的版本。
+FIRMWARE_VERSION = "1.0.0"
+
+# Modbus TCP 伺服器埠；0 表示未啟用（目前韌體尚無 Modbus TCP 伺服器），設定後 mDNS 會以 _modbus._tcp 廣告。
+MODBUS_TCP_PORT = 0
@@ -0,0 +1,141 @@
+# core1_net.py - 把網路服務移到 RP2350 第二核心（_thread 在 rp2 上即是 core 1）
+# core 1：TCP 指令（12345）、HTTP、Captive DNS、mDNS 的 poll 迴圈，指令處理（LED/RS485）也在這裡執行。
+# core 0：LCD UI、按鍵、電量；wlan.scan()、阻塞連線與 LCD 刷新不再拖慢網路回應。
+# 兩核心只透過下方兩個加鎖佇列交換訊息，不直接呼叫對方的服務。
+# 由 main.py 在 config.NET_ON_CORE1=True 時使用。
+
+import _thread
+import time
+
+import Server_CMD
+import Web_Page
+import wifi_Scan_Connect as wsc
+import udp_service
+from net_poller import make_service_poller
+
+NET_TICK_MS = 20  # core 1 每輪 poll 最長等待
+LINK_CHECK_MS = 500  # 檢查 STA IP 變化的間隔
+
+
+class LockedQueue:
+    """固定容量 FIFO，以 _thread 鎖保護，兩核心各自 put/get；滿了丟棄新訊息並計數。"""
+
+    def __init__(self, size: int):
+        self._buf = [None] * size
+        self._head = 0
+        self._len = 0
+        self._lock = _thread.allocate_lock()
+        self.dropped = 0
+
+    def put(self, item) -> bool:
+        with self._lock:
+            n = len(self._buf)
+            if self._len >= n:
+                self.dropped += 1
+                return False
+            self._buf[(self._head + self._len) % n] = item
+            self._len += 1
+            return True
+
+    def get(self):
+        """取出最舊的一筆；佇列空時回傳 None（不阻塞）。"""
+        with self._lock:
+            if not self._len:
+                return None
+            item = self._buf[self._head]
+            self._buf[self._head] = None
+            self._head = (self._head + 1) % len(self._buf)
+            self._len -= 1
+            return item
+
+
+# core 0 → core 1：("start",) 開 TCP/HTTP 伺服器；("mdns", hostname) 啟動 mDNS（core 0 在 STA 連上後才送）
+to_net = LockedQueue(8)
+# core 1 → core 0：("wifi", ip)，STA IP 改變時通知（未連線為 ""），UI 可據此重繪狀態頁；
+# ("connect", ssid, psk)，網頁送出的連線要求：WifiConnector 只由 core 0 操作，core 1 不直接呼叫 start()
+to_ui = LockedQueue(16)
+
+_started = False
+
+
+def _handle(msg):
+    kind = msg[0]
+    if kind == "start":
+        # socket 在 core 1 建立，之後只由 core 1 使用
+        if Server_CMD.server_sock is None:
+            try:
+                Server_CMD.start_cmd_server()
+            except Exception as e:
+                print("core1 cmd server error:", e)
+        if Web_Page.http_sock is None:
+            try:
+                Web_Page.start_http_server()
+            except Exception as e:
+                print("core1 HTTP server error:", e)
+    elif kind == "mdns":
+        if udp_service.get("mdns") is None:
+            try:
+                from mdns_service import MDNSResponder
+
+                MDNSResponder(hostname=msg[1], ip_getter=wsc.sta_ip).start()
+            except Exception as e:
+                print("core1 mDNS start failed:", e)
+
+
+def _link_ip():
+    st = wsc.net_state.get()
+    return st.sta_ip if st.sta_connected else ""
+
+
+def _net_loop():
+    poller = make_service_poller()
+    last_ip = None
+    next_check = time.ticks_ms()
+    while True:
+        msg = to_net.get()
+        while msg is not None:
+            _handle(msg)
+            msg = to_net.get()
+        try:
+            poller.run_once(min(NET_TICK_MS, udp_service.tick()))
+        except Exception as e:
+            # 不讓單次錯誤結束 core 1，否則網路服務會無聲停擺
+            print("core1 poll error:", e)
+        now = time.ticks_ms()
+        if time.ticks_diff(now, next_check) >= 0:
+            next_check = time.ticks_add(now, LINK_CHECK_MS)
+            ip = _link_ip()
+            if ip != last_ip:
+                last_ip = ip
+                to_ui.put(("wifi", ip))
+
+
+def start() -> None:
+    """啟動 core 1 網路迴圈（只會啟動一次）；伺服器要等 request_services() 才開。
+    Captive DNS 在 core 0 開 AP 時建立並登記到 udp_service，之後由 core 1 的 poll 迴圈服務。"""
+    global _started
+    if _started:
+        return
+    _started = True
+    Web_Page.connect_handler = request_connect
+    _thread.start_new_thread(_net_loop, ())
+    print("network services running on core 1")
+
+
+def request_services() -> None:
+    """請 core 1 開啟 TCP 指令與 HTTP 伺服器（可重複呼叫）。"""
+    to_net.put(("start",))
+
+
+def request_mdns(hostname: str = "pico") -> None:
+    to_net.put(("mdns", hostname))
+
+
+def request_connect(ssid: str, psk: str) -> bool:
+    """（core 1）把網頁的連線要求交給 core 0；佇列滿回 False。"""
+    return to_ui.put(("connect", ssid, psk))
+
+
+def pop_ui_event():
+    """core 0 取出一筆 core 1 的通知；沒有則回傳 None。"""
+    return to_ui.get()
@@ -1,132 +1,207 @@
 # dns_captive.py - 極簡 DNS 假門牌伺服器：任何查詢都回指定 IP（可動態更新）
-# 僅支援最基本的 A 記錄，輕量且適合 Pico。
+# 只回答 A 記錄；其他類型立即回空答案、壞封包回錯誤碼，都不讓用戶端空等逾時。輕量且適合 Pico。
+# 有上游 DNS 時（STA 已連線）改為分流：local_names 內的名稱仍回指定 IP，其餘轉送上游並快取（dns_forward）；
+# 只轉送來自 AP 網段的查詢，不能轉送的其他名稱回 REFUSED，不會把外部名稱指到 Pico，也不成為廠區 LAN 上的開放轉送器。
+# 不開執行緒：start() 後登記到 udp_service，由 poll 主迴圈或 asyncio 在 socket 可讀時呼叫 service()。
 
 import socket
-import _thread
 
-
-def _inet_aton(ip: str) -> bytes:
-    """MicroPython 有時沒有 socket.inet_aton，自己轉換。"""
-    if hasattr(socket, "inet_aton"):
-        try:
-            return socket.inet_aton(ip)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-    parts = (ip or "0.0.0.0").split(".")
-    if len(parts) != 4:
-        return b"\x00\x00\x00\x00"
-    try:
-        return bytes(int(p) & 0xFF for p in parts)
-    except Exception:
-        return b"\x00\x00\x00\x00"
+import dns_wire as dw
+import metrics
+import memprof
+import udp_service
 
 
-# 如果系統沒有 socket.inet_aton，補上一個
-if not hasattr(socket, "inet_aton"):
-    try:
-        socket.inet_aton = _inet_aton  # type: ignore[attr-defined]
-    except Exception:
-        pass
+MAX_QUERY = 512  # DNS over UDP 上限
 
 
 class CaptiveDNS:
-    def __init__(self, ip="192.168.4.1", port=53, ip_getter=None):
+    def __init__(self, ip="192.168.4.1", port=53, ip_getter=None, upstream=None, local_names=(), forward_from="192.168.4."):
         # 若提供 ip_getter，每次回應都會取最新 IP（例如 STA IP）。
+        # upstream() 回傳上游 DNS 位址 (ip, port)，None 表示不轉送、所有名稱都在本機回答；
+        # 測試時可指向本機的假上游。
+        # forward_from 為可使用轉送的用戶端位址前綴（AP 網段）；STA 那一側的 LAN 只能查 local_names。
         self.ip = ip
         self.ip_getter = ip_getter
+        self.upstream = upstream
+        self.forward_from = forward_from
+        self._local = [dw.wire_name(name) for name in local_names]
+        self._fwd = None  # DNSForwarder，第一次轉送時才載入
         self.port = port
         self._sock = None
-        self._thread = None
-        self._running = False
+        self._recv_into = False
+        # 收發共用的緩衝：查詢最長 512 bytes，回應再多一段答案尾端
+        self._buf = bytearray(MAX_QUERY + dw.A_RECORD_LEN)
+        self._mv = memoryview(self._buf)
+        # 指向問題名稱的 A 記錄，TTL 30 s；IP 由 _pack_ip 填入
+        self._tail = dw.a_record(30)
+        self._tail_ipmv = memoryview(self._tail)[12:16]
+        self._tail_ip = None
+
+    @property
+    def sock(self):
+        """底層 UDP socket（未啟動為 None），供事件迴圈註冊可讀事件。"""
+        return self._sock
 
     def start(self):
-        if self._running:
+        """綁定 UDP 53（非阻塞）並登記為 udp_service 的 "dns"。"""
+        if self._sock is not None:
             return
         try:
             self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self._sock.bind(("0.0.0.0", self.port))
-            self._running = True
-            self._thread = _thread.start_new_thread(self._loop, ())
+            self._sock.setblocking(False)
+            self._recv_into = hasattr(self._sock, "recvfrom_into")
+            udp_service.register("dns", self)
             print("Captive DNS started, all hosts ->", self.ip)
         except Exception as e:
             print("Captive DNS start failed:", e)
             self.stop()
 
     def stop(self):
-        self._running = False
+        udp_service.unregister("dns", self)
         try:
             if self._sock:
                 self._sock.close()
         except Exception:
             pass
         self._sock = None
-        self._thread = None
-
-    def _loop(self):
-        # DNS header: ID(2) | flags(2) | QD(2) | AN(2) | NS(2) | AR(2)
-        # 只回 A 記錄，且將查詢名稱指向指定 IP（或 ip_getter 回傳的 IP）。
-        while self._running:
-            if self._sock is None:
-                break
-            try:
-                self._sock.settimeout(1.0)
-                data, addr = self._sock.recvfrom(512)
-            except OSError:
-                continue
-            except Exception:
-                continue
-            if not data or len(data) < 12:
-                continue
-            tid = data[0:2]
-            flags = b"\x81\x80"  # standard query response, no error
-            qdcount = data[4:6]
-            # parse question to echo back
-            idx = 12
-            try:
-                l = data[idx]
-                while l and idx < len(data):
-                    idx += 1
-                    idx += l
-                    l = data[idx]
-                idx += 1  # skip zero
-                qtype = data[idx : idx + 2]
-                qclass = data[idx + 2 : idx + 4]
-            except Exception:
-                continue
-            question = data[12: idx + 4]
-            # only answer A
-            if qtype != b"\x00\x01":
-                continue
-
-            target_ip = self.ip
-            if self.ip_getter:
-                try:
-                    target_ip = self.ip_getter() or target_ip
-                except Exception:
-                    pass
-
-            ans = b"\xc0\x0c"  # pointer to name at offset 12
-            ans += b"\x00\x01"  # type A
-            ans += b"\x00\x01"  # class IN
-            ans += b"\x00\x00\x00\x1e"  # TTL 30s
-            ans += b"\x00\x04"  # RDLENGTH
-            ans += _inet_aton(target_ip)
-
-            resp = b"".join(
-                [
-                    tid,
-                    flags,
-                    qdcount,
-                    b"\x00\x01",
-                    b"\x00\x00",
-                    b"\x00\x00",
-                    question,
-                    ans,
-                ]
-            )
+
+    def service(self):
+        """收一個封包並回覆；沒有封包（EAGAIN）直接返回。
+        封包收進預先配置的緩衝，回應直接在同一塊緩衝上組好送出，不為每個查詢配置新物件。"""
+        buf = self._buf
+        try:
+            if self._recv_into:
+                n, addr = self._sock.recvfrom_into(buf, MAX_QUERY)
+            else:
+                # MicroPython 的 socket 沒有 recvfrom_into：收到的 bytes 複製進緩衝後即可丟棄
+                data, addr = self._sock.recvfrom(MAX_QUERY)
+                n = len(data)
+                dw.copy_into(buf, 0, data, n)
+        except Exception:
+            return
+        m0 = memprof.start()
+        up = self._upstream()
+        if up is None:
+            rlen = self.answer_into(buf, n)
+        else:
+            rlen = self._split(buf, n, addr, up)
+            if rlen < 0:
+                memprof.stop(memprof.UDP, "dns_fwd", m0)
+                return
+        memprof.stop(memprof.UDP, "dns", m0)
+        if not rlen:
+            return
+        try:
+            if self._sock:
+                self._sock.sendto(self._mv[:rlen], addr)
+                if dw.rcode(buf):
+                    metrics.inc(metrics.DNS_ERRORS)
+                elif buf[7]:
+                    metrics.inc(metrics.DNS_ANSWERED)
+                else:
+                    metrics.inc(metrics.DNS_NODATA)
+        except Exception:
+            pass
+
+    def _upstream(self):
+        if self.upstream is None:
+            return None
+        try:
+            return self.upstream()
+        except Exception:
+            return None
+
+    def _split(self, buf, n, addr, up) -> int:
+        """分流模式：交給 DNSForwarder 轉送、由快取回答或接收上游回應時回 -1（已處理）；
+        否則就地組好回應並回傳長度（0 為不回應）。local_names 與格式錯誤的封包由 answer_into() 回答，
+        其他名稱只有 AP 網段來的單一問題標準查詢會轉送，不能轉送時回 REFUSED。"""
+        if n < dw.HEADER_LEN:
+            return 0
+        if dw.is_response(buf):
+            if self._fwd is not None:
+                self._fwd.response(self._sock, buf, n, addr)
+            return -1
+        if dw.opcode(buf) or not dw.u16(buf, 4):
+            return self.answer_into(buf, n)
+        qend = dw.question_end(buf, n)
+        if qend < 0:
+            return self.answer_into(buf, n)
+        for name in self._local:
+            if dw.name_eq(buf, 12, n, name):
+                return self.answer_into(buf, n)
+        if dw.u16(buf, 4) != 1 or not addr[0].startswith(self.forward_from):
+            # 多問題查詢無法整包轉送；AP 網段以外的用戶端不提供轉送
+            dw.set_response(buf, dw.RCODE_REFUSED, an=0)
+            return qend
+        if self._fwd is None:
+            from dns_forward import DNSForwarder
+
+            self._fwd = DNSForwarder()
+        self._fwd.query(self._sock, buf, n, qend, addr, up)
+        return -1
+
+    def forwarder(self):
+        """目前的 DNSForwarder（尚未轉送過為 None）。"""
+        return self._fwd
+
+    def _target_ip(self):
+        target_ip = self.ip
+        if self.ip_getter:
             try:
-                if self._sock:
-                    self._sock.sendto(resp, addr)
+                target_ip = self.ip_getter() or target_ip
             except Exception:
                 pass
+        return target_ip
+
+    def _pack_ip(self, ip) -> None:
+        """IP 改變時才重新寫入回應尾端的 4 bytes。"""
+        if ip == self._tail_ip:
+            return
+        dw.set_ipv4(self._tail_ipmv, ip)
+        self._tail_ip = ip
+
+    def answer_into(self, buf, n: int) -> int:
+        """buf[:n] 為查詢；就地改寫成回應並回傳長度，不回應時回 0。buf 需比查詢多 16 bytes 空間。
+        A/ANY 回指定 IP；其他類型（AAAA、HTTPS/SVCB…）立即回 NOERROR 空答案，
+        讓手機不必等重送逾時才退回 IPv4；格式錯誤回 FORMERR，非標準查詢回 NOTIMP。"""
+        if n < dw.HEADER_LEN or dw.is_response(buf):
+            # 連 header 都不完整，或收到的是回應（QR=1）：不理會，避免與其他 DNS 伺服器互相回應
+            return 0
+        if dw.opcode(buf):
+            dw.set_response(buf, dw.RCODE_NOTIMP, qd=0, an=0)
+            return dw.HEADER_LEN
+        # 只看第一個問題；沒有問題、名稱不完整或有壓縮指標視為格式錯誤
+        idx = dw.question_end(buf, n) if dw.u16(buf, 4) else -1
+        if idx < 0:
+            dw.set_response(buf, dw.RCODE_FORMERR, qd=0, an=0)
+            return dw.HEADER_LEN
+        qtype = dw.q_type(buf, idx)
+        qclass = dw.q_class(buf, idx)
+        if idx + dw.A_RECORD_LEN > len(buf):
+            return 0
+        # 多問題查詢只回答第一題（QDCOUNT=1），其餘問題與 EDNS 等附加區一併捨棄
+        if qclass != dw.CLASS_IN and qclass != dw.CLASS_ANY:
+            dw.set_response(buf, dw.RCODE_REFUSED, an=0)
+            return idx
+        if qtype != dw.TYPE_A and qtype != dw.TYPE_ANY:
+            # NODATA：名稱存在但沒有該類型的記錄。不用 NXDOMAIN，以免把同名的 A 記錄也一起否定快取
+            dw.set_response(buf, an=0)
+            return idx
+        dw.set_response(buf)
+        self._pack_ip(self._target_ip())
+        # 問題區原地保留，其後接上固定的答案尾端
+        dw.copy_into(buf, idx, self._tail, dw.A_RECORD_LEN)
+        return idx + dw.A_RECORD_LEN
+
+    def answer(self, data):
+        """組出 DNS 回應（bytes）；不回應的封包回 None。service() 走不配置的 answer_into()。"""
+        if not data:
+            return None
+        n = len(data)
+        buf = bytearray(n + dw.A_RECORD_LEN)
+        buf[:n] = data
+        rlen = self.answer_into(buf, n)
+        return bytes(buf[:rlen]) if rlen else None
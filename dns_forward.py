@@ -0,0 +1,168 @@
+# dns_forward.py - Captive DNS 的轉送與快取：STA 連上上游網路後，設定頁以外的名稱轉送給上游 DNS，
+# 結果以 (名稱, 類型) 為鍵存進小型 LRU + TTL 快取，AP 上的手機重複查詢同一名稱時直接由快取回答。
+# 由 dns_captive.CaptiveDNS 在需要時才載入；送往上游與接收回應共用 CaptiveDNS 綁在 53 埠的 UDP socket，
+# poll / asyncio / 執行緒等事件迴圈不必多監看一個 socket。
+
+import random
+import time
+
+import dns_wire as dw
+import metrics
+
+CACHE_SIZE = 32  # 最多快取幾筆
+CACHE_MAX_BYTES = 8192  # 快取回應的總長度上限
+MIN_TTL = 5  # 秒；上游給的 TTL 夾在 MIN_TTL ~ MAX_TTL 之間當作快取時間
+MAX_TTL = 300
+NEG_TTL = 30  # 回應內沒有任何記錄可參考 TTL 時（例如 NXDOMAIN 未附 SOA）的快取秒數
+PENDING_MAX = 8  # 同時等待上游回應的查詢數，滿了丟掉最舊的一筆
+PENDING_TIMEOUT_MS = 3000  # 上游沒回應就放棄，用戶端會自行重送
+
+
+def _key(buf, qend) -> bytes:
+    """快取鍵：問題區的名稱（轉小寫）+ TYPE + CLASS；TYPE 可能落在 A-Z 範圍，不可一起轉小寫。"""
+    return bytes(buf[12 : qend - 4]).lower() + bytes(buf[qend - 4 : qend])
+
+
+class DNSForwarder:
+    def __init__(self):
+        # 鍵 -> [到期 ticks, 存入 ticks, 最後使用 ticks, 回應 bytes, TTL 欄位位置]
+        self._cache = {}
+        self._bytes = 0
+        # 每筆：[上游 ID, 鍵, 用戶端位址, 用戶端 ID, 用戶端原始問題區, 逾時 ticks]
+        self._pending = []
+        self._upstream = None
+
+    def clear(self) -> None:
+        self._cache = {}
+        self._bytes = 0
+        self._pending = []
+
+    # ---------- 用戶端查詢 ----------
+    def query(self, sock, buf, n, qend, addr, upstream) -> None:
+        """buf[:n] 為單一問題的標準查詢，qend 為問題區結尾；快取命中直接回覆，否則轉送給 upstream。"""
+        if upstream != self._upstream:
+            # 換了上游（STA 連到別的網路）：舊結果與等待中的查詢都不再適用
+            self.clear()
+            self._upstream = upstream
+        now = time.ticks_ms()
+        self._expire_pending(now)
+        key = _key(buf, qend)
+        e = self._cache.get(key)
+        if e is not None:
+            if time.ticks_diff(e[0], now) > 0:
+                metrics.inc(metrics.DNS_CACHE_HITS)
+                e[2] = now
+                rlen = self._from_cache(e, buf, qend, now)
+                self._send(sock, buf, rlen, addr)
+                return
+            self._drop(key)
+        self._forward(sock, buf, qend, key, addr, upstream, now)
+
+    def _from_cache(self, e, buf, qend, now) -> int:
+        """快取的回應寫進 buf：ID 與問題區（保留用戶端大小寫）沿用查詢，TTL 改為剩餘秒數。"""
+        resp = e[3]
+        rlen = len(resp)
+        dw.copy_into(buf, qend, memoryview(resp)[qend:], rlen - qend)
+        buf[2] = resp[2]
+        buf[3] = resp[3]
+        dw.copy_into(buf, 4, memoryview(resp)[4:12], 8)
+        age = time.ticks_diff(now, e[1]) // 1000
+        for off in e[4]:
+            ttl = (dw.u16(resp, off) << 16) | dw.u16(resp, off + 2)
+            dw.put_u32(buf, off, ttl - age if ttl > age else 0)
+        return rlen
+
+    def _forward(self, sock, buf, qend, key, addr, upstream, now) -> None:
+        if len(self._pending) >= PENDING_MAX:
+            self._pending.pop(0)
+        up_id = random.getrandbits(16)
+        while self._find(up_id) is not None:
+            up_id = (up_id + 1) & 0xFFFF
+        self._pending.append(
+            [up_id, key, addr, dw.u16(buf, 0), bytes(buf[12:qend]), time.ticks_add(now, PENDING_TIMEOUT_MS)]
+        )
+        # 只送 header + 問題區：去掉 EDNS 等附加記錄，上游回應就不會超過 512 bytes 的接收緩衝
+        dw.put_u16(buf, 0, up_id)
+        for i in range(6, 12):
+            buf[i] = 0
+        metrics.inc(metrics.DNS_FORWARDED)
+        self._send(sock, buf, qend, upstream)
+
+    def _find(self, up_id):
+        for p in self._pending:
+            if p[0] == up_id:
+                return p
+        return None
+
+    def _expire_pending(self, now) -> None:
+        while self._pending and time.ticks_diff(now, self._pending[0][5]) >= 0:
+            self._pending.pop(0)
+
+    # ---------- 上游回應 ----------
+    def response(self, sock, buf, n, addr) -> None:
+        """buf[:n] 為 QR=1 的封包：確認來自目前上游、ID 與問題都相符後存入快取並轉回用戶端。"""
+        up = self._upstream
+        if up is None or n < 12 or addr[0] != up[0] or addr[1] != up[1]:
+            return
+        p = self._find(dw.u16(buf, 0))
+        if p is None:
+            return
+        qend = dw.question_end(buf, n)
+        if qend < 0 or _key(buf, qend) != p[1]:
+            return
+        self._pending.remove(p)
+        rcode = dw.rcode(buf)
+        if not buf[2] & 0x02 and (rcode == 0 or rcode == 3):
+            # 只快取完整（非截斷）的 NOERROR / NXDOMAIN；SERVFAIL 等暫時性錯誤不留
+            self._store(p[1], buf, n, qend)
+        dw.put_u16(buf, 0, p[3])
+        dw.copy_into(buf, 12, p[4], qend - 12)
+        self._send(sock, buf, n, p[2])
+
+    # ---------- 快取 ----------
+    def _store(self, key, buf, n, qend) -> None:
+        scan = dw.scan_ttls(buf, n, qend)
+        if scan is None:
+            return
+        offs, low = scan
+        ttl = NEG_TTL if low is None else low
+        if ttl < MIN_TTL:
+            ttl = MIN_TTL
+        elif ttl > MAX_TTL:
+            ttl = MAX_TTL
+        if key in self._cache:
+            self._drop(key)
+        while self._cache and (len(self._cache) >= CACHE_SIZE or self._bytes + n > CACHE_MAX_BYTES):
+            self._evict()
+        now = time.ticks_ms()
+        self._cache[key] = [time.ticks_add(now, ttl * 1000), now, now, bytes(buf[:n]), offs]
+        self._bytes += n
+
+    def _drop(self, key) -> None:
+        e = self._cache.pop(key)
+        self._bytes -= len(e[3])
+
+    def _evict(self) -> None:
+        """丟掉最久沒用到的一筆（已過期的優先）。"""
+        now = time.ticks_ms()
+        old = None
+        old_age = -1
+        for k, e in self._cache.items():
+            if time.ticks_diff(e[0], now) <= 0:
+                old = k
+                break
+            age = time.ticks_diff(now, e[2])
+            if age > old_age:
+                old = k
+                old_age = age
+        self._drop(old)
+
+    def _send(self, sock, buf, n, addr) -> None:
+        try:
+            if sock:
+                sock.sendto(memoryview(buf)[:n], addr)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._cache), "bytes": self._bytes, "pending": len(self._pending)}
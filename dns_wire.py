@@ -0,0 +1,234 @@
+# dns_wire.py - DNS 封包格式（RFC 1035）的共用解析與組裝：Captive DNS、DNS 轉送、mDNS 共用
+# 逐位元組的名稱走訪/比對在 kernels（裝置上為 viper 版本）；這裡是 header 欄位、問題區與資源記錄的小工具，
+# 一律直接讀寫呼叫端的緩衝，不切片、不配置。
+
+# 名稱相關的 kernels 函式一併轉出，各服務只需匯入本模組
+from kernels import aton, copy_into, inet_aton, name_eq, qname_end, wire_name
+
+HEADER_LEN = 12
+A_RECORD_LEN = 16  # 名稱指標(2) TYPE(2) CLASS(2) TTL(4) RDLENGTH(2) IPv4(4)
+
+TYPE_A = 1
+TYPE_PTR = 12
+TYPE_TXT = 16
+TYPE_AAAA = 28
+TYPE_SRV = 33
+TYPE_OPT = 41
+TYPE_ANY = 255
+CLASS_IN = 1
+CLASS_ANY = 255
+
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+RCODE_REFUSED = 5
+
+_ZERO4 = b"\x00\x00\x00\x00"
+
+
+# ---------- 解析 ----------
+def u16(buf, i) -> int:
+    return (buf[i] << 8) | buf[i + 1]
+
+
+def is_response(buf) -> bool:
+    return bool(buf[2] & 0x80)
+
+
+def opcode(buf) -> int:
+    return (buf[2] >> 3) & 0x0F
+
+
+def rcode(buf) -> int:
+    return buf[3] & 0x0F
+
+
+def question_end(buf, n: int) -> int:
+    """第一個問題區的結尾（TYPE/CLASS 之後）；名稱不完整、含壓縮指標或封包太短為 -1。"""
+    if n < HEADER_LEN:
+        return -1
+    i = qname_end(buf, HEADER_LEN, n)
+    if i < 0 or i + 4 > n:
+        return -1
+    return i + 4
+
+
+def q_type(buf, qend: int) -> int:
+    return u16(buf, qend - 4)
+
+
+def q_class(buf, qend: int) -> int:
+    """問題的 CLASS；最高位元（mDNS 的 unicast-response 旗標）不計。"""
+    return u16(buf, qend - 2) & 0x7FFF
+
+
+def skip_name(buf, i: int, n: int) -> int:
+    """略過資源記錄內的名稱（可含壓縮指標），回傳其後位置；格式錯誤為 -1。"""
+    while i < n:
+        l = buf[i]
+        if l == 0:
+            return i + 1
+        if l & 0xC0 == 0xC0:
+            return i + 2
+        if l & 0xC0:
+            return -1
+        i += l + 1
+    return -1
+
+
+def scan_ttls(buf, n: int, i: int):
+    """從問題區之後的 i 走過所有資源記錄，回傳 (TTL 欄位位置, 最小 TTL 或 None)；格式錯誤回 None。
+    EDNS 的 OPT 記錄 TTL 欄位另有用途，不列入。"""
+    count = u16(buf, 6) + u16(buf, 8) + u16(buf, 10)
+    offs = []
+    low = None
+    for _ in range(count):
+        i = skip_name(buf, i, n)
+        if i < 0 or i + 10 > n:
+            return None
+        if u16(buf, i) != TYPE_OPT:
+            # 最高位元為 1 的 TTL 依 RFC 2181 視為 0
+            ttl = 0 if buf[i + 4] & 0x80 else (u16(buf, i + 4) << 16) | u16(buf, i + 6)
+            offs.append(i + 4)
+            if low is None or ttl < low:
+                low = ttl
+        i += 10 + u16(buf, i + 8)
+        if i > n:
+            return None
+    return tuple(offs), low
+
+
+# ---------- 組裝 ----------
+def put_u16(buf, i: int, v: int) -> None:
+    buf[i] = (v >> 8) & 0xFF
+    buf[i + 1] = v & 0xFF
+
+
+def put_u32(buf, i: int, v: int) -> None:
+    buf[i] = (v >> 24) & 0xFF
+    buf[i + 1] = (v >> 16) & 0xFF
+    buf[i + 2] = (v >> 8) & 0xFF
+    buf[i + 3] = v & 0xFF
+
+
+def set_response(buf, rcode: int = 0, qd: int = 1, an: int = 1, aa: bool = False, ra: bool = True) -> None:
+    """把查詢的 header 就地改成回應：ID 沿用、QR=1、保留 opcode 與 RD，NS/AR 清 0。"""
+    buf[2] = 0x80 | (0x04 if aa else 0) | (buf[2] & 0x79)
+    buf[3] = (0x80 if ra else 0) | rcode
+    put_u16(buf, 4, qd)
+    put_u16(buf, 6, an)
+    buf[8] = 0
+    buf[9] = 0
+    buf[10] = 0
+    buf[11] = 0
+
+
+def a_record(ttl: int, cls: int = CLASS_IN) -> bytearray:
+    """指向問題名稱（偏移 12）的 A 記錄，IPv4 先填 0，之後以 set_ipv4() 寫入 rec[12:16]。"""
+    rec = bytearray(A_RECORD_LEN)
+    rec[0] = 0xC0
+    rec[1] = HEADER_LEN
+    put_u16(rec, 2, TYPE_A)
+    put_u16(rec, 4, cls)
+    put_u32(rec, 6, ttl)
+    put_u16(rec, 10, 4)
+    return rec
+
+
+def set_ipv4(dst, ip: str) -> None:
+    """"a.b.c.d" 寫進 dst[0:4]（dst 通常是 A 記錄尾端的 memoryview）；格式錯誤寫 0.0.0.0。"""
+    src = ip.encode()
+    if not aton(src, len(src), dst):
+        copy_into(dst, 0, _ZERO4, 4)
+
+
+# ---------- 完整名稱（mDNS / DNS-SD 用，會配置字串，不在 Captive DNS 熱路徑使用） ----------
+def read_name(buf, i: int, n: int):
+    """讀出 buf[i] 的名稱（可含壓縮指標），回傳 (小寫、以 "." 連接的字串, 名稱之後的位置)；格式錯誤回 (None, -1)。"""
+    labels = []
+    end = -1
+    hops = 0
+    while i < n:
+        l = buf[i]
+        if l == 0:
+            return ".".join(labels).lower(), (i + 1 if end < 0 else end)
+        if l & 0xC0 == 0xC0:
+            # 壓縮指標最多跟 16 次，防止惡意封包形成迴圈
+            if i + 1 >= n or hops >= 16:
+                break
+            if end < 0:
+                end = i + 2
+            i = ((l & 0x3F) << 8) | buf[i + 1]
+            hops += 1
+            continue
+        if l & 0xC0 or i + 1 + l > n:
+            break
+        try:
+            labels.append(str(bytes(buf[i + 1 : i + 1 + l]), "utf-8"))
+        except UnicodeError:
+            break
+        i += l + 1
+    return None, -1
+
+
+class Writer:
+    """組封包：header 先留 12 bytes，名稱自動壓縮（相同後綴只寫一次），RDATA 長度在 end_rr() 回填。"""
+
+    def __init__(self, qid: int = 0, flags: int = 0x8400):
+        self.buf = bytearray(HEADER_LEN)
+        put_u16(self.buf, 0, qid)
+        put_u16(self.buf, 2, flags)
+        self._names = {}
+        self._counts = [0, 0, 0, 0]  # QD / AN / NS / AR
+
+    def u16(self, v: int) -> None:
+        self.buf.append((v >> 8) & 0xFF)
+        self.buf.append(v & 0xFF)
+
+    def u32(self, v: int) -> None:
+        self.u16((v >> 16) & 0xFFFF)
+        self.u16(v & 0xFFFF)
+
+    def name(self, name: str) -> None:
+        labels = name.split(".")
+        for k in range(len(labels)):
+            suffix = ".".join(labels[k:]).lower()
+            off = self._names.get(suffix)
+            if off is not None:
+                self.u16(0xC000 | off)
+                return
+            if len(self.buf) < 0x3FFF:
+                self._names[suffix] = len(self.buf)
+            b = labels[k].encode()
+            self.buf.append(len(b))
+            self.buf += b
+        self.buf.append(0)
+
+    def question(self, name: str, qtype: int, qclass: int = CLASS_IN) -> None:
+        self.name(name)
+        self.u16(qtype)
+        self.u16(qclass)
+        self._counts[0] += 1
+
+    def begin_rr(self, section: int, name: str, rtype: int, rclass: int, ttl: int) -> int:
+        """section：1 答案、2 授權、3 附加；回傳 RDLENGTH 的位置，寫完 RDATA 後交給 end_rr()。"""
+        self.name(name)
+        self.u16(rtype)
+        self.u16(rclass)
+        self.u32(ttl)
+        pos = len(self.buf)
+        self.u16(0)
+        self._counts[section] += 1
+        return pos
+
+    def end_rr(self, pos: int) -> None:
+        put_u16(self.buf, pos, len(self.buf) - pos - 2)
+
+    def count(self, section: int) -> int:
+        return self._counts[section]
+
+    def packet(self) -> bytes:
+        for k in range(4):
+            put_u16(self.buf, 4 + 2 * k, self._counts[k])
+        return bytes(self.buf)
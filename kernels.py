@@ -0,0 +1,150 @@
+# kernels.py - 熱路徑上的逐位元組小函式：DNS 問題名稱走訪、IPv4 字串轉換、BSSID 格式化、
+# Modbus CRC16、調色盤索引轉 RGB565。
+# 在裝置上使用 kernels_viper 的 @micropython.viper 版本；匯入失敗（CPython 模擬器）時
+# 改用下方同介面的純 Python 版本。COMPILED 表示目前用的是哪一種，bench_kernels.py 比較兩者。
+#
+# 底層函式一律明確傳入長度、寫進呼叫端提供的緩衝，不配置記憶體：
+#   qname_end(buf, i, n)            從 buf[i] 走過未壓縮的 DNS 名稱，回傳結尾 0 之後的位置；格式錯誤為 -1
+#   name_eq(buf, i, n, name)        buf[i:] 的名稱是否等於 name（wire 格式、小寫、以 0 結尾）；不分大小寫
+#   aton(src, n, dst)               "a.b.c.d"（bytes）寫進 dst[0:4]；成功 1、格式錯誤 0
+#   hex_colon(src, n, dst)          n 個位元組寫成 "AA:BB:..."（3n-1 bytes）
+#   crc16(buf, n)                   Modbus RTU CRC16（多項式 0xA001，初值 0xFFFF）
+#   expand_rgb565(src, n, pal, dst) n 個調色盤索引展開成 RGB565；pal 每色 2 bytes，依 framebuffer 位元組序存放
+#   copy_into(dst, off, src, n)     src[0:n] 複製到 dst[off:off+n]（不建立 slice 物件）
+# 另有配置回傳值的便利包裝 inet_aton / fmt_bssid：裝置上為 kernels_viper 的 @micropython.native 版本。
+#
+# 純 Python 版本只在主機（CPython）上用；能交給 C 實作的 bytes 方法（切片比較、split、int）
+# 就不逐位元組迴圈，bench_kernels.py 在主機上不應比改寫前的寫法慢。
+
+
+def _py_qname_end(buf, i, n):
+    while i < n:
+        l = buf[i]
+        if l == 0:
+            return i + 1
+        if l & 0xC0:
+            # 問題區不應出現壓縮指標
+            return -1
+        i += l + 1
+    return -1
+
+
+def _py_name_eq(buf, i, n, name):
+    # 長度位元組都小於 64，lower() 只影響標籤內的 A-Z
+    m = len(name)
+    if i + m > n:
+        return False
+    return bytes(buf[i : i + m]).lower() == name
+
+
+def _py_aton(src, n, dst):
+    parts = bytes(src[:n]).split(b".")
+    if len(parts) != 4:
+        return 0
+    for k in range(4):
+        p = parts[k]
+        # isdigit() 排除空字串、正負號、空白與底線（int() 會接受後三者）
+        if not p.isdigit() or len(p) > 3:
+            return 0
+        v = int(p)
+        if v > 255:
+            return 0
+        dst[k] = v
+    return 1
+
+
+_HEX = b"0123456789ABCDEF"
+
+
+def _py_hex_colon(src, n, dst):
+    j = 0
+    for i in range(n):
+        if i:
+            dst[j] = 58  # ':'
+            j += 1
+        c = src[i]
+        dst[j] = _HEX[c >> 4]
+        dst[j + 1] = _HEX[c & 15]
+        j += 2
+
+
+def _py_crc16(buf, n):
+    crc = 0xFFFF
+    for i in range(n):
+        crc ^= buf[i]
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def _py_expand_rgb565(src, n, pal, dst):
+    j = 0
+    for i in range(n):
+        k = src[i] << 1
+        dst[j] = pal[k]
+        dst[j + 1] = pal[k + 1]
+        j += 2
+
+
+def _py_copy_into(dst, off, src, n):
+    for i in range(n):
+        dst[off + i] = src[i]
+
+
+# ---------- 便利包裝（會配置回傳值，不在最內層迴圈使用） ----------
+_ZERO_IP = b"\x00\x00\x00\x00"
+
+
+def _py_inet_aton(ip: str) -> bytes:
+    """"192.168.4.1" -> 4 bytes；格式錯誤或空字串回傳 0.0.0.0。"""
+    if not ip:
+        return _ZERO_IP
+    src = ip.encode()
+    out = bytearray(4)
+    if not aton(src, len(src), out):
+        return _ZERO_IP
+    return bytes(out)
+
+
+def _py_fmt_bssid(b) -> str:
+    """BSSID 轉字串（"AA:BB:CC:DD:EE:FF"）。"""
+    n = len(b)
+    if not n:
+        return ""
+    out = bytearray(3 * n - 1)
+    hex_colon(b, n, out)
+    return str(out, "ascii")
+
+
+try:
+    from kernels_viper import qname_end, name_eq, aton, hex_colon, crc16, expand_rgb565, copy_into
+    from kernels_viper import inet_aton, fmt_bssid
+
+    COMPILED = True
+except (ImportError, AttributeError, NameError, SyntaxError):
+    qname_end = _py_qname_end
+    name_eq = _py_name_eq
+    aton = _py_aton
+    hex_colon = _py_hex_colon
+    crc16 = _py_crc16
+    expand_rgb565 = _py_expand_rgb565
+    copy_into = _py_copy_into
+    inet_aton = _py_inet_aton
+    fmt_bssid = _py_fmt_bssid
+    COMPILED = False
+
+
+def wire_name(name: str) -> bytes:
+    """"pico.local" -> b"\\x04pico\\x05local\\x00"（小寫），供 name_eq 比對。"""
+    out = bytearray()
+    for label in name.lower().split("."):
+        if label:
+            b = label.encode()
+            out.append(len(b))
+            out += b
+    out.append(0)
+    return bytes(out)
+
@@ -0,0 +1,141 @@
+# kernels_viper.py - kernels.py 的 @micropython.viper 版本（只能在 MicroPython 上編譯）
+# 不要直接匯入，請用 kernels；在 CPython/模擬器上匯入會失敗，kernels 會改用純 Python 版本。
+# 每個函式的參數與回傳值必須與 kernels.py 內的 _py_* 版本完全一致（viper 最多 4 個參數）。
+# @micropython.viper / @micropython.native 由編譯器依名稱辨識，只能照字面寫在這裡，不能當函式匯入。
+
+import micropython
+
+_HEX = b"0123456789ABCDEF"
+_ZERO_IP = b"\x00\x00\x00\x00"
+
+
+@micropython.viper
+def qname_end(buf: ptr8, i: int, n: int) -> int:
+    while i < n:
+        l = buf[i]
+        if l == 0:
+            return i + 1
+        if l & 0xC0:
+            return -1
+        i += l + 1
+    return -1
+
+
+@micropython.viper
+def name_eq(buf: ptr8, i: int, n: int, name: ptr8) -> bool:
+    j = 0
+    while True:
+        if i + j >= n:
+            return False
+        c = buf[i + j]
+        if c >= 65 and c <= 90:
+            c += 32
+        if c != name[j]:
+            return False
+        if c == 0:
+            return True
+        j += 1
+
+
+@micropython.viper
+def aton(src: ptr8, n: int, dst: ptr8) -> int:
+    part = 0
+    val = 0
+    digits = 0
+    i = 0
+    while i < n:
+        c = src[i]
+        if c == 46:  # '.'
+            if digits == 0 or part >= 3:
+                return 0
+            dst[part] = val
+            part += 1
+            val = 0
+            digits = 0
+        elif c >= 48 and c <= 57:
+            val = val * 10 + c - 48
+            digits += 1
+            if val > 255:
+                return 0
+        else:
+            return 0
+        i += 1
+    if digits == 0 or part != 3:
+        return 0
+    dst[3] = val
+    return 1
+
+
+@micropython.viper
+def hex_colon(src: ptr8, n: int, dst: ptr8):
+    hexd = ptr8(_HEX)
+    i = 0
+    j = 0
+    while i < n:
+        if i:
+            dst[j] = 58  # ':'
+            j += 1
+        c = src[i]
+        dst[j] = hexd[c >> 4]
+        dst[j + 1] = hexd[c & 15]
+        j += 2
+        i += 1
+
+
+@micropython.viper
+def crc16(buf: ptr8, n: int) -> int:
+    crc = 0xFFFF
+    i = 0
+    while i < n:
+        crc ^= buf[i]
+        k = 8
+        while k:
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+            k -= 1
+        i += 1
+    return crc
+
+
+@micropython.viper
+def expand_rgb565(src: ptr8, n: int, pal: ptr8, dst: ptr8):
+    i = 0
+    j = 0
+    while i < n:
+        k = src[i] << 1
+        dst[j] = pal[k]
+        dst[j + 1] = pal[k + 1]
+        j += 2
+        i += 1
+
+
+@micropython.viper
+def copy_into(dst: ptr8, off: int, src: ptr8, n: int):
+    i = 0
+    while i < n:
+        dst[off + i] = src[i]
+        i += 1
+
+
+# ---------- 便利包裝（會配置回傳值）：native 碼，內部呼叫上面的 viper 函式 ----------
+@micropython.native
+def inet_aton(ip: str) -> bytes:
+    if not ip:
+        return _ZERO_IP
+    src = ip.encode()
+    out = bytearray(4)
+    if not aton(src, len(src), out):
+        return _ZERO_IP
+    return bytes(out)
+
+
+@micropython.native
+def fmt_bssid(b) -> str:
+    n = len(b)
+    if not n:
+        return ""
+    out = bytearray(3 * n - 1)
+    hex_colon(b, n, out)
+    return str(out, "ascii")
@@ -0,0 +1,163 @@
+# linkmon.py - Wi-Fi 連線品質監控：定期取樣 RSSI、斷線重連次數與送出錯誤，存入固定大小的 array('b') 環形緩衝
+# 訊號連續一段時間偏弱、且掃描快取中同 SSID 有明顯較強的 BSSID 時，主動漫遊過去，
+# 不必等到完全斷線才由 auto_reconnect() 重連；掃描快取過舊時自行要求背景掃描（由 service_scan() 執行）。
+# 由 SYS WIFI HIST 與 GET /wifi/history 讀取。
+# 主迴圈 / asyncio task 每輪呼叫 tick()（內部限速，每 SAMPLE_MS 取樣一次）。
+
+import time
+from array import array
+
+import metrics
+import wifi_profiles
+import wifi_Scan_Connect as wsc
+
+try:
+    from config import WIFI_ROAM_ENABLED
+except ImportError:
+    WIFI_ROAM_ENABLED = True
+
+SAMPLE_MS = 2000
+HISTORY = 120  # 取樣筆數（2 s 一筆約 4 分鐘）
+NO_SIGNAL = -128  # 未連線時的 RSSI 記號
+
+ROAM_RSSI = -75  # 低於此值（dBm）視為訊號偏弱
+ROAM_SAMPLES = 5  # 連續幾筆偏弱才考慮漫遊（約 10 s）
+ROAM_MARGIN = 8  # 候選 BSSID 至少要強這麼多 dB
+ROAM_SCAN_MAX_AGE_MS = 120000  # 掃描快取超過此時間不採用
+ROAM_SCAN_EVERY_MS = 60000  # 訊號偏弱時自行要求掃描的最短間隔（wlan.scan() 會阻塞 core 0 約 1~2 s）
+ROAM_COOLDOWN_MS = 120000  # 兩次漫遊的最短間隔，避免在兩台 AP 之間來回跳
+
+_rssi = array("b", [NO_SIGNAL] * HISTORY)
+_reconn = array("b", [0] * HISTORY)  # 該區間內 STA 斷線（需重連）次數
+_txerr = array("b", [0] * HISTORY)  # 該區間內 socket 送出失敗次數
+_head = 0  # 下一筆寫入位置
+_count = 0
+_next_ms = 0
+_last_lost = 0
+_last_tx = 0
+_weak = 0  # 目前連續偏弱的筆數
+_roam_after = 0
+_scan_after = 0
+
+
+def _delta(now_v: int, prev_v: int) -> int:
+    d = (now_v - prev_v) & 0xFFFFFFFF
+    return d if d < 127 else 127
+
+
+def _read_rssi() -> int:
+    v = wsc.net_state.get().rssi
+    if v is None:
+        return NO_SIGNAL
+    if v < -127:
+        return -127
+    return v if v < 127 else 127
+
+
+def tick() -> None:
+    """非阻塞：到了取樣時間才讀一次 RSSI 與計數器，寫入環形緩衝並檢查是否要漫遊。"""
+    global _head, _count, _next_ms, _last_lost, _last_tx
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _next_ms) < 0:
+        return
+    _next_ms = time.ticks_add(now, SAMPLE_MS)
+    rssi = _read_rssi()
+    lost = metrics.value(metrics.WIFI_LINK_LOST)
+    tx = metrics.value(metrics.NET_TX_ERR)
+    _rssi[_head] = rssi
+    _reconn[_head] = _delta(lost, _last_lost)
+    _txerr[_head] = _delta(tx, _last_tx)
+    _last_lost = lost
+    _last_tx = tx
+    _head = (_head + 1) % HISTORY
+    if _count < HISTORY:
+        _count += 1
+    _maybe_roam(now, rssi)
+
+
+def _link_ssid() -> str:
+    """目前所連的 SSID：優先讀驅動；讀不到時用 connector 的連線，再不然用最近成功的設定檔。"""
+    ssid = wsc.link_ssid()
+    if ssid:
+        return ssid
+    c = wsc.connector
+    if c.state == wsc.CS_CONNECTED and c.ssid:
+        return c.ssid
+    lst = wifi_profiles.profiles()
+    return lst[0]["ssid"] if lst else ""
+
+
+def _maybe_roam(now, rssi) -> None:
+    global _weak, _roam_after, _scan_after
+    if rssi == NO_SIGNAL or rssi > ROAM_RSSI:
+        _weak = 0
+        return
+    _weak += 1
+    if not WIFI_ROAM_ENABLED or _weak < ROAM_SAMPLES:
+        return
+    if time.ticks_diff(now, _roam_after) < 0:
+        return
+    # 開機時 STA 可能早已連上（沒經過 connector），只要不是正在連線就可以漫遊
+    c = wsc.connector
+    if c.busy:
+        return
+    ssid = _link_ssid()
+    p = wifi_profiles.get(ssid) if ssid else None
+    if p is None:
+        return
+    age = wsc.cached_scan()[1]
+    if age is None or age > ROAM_SCAN_MAX_AGE_MS:
+        # 手動掃描的快取太舊或沒有：自行要求一次背景掃描，下一筆取樣再找候選
+        if time.ticks_diff(now, _scan_after) >= 0:
+            _scan_after = time.ticks_add(now, ROAM_SCAN_EVERY_MS)
+            wsc.request_scan()
+        return
+    cand = wsc.roam_candidate(ssid, rssi + ROAM_MARGIN, ROAM_SCAN_MAX_AGE_MS)
+    if cand is None:
+        return
+    bssid, channel, cand_rssi = cand
+    _weak = 0
+    _roam_after = time.ticks_add(now, ROAM_COOLDOWN_MS)
+    metrics.inc(metrics.WIFI_ROAMS)
+    print("roaming %s: %d dBm -> %s ch%d %d dBm" % (ssid, rssi, wifi_profiles.bssid_hex(bssid), channel, cand_rssi))
+    c.start(ssid, p["psk"], bssid, channel, owner="roam")
+
+
+def _ordered(buf, n: int):
+    """由舊到新取出最近 n 筆。"""
+    if n > _count:
+        n = _count
+    start = (_head - n) % HISTORY
+    return [buf[(start + i) % HISTORY] for i in range(n)]
+
+
+def history(n: int = HISTORY) -> dict:
+    """最近 n 筆取樣（由舊到新）；rssi 為 None 表示當時未連線。"""
+    rssi = [None if v == NO_SIGNAL else v for v in _ordered(_rssi, n)]
+    return {
+        "interval_ms": SAMPLE_MS,
+        "rssi": rssi,
+        "reconnects": _ordered(_reconn, n),
+        "tx_errors": _ordered(_txerr, n),
+        "roams": metrics.value(metrics.WIFI_ROAMS),
+        "weak_samples": _weak,
+    }
+
+
+def report_lines(n: int = 30):
+    """逐行產生文字報表，供 SYS WIFI HIST 使用。"""
+    h = history(n)
+    vals = [v for v in h["rssi"] if v is not None]
+    if vals:
+        yield "RSSI min=%d avg=%d max=%d (%d/%d connected)" % (
+            min(vals),
+            sum(vals) // len(vals),
+            max(vals),
+            len(vals),
+            len(h["rssi"]),
+        )
+    yield "RECONNECTS=%d TXERR=%d ROAMS=%d" % (sum(h["reconnects"]), sum(h["tx_errors"]), h["roams"])
+    yield "EVERY=%dms OLDEST->NEWEST" % SAMPLE_MS
+    yield "RSSI=" + ",".join("-" if v is None else str(v) for v in h["rssi"])
+    yield "RECONN=" + ",".join(str(v) for v in h["reconnects"])
+    yield "TXERR=" + ",".join(str(v) for v in h["tx_errors"])
@@ -1,8 +1,10 @@
 # main.py — Pico 2 W + Pico-LCD-1.3 重構版
 # 將功能拆分成 LCD_Control / wifi_Scan_Connect / Server_CMD / Button_Control / Web_Page / UI_Page
 # 方便後續維護與擴充：每個模組皆附中文註解，主程式專注於狀態機與事件分派。
+# LCD/UI、Web UI 頁面與 mDNS 皆延遲載入；各階段耗時與堆積由 bootprof 記錄（SYS BOOT）。
 
 import time
+import bootprof
 import machine
 
 try:
@@ -10,40 +12,79 @@ try:
 except ImportError:
     FORCE_HEADLESS = False
     AUTO_CONFIG_AP_ON_BOOT = True
+try:
+    from config import USE_ASYNCIO
+except ImportError:
+    USE_ASYNCIO = False
+try:
+    from config import NET_ON_CORE1
+except ImportError:
+    NET_ON_CORE1 = False
+# asyncio 模式自行管理所有服務，不再另開 core 1
+NET_ON_CORE1 = NET_ON_CORE1 and not USE_ASYNCIO
+bootprof.mark("config")
 
 from Button_Control import (
     keyA,
     keyB,
-    keyX,
-    keyY,
-    keyUP,
-    keyDN,
-    keyLEFT,
-    keyRIGHT,
-    keyCTRL,
     pressed,
-    wait_release,
-    debounce,
-    key_hold,
+    init_irq,
+    pop_event,
+    is_down,
+    held_ms,
+    EV_PRESS,
+    EV_HOLD,
+    EV_REPEAT,
 )
 
-# 若舊版 LCD_Control 無 LCD_AVAILABLE，改為 fallback 防止 ImportError
-try:
-    from LCD_Control import lcd, BLACK, WHITE, LCD_AVAILABLE
-except ImportError:
-    from LCD_Control import lcd, BLACK, WHITE
-    LCD_AVAILABLE = False
-import UI_Page as ui
+bootprof.mark("buttons")
+from wifi_Scan_Connect import start_config_ap, watch_ap_stations, auto_reconnect, service_scan, connector, net_state, sta_ip
+
+bootprof.mark("wifi")
 from Server_CMD import start_cmd_server, poll_cmd_server
 from Web_Page import start_http_server, poll_http_server
-from wifi_Scan_Connect import start_config_ap, wait_for_station, ap_station_count, wlan
-from mdns_service import MDNSResponder
-from Pico_UPS import read_battery, last_battery_error
+from net_poller import make_service_poller
+import udp_service
+import perf
+import memprof
+import linkmon
+
+bootprof.mark("servers")
+
+# LCD 驅動與 UI 由 load_ui() 在確定不是 FORCE_HEADLESS 時才載入（含 115 KB 畫面緩衝與 ST7789 初始化）
+lcd = None
+LCD_AVAILABLE = False
+ui = None
+
+
+def load_ui() -> bool:
+    """載入 LCD 驅動並偵測面板；可用時再載入 UI_Page。回傳 LCD 是否可用。"""
+    global lcd, LCD_AVAILABLE, ui
+    if FORCE_HEADLESS:
+        return False
+    import LCD_Control
+
+    lcd = LCD_Control.lcd
+    LCD_AVAILABLE = getattr(LCD_Control, "LCD_AVAILABLE", False) and not getattr(lcd, "_is_dummy", False)
+    if LCD_AVAILABLE:
+        import UI_Page
+
+        ui = UI_Page
+    return LCD_AVAILABLE
 
 
 # =============== 網路服務啟動 ===============
 def start_network_services():
-    """Wi-Fi 連上後開啟 TCP 與 HTTP 服務。"""
+    """開啟 TCP 與 HTTP 服務（開機即呼叫，監聽 0.0.0.0；重複呼叫不會重複綁定）。"""
+    if USE_ASYNCIO:
+        # asyncio 模式下伺服器開機即監聽 0.0.0.0，STA 連上後自然可用
+        return
+    if NET_ON_CORE1:
+        # socket 交給 core 1 建立與服務
+        import core1_net
+
+        core1_net.request_services()
+        return
     try:
         start_cmd_server()
         start_http_server()
@@ -53,21 +94,34 @@ def start_network_services():
 
 # =============== 重啟功能 ===============
 def reboot_when_ab_held(show_ui: bool = True):
-    """A+B 同時按住 2 秒觸發重啟。"""
+    """A+B 同時按住 2 秒觸發重啟（headless 輪詢版，會阻塞到放開或重啟）。"""
     if pressed(keyA) and pressed(keyB):
         t0 = time.ticks_ms()
         while pressed(keyA) and pressed(keyB):
             if time.ticks_diff(time.ticks_ms(), t0) >= 2000:
-                # 進入真正重啟前畫面提示，避免誤會程式當掉
-                if show_ui and LCD_AVAILABLE:
-                    lcd.fill(BLACK)
-                    lcd.text("Rebooting...", 60, 110, WHITE)
-                    lcd.show()
-                time.sleep_ms(300)
-                machine.reset()
+                _reboot(show_ui)
             time.sleep_ms(20)
 
 
+def check_reboot_combo():
+    """UI 模式用：依 IRQ 記錄的按住時間判斷 A+B，不阻塞主迴圈。"""
+    if is_down("A") and is_down("B"):
+        now = time.ticks_ms()
+        if held_ms("A", now) >= 2000 and held_ms("B", now) >= 2000:
+            _reboot(True)
+
+
+def _reboot(show_ui: bool):
+    # 進入真正重啟前畫面提示，避免誤會程式當掉
+    if show_ui and ui is not None:
+        lcd.fill(ui.BLACK)
+        lcd.text("Rebooting...", 60, 110, ui.WHITE)
+        ui.mark_dirty()
+        ui.present(force=True)
+    time.sleep_ms(300)
+    machine.reset()
+
+
 # =============== 致命錯誤處理 ===============
 def fail_halt(reason: str):
     """檢查失敗時停機並閃 LED 提示。"""
@@ -91,7 +145,7 @@ def run_system_checks(headless: bool):
     print("=== System checks ===")
     errors = []
 
-    if LCD_AVAILABLE and not getattr(lcd, "_is_dummy", False):
+    if LCD_AVAILABLE:
         print("LCD detected: ready")
     else:
         msg = "LCD not detected (headless mode)"
@@ -100,6 +154,8 @@ def run_system_checks(headless: bool):
             errors.append(msg)
 
     try:
+        from Pico_UPS import read_battery, last_battery_error
+
         batt = read_battery(force=True)
         if batt:
             print(
@@ -131,167 +187,264 @@ def run_system_checks(headless: bool):
         fail_halt(" | ".join(errors))
 
 
+# =============== 按鍵事件分派（宣告式按鍵表） ===============
+def _status_back():
+    """狀態頁返回：回到進入前的畫面。"""
+    prev = ui.stack.pop() if ui.stack else "home"
+    if prev == "list":
+        ui.render_list()
+    elif prev == "detail":
+        ui.show_detail()
+    elif prev == "connect":
+        ui.render_connect()
+    else:
+        ui.show_home()
+
+
+def _home_to_status():
+    ui.stack.append("home")
+    ui.show_status()
+
+
+def _on(key, fn, ev=EV_PRESS):
+    """單一按鍵事件對應一個動作。"""
+    return (((key, ev), fn),)
+
+
+def _on_repeat(key, fn):
+    """按下與自動連發都執行同一動作（方向鍵、刪字）。"""
+    return ((key, EV_PRESS), fn), ((key, EV_REPEAT), fn)
+
+
+def _keymap(*groups):
+    return {k: fn for group in groups for k, fn in group}
+
+
+# mode -> {(key, event): action}；新增畫面只要加一組對照，不會增加主迴圈每輪的工作量
+KEYMAP = {
+    "home": _keymap(
+        _on("A", lambda: ui.do_scan()),  # do_scan 內部會設定 mode 並切到列表頁
+        _on("B", _home_to_status),
+    ),
+    "list": _keymap(
+        _on_repeat("UP", lambda: ui.move_selection(-1)),
+        _on_repeat("DN", lambda: ui.move_selection(+1)),
+        _on("X", lambda: ui.show_home()),
+        _on("B", lambda: ui.show_detail()),
+        _on("Y", lambda: ui.show_connect_setup()),
+    ),
+    "detail": _keymap(
+        _on("X", lambda: ui.render_list()),
+    ),
+    "connect": _keymap(
+        _on("X", lambda: ui.render_list()),
+        _on_repeat("UP", lambda: ui.keypad_move(0, -1)),
+        _on_repeat("DN", lambda: ui.keypad_move(0, +1)),
+        _on_repeat("LEFT", lambda: ui.keypad_move(-1, 0)),
+        _on_repeat("RIGHT", lambda: ui.keypad_move(+1, 0)),
+        _on("Y", lambda: ui.keypad_press(start_network_services)),
+        # CTRL 需長按才送出連線，避免誤觸
+        _on("CTRL", lambda: ui.attempt_connect(start_network_services), EV_HOLD),
+        _on_repeat("A", lambda: ui.delete_char()),
+        _on("B", lambda: ui.clear_psk()),
+    ),
+    "connecting": _keymap(
+        _on("X", lambda: ui.cancel_connect()),
+    ),
+    "status": _keymap(
+        _on("X", _status_back),
+    ),
+}
+
+
+def dispatch_keys():
+    """取出所有排隊中的按鍵事件並查表分派；每個事件只依當下的 mode 查一次。"""
+    while True:
+        ev = pop_event()
+        if ev is None:
+            return
+        actions = KEYMAP.get(ui.mode)
+        if not actions:
+            continue
+        fn = actions.get((ev[0], ev[1]))
+        if fn is not None:
+            fn()
+
+
+def _probe(name, fn):
+    """執行 fn()；啟用 perf / memprof 時記錄這個主迴圈步驟的耗時與配置量。"""
+    t0 = perf.start()
+    m0 = memprof.start()
+    fn()
+    perf.stop(perf.LOOP, name, t0)
+    memprof.stop(memprof.LOOP, name, m0)
+
+
+def _refresh_gauge():
+    # 電量有變化時才標記抬頭區域，實際刷新交給 ui_tick() 尾端的 present()
+    ui.refresh_battery_gauge(commit=True)
+
+
+def ui_tick():
+    """UI 模式每輪工作：A+B 重啟檢查 → 按鍵分派 → 連線進度 → 合併刷新。"""
+    check_reboot_combo()
+    # 按鍵事件由 IRQ 排入佇列，這裡只負責取出查表分派，不再阻塞等待放開
+    _probe("keys", dispatch_keys)
+    # 連線中畫面：依 connector.state 更新進度（其他畫面直接返回）
+    ui.tick_connect()
+    # 本輪所有繪圖合併成最多一次 SPI 刷新（受 LCD_MAX_FPS 限速）
+    _probe("lcd", ui.present)
+
+
+def handle_net_events():
+    """取出 core 1 的通知：執行網頁送來的連線要求；STA IP 改變時，若正在看狀態頁就重繪。"""
+    import core1_net
+
+    while True:
+        ev = core1_net.pop_ui_event()
+        if ev is None:
+            return
+        if ev[0] == "connect":
+            connector.start(ev[1], ev[2])
+        elif ev[0] == "wifi" and ui is not None and ui.mode == "status":
+            ui.show_status()
+
+
+def ui_start():
+    """進入 UI 前的初始化：更新一次電量、啟用按鍵中斷、顯示首頁。"""
+    ui.tick_battery(force=True)
+    init_irq()
+    ui.show_home()
+    ui.refresh_battery_gauge(force=True, commit=True)
+    ui.present(force=True)
+
+
+def run_async(headless: bool):
+    """asyncio 模式：初始化 UI，之後交給 async_runtime。"""
+    import async_runtime
+
+    if not headless:
+        ui_start()
+    async_runtime.run(
+        headless=headless,
+        ui_tick=ui_tick,
+        refresh_gauge=_refresh_gauge,
+    )
+
+
 # =============== 主狀態機 ===============
 def main():
-    services_started = False
-    ap_started = False
-    mdns = None
-    # main() 以 while 迴圈維持：1) 開啟 AP + Captive Portal 便於設定
-    # 2) 依是否有 LCD 進入 UI 或 headless 迴圈
-    # 3) 持續輪詢 TCP/HTTP 伺服器與按鍵事件
+    mdns_pending = not USE_ASYNCIO  # asyncio 模式由 async_runtime 自行啟動 mDNS
+    # 開機順序（全程不等待手機連線）：
+    # 1) 載入 LCD/UI 2) 模組檢查：失敗時停機，此時尚未開任何 socket，用戶端不會連上後卡住
+    # 3) 開啟 AP + Captive Portal 便於設定 4) 立即啟動 TCP/HTTP
+    # 5) 依是否有 LCD 進入 UI 或 headless 迴圈；以單一 poll 迴圈服務網路，
+    #    AP 上裝置的加入/離開由 watch_ap_stations() 在迴圈內非阻塞偵測，STA 連上後才啟動 mDNS；
+    #    STA 斷線（或開機）時 auto_reconnect() 以已存的 Wi-Fi 設定檔自動重連
+
+    headless = not load_ui()
+    bootprof.mark("lcd")
+    if headless:
+        print("LCD module not detected; UI disabled.")
+
+    # 開任何網路服務前先做一次模組檢查（失敗會停機閃燈）
+    run_system_checks(headless)
+    bootprof.mark("checks")
+
+    # Captive DNS / mDNS 不開執行緒，登記在 udp_service，由 poll 迴圈（或 asyncio）驅動
+    if NET_ON_CORE1:
+        import core1_net
+
+        core1_net.start()
+        poller = None
+    else:
+        poller = make_service_poller()
+
+    def net_wait(ms):
+        """等待 ms；單核心模式下等待期間照常服務網路 socket。"""
+        if poller is not None:
+            # mDNS 的探測/公告/延遲回應可能比 ms 更早到期
+            poller.run_once(min(ms, udp_service.tick()))
+        else:
+            time.sleep_ms(ms)
 
     def maybe_start_mdns():
-        nonlocal mdns
-        if mdns is not None:
+        """STA 連上後才載入並啟動 mDNS（只做一次）；主迴圈每輪呼叫。"""
+        nonlocal mdns_pending
+        if not mdns_pending:
+            return
+        if not net_state.get().sta_connected:
+            return
+        mdns_pending = False
+        if NET_ON_CORE1:
+            core1_net.request_mdns("pico")
             return
         try:
-            def _get_ip():
-                try:
-                    return wlan.ifconfig()[0]
-                except Exception:
-                    return "0.0.0.0"
-
-            mdns = MDNSResponder(hostname="pico", ip_getter=_get_ip)
-            mdns.start()
+            from mdns_service import MDNSResponder
+
+            MDNSResponder(hostname="pico", ip_getter=sta_ip).start()
         except Exception as e:
             print("mDNS start failed:", e)
 
-    if AUTO_CONFIG_AP_ON_BOOT:
-        # 預設開啟設定用 AP 以便手機立即連線；timeout 交由 wait_for_station 控制
-        ap_started = start_config_ap("PicoSetup", "pico1234")
-        if ap_started:
+    def start_ap():
+        if start_config_ap("PicoSetup", "pico1234"):
             print("Config AP active: PicoSetup (pwd: pico1234)")
             print("Open http://192.168.4.1 to configure Wi-Fi")
-            print("Waiting for phone to connect to AP...")
-            connected = wait_for_station(min_count=1, timeout_ms=None, poll_ms=500)
-            if connected:
-                print("Device connected to AP. Starting servers...")
-                print("Current STA count:", ap_station_count())
-            else:
-                print("No device connected; continuing without servers.")
-        else:
-            print("Config AP failed to start")
-        start_network_services()
-        services_started = True
-        maybe_start_mdns()
+            return True
+        print("Config AP failed to start")
+        return False
 
-    headless = FORCE_HEADLESS or (not LCD_AVAILABLE) or getattr(lcd, "_is_dummy", False)
-    # 進入主迴圈前先做一次模組檢查（失敗會停機閃燈）
-    run_system_checks(headless)
+    # 沒有 LCD 時一定開 AP，否則無從設定 Wi-Fi
+    if AUTO_CONFIG_AP_ON_BOOT or FORCE_HEADLESS or headless:
+        start_ap()
+    bootprof.mark("ap")
+
+    # 伺服器監聽 0.0.0.0：已有 STA 連線的閘道器開機後立即可用，手機之後連上 AP 也不需重開
+    start_network_services()
+    maybe_start_mdns()
+    bootprof.mark("services")
+    print("Network services up at %d ms after boot" % time.ticks_ms())
+
+    if USE_ASYNCIO:
+        run_async(headless)
+        return
 
     if headless:
-        print("LCD module not detected; UI disabled.")
-        if not ap_started:
-            # 若未開 AP，進入 headless 模式時再補開一組，方便用 Web UI 配置
-            ap_started = start_config_ap("PicoSetup", "pico1234")
-            if ap_started:
-                print("Connect to AP PicoSetup (pwd: pico1234) then open http://192.168.4.1")
-                if not services_started:
-                    print("Waiting for phone to connect to AP...")
-                    wait_for_station(min_count=1, timeout_ms=None, poll_ms=500)
-                    print("Device connected to AP. Starting servers...")
-            else:
-                print("Config AP failed to start")
-        if not services_started:
-            start_network_services()
-            services_started = True
-            maybe_start_mdns()
         while True:
             reboot_when_ab_held(show_ui=False)
-            poll_cmd_server()
-            poll_http_server()
-            time.sleep_ms(200)
+            if NET_ON_CORE1:
+                handle_net_events()
+            watch_ap_stations()
+            # 推進進行中的 Wi-Fi 連線（網頁送出的連線也在這裡完成）
+            connector.step()
+            auto_reconnect()
+            linkmon.tick()
+            # 網頁要求的 Wi-Fi 掃描在這裡執行，不在 HTTP 處理中阻塞
+            service_scan()
+            maybe_start_mdns()
+            # 有連線/封包時立即處理，否則最多等 200ms
+            net_wait(200)
 
     # 開機先嘗試檢查 UPS/電量模組狀態並更新一次抬頭電量
-    ui.tick_battery(force=True)
-    ui.show_home()
-    ui.refresh_battery_gauge(force=True, commit=True)
-    maybe_start_mdns()
+    ui_start()
+    bootprof.mark("ui")
     while True:
-        # UI 模式：每輪更新電量 → 處理按鍵（依 mode 切換頁面）→ 輪詢網路服務
-        ui.tick_battery()
-        # 電量有變化時才 commit，減少閃爍
-        ui.refresh_battery_gauge(commit=True)
-        reboot_when_ab_held()
-
-        # 處理網路服務
-        poll_cmd_server()
-        poll_http_server()
-
-        if ui.mode == "home":
-            if pressed(keyA) and debounce():
-                wait_release(keyA)
-                ui.do_scan()  # do_scan 內部會設定 mode 並切到列表頁
-            if pressed(keyB) and debounce():
-                wait_release(keyB)
-                ui.stack.append("home")
-                ui.show_status()
-
-        if ui.mode == "list":
-            if pressed(keyUP) and debounce():
-                wait_release(keyUP)
-                ui.move_selection(-1)
-            if pressed(keyDN) and debounce():
-                wait_release(keyDN)
-                ui.move_selection(+1)
-            if pressed(keyX) and debounce():
-                wait_release(keyX)
-                ui.show_home()
-            if pressed(keyB) and debounce():
-                wait_release(keyB)
-                ui.show_detail()
-            if pressed(keyY) and debounce():
-                wait_release(keyY)
-                ui.show_connect_setup()
-
-        if ui.mode == "detail":
-            if pressed(keyX) and debounce():
-                wait_release(keyX)
-                ui.render_list()
-
-        if ui.mode == "connect":
-            if pressed(keyX) and debounce():
-                wait_release(keyX)
-                ui.render_list()
-            if pressed(keyUP) and debounce():
-                wait_release(keyUP)
-                ui.keypad_move(0, -1)
-            if pressed(keyDN) and debounce():
-                wait_release(keyDN)
-                ui.keypad_move(0, +1)
-            if pressed(keyLEFT) and debounce():
-                wait_release(keyLEFT)
-                ui.keypad_move(-1, 0)
-            if pressed(keyRIGHT) and debounce():
-                wait_release(keyRIGHT)
-                ui.keypad_move(+1, 0)
-            if pressed(keyY) and debounce():
-                wait_release(keyY)
-                ui.keypad_press(start_network_services)
-            if pressed(keyCTRL) and key_hold():
-                wait_release(keyCTRL)
-                ui.attempt_connect(start_network_services)
-            if pressed(keyA) and debounce():
-                wait_release(keyA)
-                ui.delete_char()
-            if pressed(keyB) and debounce():
-                wait_release(keyB)
-                ui.clear_psk()
-
-        if ui.mode == "status":
-            if pressed(keyX) and debounce():
-                wait_release(keyX)
-                prev = ui.stack.pop() if ui.stack else "home"
-                if prev == "list":
-                    ui.render_list()
-                elif prev == "detail":
-                    ui.show_detail()
-                elif prev == "connect":
-                    ui.render_connect()
-                else:
-                    ui.show_home()
-
-        time.sleep_ms(15)
+        # UI 模式：每輪更新電量 → 輪詢網路服務 → 處理按鍵（依 mode 查表）→ 統一刷新
+        _probe("battery", ui.tick_battery)
+        _probe("gauge", _refresh_gauge)
+
+        if NET_ON_CORE1:
+            handle_net_events()
+        watch_ap_stations()
+        # 唯一推進 Wi-Fi 連線的地方：auto_reconnect() 與連線中畫面只讀 connector.state
+        connector.step()
+        auto_reconnect()
+        linkmon.tick()
+        service_scan()
+        maybe_start_mdns()
+        ui_tick()
+        # 處理網路服務：以 poll 等待所有 socket，兼作 UI 節拍的 15ms 間隔（core 1 模式下只是 sleep）
+        net_wait(15)
 
 
 # 進入點
@@ -1,139 +1,439 @@
-# mdns_service.py - 簡易 mDNS responder：回答 <hostname>.local 的 A 記錄
-# 為節省資源僅支援基本 A 查詢，回應多播 224.0.0.251:5353。
+# mdns_service.py - mDNS responder（RFC 6762）與 DNS-SD 服務廣告（RFC 6763）
+# 回答 <hostname>.local 的 A 記錄，並以 PTR/SRV/TXT 廣告 HTTP、指令埠（與設定後的 Modbus TCP），
+# 瀏覽一次 _pico-cmd._tcp.local 就能列出網段內所有閘道器，不必逐台掃描。
+# 啟動時先探測名稱是否被占用（被占用改用 name-2、name-3…），之後發送公告；
+# 查詢支援多個問題、已知答案抑制、QU（要求單播回應）與一般 DNS 的單播查詢（來源埠不是 5353）。
+# 不開執行緒：start() 後登記到 udp_service，socket 可讀時呼叫 service()；探測/公告/延遲送出由 tick() 推進。
 
+import random
 import socket
-import _thread
+import time
 
+import dns_wire as dw
+import metrics
+import memprof
+import udp_service
 
-def _inet_aton(ip: str) -> bytes:
-    """MicroPython 有時沒有 socket.inet_aton，改用手動轉換。"""
-    if hasattr(socket, "inet_aton"):
-        try:
-            return socket.inet_aton(ip)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-    parts = (ip or "0.0.0.0").split(".")
-    if len(parts) != 4:
-        return b"\x00\x00\x00\x00"
-    try:
-        return bytes(int(p) & 0xFF for p in parts)
-    except Exception:
-        return b"\x00\x00\x00\x00"
-
-
-# 若缺少 socket.inet_aton，補上一個以避免 ImportError
-if not hasattr(socket, "inet_aton"):
-    try:
-        socket.inet_aton = _inet_aton  # type: ignore[attr-defined]
-    except Exception:
-        pass
+try:
+    from config import FIRMWARE_VERSION
+except ImportError:
+    FIRMWARE_VERSION = "dev"
+try:
+    from config import MODBUS_TCP_PORT
+except ImportError:
+    MODBUS_TCP_PORT = 0
 
 MDNS_MCAST_GRP = "224.0.0.251"
 MDNS_PORT = 5353
+MAX_PACKET = 1500
+
+TTL_HOST = 120  # A / SRV（RFC 6762 建議值）
+TTL_OTHER = 4500  # PTR / TXT
+LEGACY_TTL = 10  # 一般 DNS 單播查詢的回應 TTL 上限
+CACHE_FLUSH = 0x8000  # 唯一記錄在多播回應中的 cache-flush 位元
+QU_BIT = 0x8000
+
+PROBE_COUNT = 3
+PROBE_INTERVAL_MS = 250
+ANNOUNCE_COUNT = 2
+ANNOUNCE_INTERVAL_MS = 1000
+MIN_MCAST_INTERVAL_MS = 1000  # 同一筆記錄多播回應的最短間隔
+IDLE_TICK_MS = 1000  # 沒有待辦時 tick() 建議的下次呼叫間隔
+
+SERVICES_TYPE = "_services._dns-sd._udp.local"
+TYPE_NSEC = 47
+
+# 狀態
+ST_PROBE = 0
+ST_ANNOUNCE = 1
+ST_READY = 2
+
+
+def default_services():
+    """(服務類型, 埠, 額外 TXT)；Modbus TCP 只在 config.MODBUS_TCP_PORT 設定後才廣告。"""
+    from Server_CMD import SERVER_PORT
+    from Web_Page import HTTP_PORT
+
+    svcs = [("_http._tcp", HTTP_PORT, ("path=/",)), ("_pico-cmd._tcp", SERVER_PORT, ("proto=text",))]
+    if MODBUS_TCP_PORT:
+        svcs.append(("_modbus._tcp", MODBUS_TCP_PORT, ()))
+    return svcs
+
+
+def _txt(items) -> bytes:
+    out = bytearray()
+    for s in items:
+        b = s.encode()[:255]
+        out.append(len(b))
+        out += b
+    return bytes(out)
 
 
 class MDNSResponder:
-    def __init__(self, hostname="pico", ip_getter=None):
+    def __init__(self, hostname="pico", ip_getter=None, port=MDNS_PORT, services=None, group=MDNS_MCAST_GRP):
+        # port / group 可改成本機位址，在 CPython 上以 localhost 的 socket 測試
+        self.base = hostname
         self.hostname = hostname
+        self.port = port
+        self.group = group
         self.ip_getter = ip_getter or (lambda: "0.0.0.0")
+        self._services = services
         self._sock = None
-        self._running = False
-        self._thread = None
+        self._records = []
+        self._state = ST_PROBE
+        self._step = 0
+        self._next_ms = 0
+        self._suffix = 1
+        self._ip = None  # 最近一次公告的 IP
+        self._sent = {}  # 記錄索引 -> 最後一次多播的 ticks
+        self._queue = []  # 延遲送出的多播回應：[到期 ticks, 封包]
+
+    @property
+    def sock(self):
+        """底層 UDP socket（未啟動為 None），供事件迴圈註冊可讀事件。"""
+        return self._sock
+
+    @property
+    def ready(self) -> bool:
+        """名稱探測與公告已完成，開始回答查詢。"""
+        return self._state == ST_READY
 
     def start(self):
-        if self._running:
+        """加入多播群組並綁定 5353（非阻塞），登記為 udp_service 的 "mdns"，開始探測名稱。"""
+        if self._sock is not None:
             return
         try:
+            if self._services is None:
+                self._services = default_services()
             self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             # 加入 mDNS multicast 群組，讓來自 224.0.0.251 的封包進入
-            mreq = _inet_aton(MDNS_MCAST_GRP) + _inet_aton("0.0.0.0")
+            mreq = dw.inet_aton(MDNS_MCAST_GRP) + dw.inet_aton("0.0.0.0")
             self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-            self._sock.bind(("0.0.0.0", MDNS_PORT))
-            self._running = True
-            self._thread = _thread.start_new_thread(self._loop, ())
-            print("mDNS responder started for %s.local" % self.hostname)
+            self._sock.bind(("0.0.0.0", self.port))
+            self._sock.setblocking(False)
+            udp_service.register("mdns", self)
+            self._set_name(self.hostname)
+            print("mDNS responder probing %s.local" % self.hostname)
         except Exception as e:
             print("mDNS start failed:", e)
             self.stop()
 
     def stop(self):
-        self._running = False
+        """送出 TTL 0 的告別封包，讓其他裝置立即移除快取，再關閉 socket。"""
+        if self._sock is not None and self._state == ST_READY:
+            self._send(self._announcement(goodbye=True), (self.group, self.port))
+        udp_service.unregister("mdns", self)
         try:
             if self._sock:
                 self._sock.close()
         except Exception:
             pass
         self._sock = None
-        self._thread = None
-
-    def _loop(self):
-        """簡易 responder：只處理 A 紀錄且僅回 hostname.local 的查詢。"""
-        target_name = (self.hostname + ".local").encode("utf-8")
-        while self._running:
-            try:
-                self._sock.settimeout(1.0)
-                data, addr = self._sock.recvfrom(512)
-            except OSError:
-                continue
-            except Exception:
-                continue
-            if not data or len(data) < 12:
-                continue
-            # 簡單解析問題
-            try:
-                idx = 12
-                labels = []
-                l = data[idx]
-                while l and idx < len(data):
-                    idx += 1
-                    labels.append(data[idx : idx + l])
-                    idx += l
-                    l = data[idx]
-                idx += 1  # zero
-                qtype = data[idx : idx + 2]
-            except Exception:
-                continue
 
-            asked = b".".join(labels)
-            if asked.lower() != target_name.lower():
+    # ---------- 記錄 ----------
+    def _set_name(self, name: str) -> None:
+        """以 name 建立所有記錄並重新開始探測。"""
+        self.hostname = name
+        host = name + ".local"
+        fw = ("fw=" + FIRMWARE_VERSION, "rs485=%d" % metrics.RS485_CHANNELS, "model=pico-gateway")
+        # 每筆：[名稱, TYPE, TTL, 是否唯一, RDATA 資料]
+        recs = [[host, dw.TYPE_A, TTL_HOST, True, None]]
+        for stype, port, extra in self._services:
+            stype = stype + ".local"
+            inst = name + "." + stype
+            recs.append([stype, dw.TYPE_PTR, TTL_OTHER, False, inst])
+            recs.append([inst, dw.TYPE_SRV, TTL_HOST, True, (port, host)])
+            recs.append([inst, dw.TYPE_TXT, TTL_OTHER, True, _txt(fw + tuple(extra))])
+            recs.append([SERVICES_TYPE, dw.TYPE_PTR, TTL_OTHER, False, stype])
+        self._records = recs
+        self._keys = [r[0].lower() for r in recs]  # 比對用的小寫名稱
+        self._host = host.lower()
+        self._unique = set(self._keys[k] for k in range(len(recs)) if recs[k][3])
+        self._sent = {}
+        self._state = ST_PROBE
+        self._step = 0
+        # 第一次探測隨機延遲 0~250 ms，避免多台同時開機時封包撞在一起
+        self._next_ms = time.ticks_add(time.ticks_ms(), random.getrandbits(8))
+
+    def _ip_bytes(self):
+        try:
+            ip = self.ip_getter()
+        except Exception:
+            return None
+        b = dw.inet_aton(ip)
+        return None if b == b"\x00\x00\x00\x00" else b
+
+    def _write_rr(self, w, section, r, ip, ttl=None, flush=True) -> None:
+        cls = dw.CLASS_IN | (CACHE_FLUSH if flush and r[3] else 0)
+        pos = w.begin_rr(section, r[0], r[1], cls, r[2] if ttl is None else ttl)
+        if r[1] == dw.TYPE_A:
+            w.buf += ip
+        elif r[1] == dw.TYPE_PTR:
+            w.name(r[4])
+        elif r[1] == dw.TYPE_SRV:
+            w.u16(0)  # priority
+            w.u16(0)  # weight
+            w.u16(r[4][0])
+            w.name(r[4][1])
+        else:
+            w.buf += r[4]
+        w.end_rr(pos)
+
+    def _announcement(self, goodbye=False) -> bytes:
+        ip = self._ip_bytes() or b"\x00\x00\x00\x00"
+        w = dw.Writer()
+        for r in self._records:
+            self._write_rr(w, 1, r, ip, ttl=0 if goodbye else None)
+        return w.packet()
+
+    def _probe(self, ip) -> bytes:
+        """探測：以 QU 問題詢問自己的唯一名稱，授權區附上打算使用的記錄。"""
+        w = dw.Writer(flags=0)
+        for name in self._unique:
+            w.question(name, dw.TYPE_ANY, dw.CLASS_IN | QU_BIT)
+        for r in self._records:
+            if r[3]:
+                self._write_rr(w, 2, r, ip, flush=False)
+        return w.packet()
+
+    # ---------- 計時：探測 / 公告 / 延遲回應 ----------
+    def tick(self) -> int:
+        """推進探測與公告、送出到期的延遲回應；回傳建議下次呼叫前等待的 ms。"""
+        if self._sock is None:
+            return IDLE_TICK_MS
+        now = time.ticks_ms()
+        if self._queue:
+            keep = []
+            for item in self._queue:
+                if time.ticks_diff(now, item[0]) >= 0:
+                    self._send(item[1], (self.group, self.port))
+                else:
+                    keep.append(item)
+            self._queue = keep
+        if self._state == ST_READY:
+            ip = self._ip_bytes()
+            if ip is not None and ip != self._ip:
+                # IP 改變（重新連線）：重新公告
+                self._state = ST_ANNOUNCE
+                self._step = 0
+                self._next_ms = now
+        if self._state != ST_READY and time.ticks_diff(now, self._next_ms) >= 0:
+            self._advance(now)
+        wait = IDLE_TICK_MS
+        if self._state != ST_READY:
+            wait = max(0, time.ticks_diff(self._next_ms, now))
+        for item in self._queue:
+            wait = min(wait, max(0, time.ticks_diff(item[0], now)))
+        return wait
+
+    def _advance(self, now) -> None:
+        ip = self._ip_bytes()
+        if ip is None:
+            # 尚無 IP：稍後再試
+            self._next_ms = time.ticks_add(now, IDLE_TICK_MS)
+            return
+        dest = (self.group, self.port)
+        if self._state == ST_PROBE:
+            self._send(self._probe(ip), dest)
+            self._step += 1
+            if self._step >= PROBE_COUNT:
+                self._state = ST_ANNOUNCE
+                self._step = 0
+            self._next_ms = time.ticks_add(now, PROBE_INTERVAL_MS)
+            return
+        self._send(self._announcement(), dest)
+        self._ip = ip
+        for k in range(len(self._records)):
+            self._sent[k] = now
+        self._step += 1
+        if self._step >= ANNOUNCE_COUNT:
+            self._state = ST_READY
+            print("mDNS responder ready: %s.local" % self.hostname)
+        self._next_ms = time.ticks_add(now, ANNOUNCE_INTERVAL_MS)
+
+    # ---------- 收封包 ----------
+    def service(self):
+        """收一個封包：回應是檢查名稱衝突，查詢則回答（多播、QU 單播或一般 DNS 單播）。"""
+        try:
+            data, addr = self._sock.recvfrom(MAX_PACKET)
+        except Exception:
+            return
+        m0 = memprof.start()
+        n = len(data)
+        if n >= dw.HEADER_LEN:
+            if dw.is_response(data):
+                self._check_conflict(data, n)
+            elif self._state != ST_PROBE and not dw.opcode(data):
+                self._reply(data, n, addr)
+        memprof.stop(memprof.UDP, "mdns", m0)
+
+    def _check_conflict(self, data, n) -> None:
+        """其他裝置的回應中出現我們的唯一名稱但內容不同：名稱被占用，改名重新探測。"""
+        i = self._skip_questions(data, n)
+        if i < 0:
+            return
+        ip = self._ip_bytes()
+        count = dw.u16(data, 6) + dw.u16(data, 8) + dw.u16(data, 10)
+        for _ in range(count):
+            name, i = dw.read_name(data, i, n)
+            if name is None or i + 10 > n:
+                return
+            rtype = dw.u16(data, i)
+            rdlen = dw.u16(data, i + 8)
+            rd = i + 10
+            i = rd + rdlen
+            if i > n:
+                return
+            if name not in self._unique or rtype == TYPE_NSEC:
                 continue
-            if qtype != b"\x00\x01":  # A
+            if rtype == dw.TYPE_A:
+                if name == self._host and rdlen == 4 and data[rd : rd + 4] == ip:
+                    continue
+            elif rtype == dw.TYPE_SRV:
+                target, _ = dw.read_name(data, rd + 6, n)
+                if target == self._host:
+                    continue
+            elif rtype == dw.TYPE_TXT:
                 continue
+            self._conflict()
+            return
+
+    def _conflict(self) -> None:
+        metrics.inc(metrics.MDNS_CONFLICTS)
+        self._suffix += 1
+        name = "%s-%d" % (self.base, self._suffix)
+        print("mDNS name %s.local in use, trying %s.local" % (self.hostname, name))
+        self._set_name(name)
 
-            try:
-                ip = self.ip_getter()
-                ip_bytes = _inet_aton(ip)
-            except Exception:
+    def _skip_questions(self, data, n) -> int:
+        i = dw.HEADER_LEN
+        for _ in range(dw.u16(data, 4)):
+            i = dw.skip_name(data, i, n)
+            if i < 0 or i + 4 > n:
+                return -1
+            i += 4
+        return i
+
+    def _reply(self, data, n, addr) -> None:
+        ip = self._ip_bytes()
+        if ip is None:
+            return
+        legacy = addr[1] != self.port  # 一般 DNS 用戶端（非 5353 埠）的單播查詢
+        # 問題區：(名稱, TYPE, 是否要求單播)
+        qs = []
+        i = dw.HEADER_LEN
+        for _ in range(dw.u16(data, 4)):
+            name, i = dw.read_name(data, i, n)
+            if name is None or i + 4 > n:
+                return
+            qs.append((name, dw.u16(data, i), dw.u16(data, i + 2) & QU_BIT))
+            i += 4
+        known = self._known_answers(data, n, i)
+        answers = []
+        unicast = legacy
+        for qname, qtype, qu in qs:
+            for k, r in enumerate(self._records):
+                if k in answers or self._keys[k] != qname:
+                    continue
+                if qtype != r[1] and qtype != dw.TYPE_ANY:
+                    continue
+                if self._suppressed(r, ip, known):
+                    continue
+                answers.append(k)
+                if qu:
+                    unicast = True
+        if not answers:
+            return
+        now = time.ticks_ms()
+        if not unicast:
+            # 同一筆記錄一秒內已多播過就不再送（50 台閘道器同時被瀏覽時避免洪流）
+            answers = [k for k in answers if time.ticks_diff(now, self._sent.get(k, now - MIN_MCAST_INTERVAL_MS)) >= MIN_MCAST_INTERVAL_MS]
+            if not answers:
+                return
+        extra = self._additional(answers, ip, known)
+        w = dw.Writer(qid=dw.u16(data, 0) if legacy else 0)
+        if legacy:
+            # 一般 DNS 用戶端需要看到原本的問題
+            for qname, qtype, _ in qs:
+                w.question(qname, qtype)
+        ttl_cap = LEGACY_TTL if legacy else None
+        for k in answers:
+            r = self._records[k]
+            self._write_rr(w, 1, r, ip, ttl=min(r[2], ttl_cap) if ttl_cap else None, flush=not legacy)
+        for k in extra:
+            r = self._records[k]
+            self._write_rr(w, 3, r, ip, ttl=min(r[2], ttl_cap) if ttl_cap else None, flush=not legacy)
+        pkt = w.packet()
+        metrics.inc(metrics.MDNS_ANSWERED)
+        if unicast:
+            self._send(pkt, addr)
+            return
+        for k in answers:
+            self._sent[k] = now
+        if any(not self._records[k][3] for k in answers):
+            # 共用記錄（PTR）的回應隨機延遲 20~120 ms，多台閘道器回應瀏覽時不會同時送出
+            due = time.ticks_add(now, 20 + random.getrandbits(7) % 101)
+            self._queue.append([due, pkt])
+            return
+        self._send(pkt, (self.group, self.port))
+
+    def _known_answers(self, data, n, i):
+        """查詢答案區的已知答案：[(名稱, TYPE, RDATA 鍵, TTL)]；只比對 PTR 目標與 A 位址。"""
+        known = []
+        for _ in range(dw.u16(data, 6)):
+            name, i = dw.read_name(data, i, n)
+            if name is None or i + 10 > n:
+                break
+            rtype = dw.u16(data, i)
+            ttl = (dw.u16(data, i + 4) << 16) | dw.u16(data, i + 6)
+            rd = i + 10
+            i = rd + dw.u16(data, i + 8)
+            if i > n:
+                break
+            if rtype == dw.TYPE_PTR:
+                key, _ = dw.read_name(data, rd, n)
+            elif rtype == dw.TYPE_A:
+                key = bytes(data[rd : rd + 4])
+            else:
                 continue
+            known.append((name, rtype, key, ttl))
+        return known
 
-            tid = data[0:2]
-            flags = b"\x84\x00"  # response, authoritative
-            qdcount = b"\x00\x01"
-            ancount = b"\x00\x01"
-            nscount = b"\x00\x00"
-            arcount = b"\x00\x00"
-
-            ans = b"\xc0\x0c"  # pointer to name
-            ans += b"\x00\x01"  # type A
-            ans += b"\x00\x01"  # class IN
-            ans += b"\x00\x00\x00\x1e"  # TTL 30s
-            ans += b"\x00\x04"  # RDLENGTH
-            ans += ip_bytes
-
-            resp = b"".join(
-                [
-                    tid,
-                    flags,
-                    qdcount,
-                    ancount,
-                    nscount,
-                    arcount,
-                    data[12: idx + 4],
-                    ans,
-                ]
-            )
-            try:
-                self._sock.sendto(resp, (MDNS_MCAST_GRP, MDNS_PORT))
-            except Exception:
-                pass
+    def _suppressed(self, r, ip, known) -> bool:
+        """已知答案抑制：查詢者已有同一筆記錄、且剩餘 TTL 還有一半以上，就不必再回。"""
+        if not known:
+            return False
+        name = r[0].lower()
+        if r[1] == dw.TYPE_PTR:
+            key = r[4].lower()
+        elif r[1] == dw.TYPE_A:
+            key = ip
+        else:
+            return False
+        for kn, kt, kk, kttl in known:
+            if kn == name and kt == r[1] and kk == key and kttl * 2 >= r[2]:
+                return True
+        return False
+
+    def _additional(self, answers, ip, known):
+        """PTR 答案附上該實例的 SRV/TXT 與主機 A，SRV 附上 A，省去瀏覽後的第二輪查詢。"""
+        want = set()
+        for k in answers:
+            r = self._records[k]
+            if r[1] == dw.TYPE_PTR and self._keys[k] != SERVICES_TYPE:
+                inst = r[4].lower()
+                for j in range(len(self._records)):
+                    if self._keys[j] == inst:
+                        want.add(j)
+                want.add(0)
+            elif r[1] == dw.TYPE_SRV:
+                want.add(0)
+        return [j for j in sorted(want) if j not in answers and not self._suppressed(self._records[j], ip, known)]
+
+    def _send(self, pkt, dest) -> None:
+        try:
+            if self._sock:
+                self._sock.sendto(pkt, dest)
+        except Exception:
+            pass
@@ -0,0 +1,160 @@
+# memprof.py - 堆積配置與 GC 統計：每個服務呼叫 / 每種指令 / 每個 HTTP 路徑配置了多少記憶體
+# 在量測點前後讀 gc.mem_alloc()，差值即該次呼叫配置的位元組；若期間跑過 GC，
+# mem_alloc 會變小，此時只記一次 GC、不計入配置量。用來找出哪種請求在切碎堆積。
+# gc.mem_alloc() 需掃描整個配置表（數百 us），只適合除錯時開啟；停用時 start() 只回傳 -1。
+# 由 SYS MEM 與 GET /mem 讀取。
+#
+# 用法（與 perf 相同）：
+#   m0 = memprof.start()
+#   ...要量的工作...
+#   memprof.stop(memprof.CMD, "SYS PING", m0)
+
+import _thread
+import gc
+from array import array
+
+try:
+    from config import MEMPROF_ENABLED
+except ImportError:
+    MEMPROF_ENABLED = False
+
+# 量測群組：主迴圈各步驟 / 每種指令 / 每個 HTTP 路徑 / UDP 服務（DNS、mDNS）
+LOOP = 0
+CMD = 1
+HTTP = 2
+UDP = 3
+GROUP_NAMES = ("loop", "cmd", "http", "udp")
+
+MAX_SLOTS = 32
+DECAY_AT = 1024  # 次數達此值就把各累計值減半，避免 32 位元溢位
+
+_enabled = bool(MEMPROF_ENABLED)
+_slots = ({}, {}, {}, {})  # 每個群組 name -> 槽位索引
+_names = []  # 槽位索引 -> (group, name)
+_n = array("L", [0] * MAX_SLOTS)  # 呼叫次數
+_gc = array("L", [0] * MAX_SLOTS)  # 期間發生 GC 的次數
+_bytes = array("L", [0] * MAX_SLOTS)  # 未發生 GC 的呼叫累計配置量
+_max = array("L", [0] * MAX_SLOTS)  # 單次最大配置量
+overflow = 0
+_lock = _thread.allocate_lock()  # 兩核心都會呼叫 stop()：更新時持鎖（同 perf）
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset() -> None:
+    global overflow
+    with _lock:
+        overflow = 0
+        for i in range(MAX_SLOTS):
+            _n[i] = 0
+            _gc[i] = 0
+            _bytes[i] = 0
+            _max[i] = 0
+
+
+def start() -> int:
+    """量測起點：目前已配置的位元組數；停用時回傳 -1。"""
+    if not _enabled:
+        return -1
+    return gc.mem_alloc()
+
+
+def _slot(group: int, name: str) -> int:
+    i = _slots[group].get(name)
+    if i is not None:
+        return i
+    if len(_names) >= MAX_SLOTS:
+        return -1
+    i = len(_names)
+    _names.append((group, name))
+    _slots[group][name] = i
+    return i
+
+
+def stop(group: int, name: str, m0: int) -> None:
+    """記錄從 m0 到現在配置的位元組；m0 為 -1（量測開始時停用）直接返回。"""
+    if m0 < 0 or not _enabled:
+        return
+    delta = gc.mem_alloc() - m0
+    with _lock:
+        _record(group, name, delta)
+
+
+def _record(group: int, name: str, delta: int) -> None:
+    global overflow
+    i = _slot(group, name)
+    if i < 0:
+        overflow += 1
+        return
+    if _n[i] >= DECAY_AT:
+        _n[i] >>= 1
+        _gc[i] >>= 1
+        _bytes[i] >>= 1
+    _n[i] += 1
+    if delta < 0:
+        # 期間跑過 GC：配置量無法得知，只記次數
+        _gc[i] += 1
+        return
+    _bytes[i] += delta
+    if delta > _max[i]:
+        _max[i] = delta
+
+
+def _row(i: int) -> dict:
+    n = _n[i]
+    measured = n - _gc[i]
+    return {
+        "n": n,
+        "gc": _gc[i],
+        "avg": _bytes[i] // measured if measured > 0 else 0,
+        "max": _max[i],
+        "total": _bytes[i],
+    }
+
+
+def _hot_order():
+    """依累計配置量由大到小排列的槽位索引。"""
+    idx = [i for i in range(len(_names)) if _n[i]]
+    idx.sort(key=lambda i: _bytes[i], reverse=True)
+    return idx
+
+
+def heap() -> dict:
+    return {"free": gc.mem_free(), "alloc": gc.mem_alloc()}
+
+
+def snapshot() -> dict:
+    """{"enabled", "heap": {free, alloc}, "hot": [{group, name, n, gc, avg, max, total}, ...]}，依 total 排序。"""
+    hot = []
+    for i in _hot_order():
+        row = _row(i)
+        row["group"] = GROUP_NAMES[_names[i][0]]
+        row["name"] = _names[i][1]
+        hot.append(row)
+    return {"enabled": _enabled, "overflow": overflow, "heap": heap(), "hot": hot}
+
+
+def report_lines():
+    """逐行產生文字報表（配置量大者在前），供 SYS MEM 使用。"""
+    h = heap()
+    yield "free=%d alloc=%d" % (h["free"], h["alloc"])
+    for i in _hot_order():
+        r = _row(i)
+        group, name = _names[i]
+        yield "%s.%s n=%d avg=%dB max=%dB gc=%d" % (
+            GROUP_NAMES[group],
+            name,
+            r["n"],
+            r["avg"],
+            r["max"],
+            r["gc"],
+        )
+    if overflow:
+        yield "overflow=%d" % overflow
@@ -0,0 +1,187 @@
+# metrics.py - 閘道器計數器與 Prometheus 文字格式輸出（GET /metrics）
+# 所有計數器放在一個預先配置的 array 內，以固定索引存取；熱路徑上 inc() 只是一次陣列加法，
+# 不建立字串或字典。輸出時逐行寫進小型緩衝再分段送出，不組合整份大字串。
+# rp2 沒有 GIL：NET_ON_CORE1 時 core 1 的服務另寫一份陣列，兩核心不會同時改同一格；
+# 讀取（value()、render()）時兩份相加。inc() 也在按鍵的 soft IRQ 內呼叫，所以不用鎖。
+
+import _thread
+import gc
+from array import array
+
+# HTTP 路徑與指令種類各佔固定槽位，其餘一律算 other（也供 perf 分類共用）；probe 為作業系統連線檢查
+ROUTES = ("/", "/wifi/scan", "/wifi/status", "/wifi/connect", "/wifi/history", "/cmd", "/perf", "/mem", "/metrics", "probe", "other")
+VERBS = ("SYS", "LED", "MB", "RS", "STATUS", "other")
+RS485_CHANNELS = 2
+
+# ---------- 槽位索引 ----------
+HTTP_REQ = 0  # + route index
+HTTP_ERR = HTTP_REQ + len(ROUTES)  # 回應非 2xx 或處理時丟例外
+CMD = HTTP_ERR + len(ROUTES)  # + verb index
+RS_TX = CMD + len(VERBS)  # + ch
+RS_RX = RS_TX + RS485_CHANNELS
+RS_ERR = RS_RX + RS485_CHANNELS  # UART 收發例外（machine.UART 不提供 framing error 計數）
+MB_READ = RS_ERR + RS485_CHANNELS
+MB_WRITE = MB_READ + 1
+MB_TIMEOUT = MB_WRITE + 1
+MB_LAT_SUM = MB_TIMEOUT + 1  # us
+MB_LAT_COUNT = MB_LAT_SUM + 1
+DNS_ANSWERED = MB_LAT_COUNT + 1
+DNS_NODATA = DNS_ANSWERED + 1  # 非 A 查詢（AAAA、HTTPS…）回空答案
+DNS_ERRORS = DNS_NODATA + 1  # FORMERR / NOTIMP / REFUSED
+DNS_FORWARDED = DNS_ERRORS + 1  # 轉送給上游 DNS
+DNS_CACHE_HITS = DNS_FORWARDED + 1  # 由轉送快取直接回答
+MDNS_ANSWERED = DNS_CACHE_HITS + 1
+MDNS_CONFLICTS = MDNS_ANSWERED + 1  # mDNS 名稱被占用而改名
+WIFI_LINK_LOST = MDNS_CONFLICTS + 1  # STA 已連線後斷線
+WIFI_RECONNECTS = WIFI_LINK_LOST + 1  # auto_reconnect() 成功重連
+WIFI_ROAMS = WIFI_RECONNECTS + 1  # linkmon 主動漫遊
+NET_TX_ERR = WIFI_ROAMS + 1  # TCP 指令 / HTTP 回應送出失敗
+LCD_FLUSHES = NET_TX_ERR + 1  # LCD_Control.present() 實際送出 SPI 的次數
+LCD_FULL_FLUSHES = LCD_FLUSHES + 1  # 其中整個螢幕刷新的次數
+LCD_FLUSH_US_SUM = LCD_FULL_FLUSHES + 1  # us
+KEY_DROPPED = LCD_FLUSH_US_SUM + 1  # 按鍵事件佇列滿而丟掉的事件
+N_SLOTS = KEY_DROPPED + 1
+
+_MASK = 0xFFFFFFFF
+counters = array("L", [0] * N_SLOTS)  # 主執行緒（core 0）
+_other = array("L", [0] * N_SLOTS)  # 其他執行緒（core 1 的網路迴圈）
+_MAIN = _thread.get_ident()
+
+
+def inc(slot: int, n: int = 1) -> None:
+    """計數器加 n；超過 32 位元時歸零繞回（Prometheus counter reset 語意）。"""
+    c = counters if _thread.get_ident() == _MAIN else _other
+    c[slot] = (c[slot] + n) & _MASK
+
+
+def value(slot: int) -> int:
+    """兩核心合計的計數值。"""
+    return (counters[slot] + _other[slot]) & _MASK
+
+
+def route_index(path: str) -> int:
+    """路徑（不含 query）對應的槽位偏移；未列出的路徑為 other。"""
+    try:
+        return ROUTES.index(path)
+    except ValueError:
+        return len(ROUTES) - 1
+
+
+def verb_index(name: str) -> int:
+    try:
+        return VERBS.index(name)
+    except ValueError:
+        return len(VERBS) - 1
+
+
+# ---------- 輸出 ----------
+class _ChunkWriter:
+    """把小段文字寫進固定大小的緩衝，滿了才呼叫 send(bytes)。"""
+
+    def __init__(self, send, size=512):
+        self._send = send
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self._pos = 0
+
+    def write(self, s: str) -> None:
+        b = s.encode()
+        n = len(b)
+        if self._pos + n > len(self._buf):
+            self.flush()
+            if n > len(self._buf):
+                self._send(b)
+                return
+        self._buf[self._pos : self._pos + n] = b
+        self._pos += n
+
+    def flush(self) -> None:
+        if self._pos:
+            self._send(bytes(self._mv[: self._pos]))
+            self._pos = 0
+
+
+def _family(w, name: str, kind: str, help_text: str) -> None:
+    w.write("# HELP %s %s\n# TYPE %s %s\n" % (name, help_text, name, kind))
+
+
+def _labeled(w, name, label, values, base):
+    for i, v in enumerate(values):
+        w.write('%s{%s="%s"} %d\n' % (name, label, v, value(base + i)))
+
+
+def _gauge(w, name: str, help_text: str, value) -> None:
+    _family(w, name, "gauge", help_text)
+    if value is None:
+        return
+    w.write("%s %s\n" % (name, value))
+
+
+def render(send, battery=None, rssi=None) -> None:
+    """以 Prometheus text exposition format 寫出所有指標；send(bytes) 負責實際送出。
+    battery 為 Pico_UPS 的快取 {"v","i","p"}（無模組為 None）；rssi 為 dBm 或 None。"""
+    w = _ChunkWriter(send)
+
+    _family(w, "gateway_http_requests_total", "counter", "HTTP requests by route.")
+    _labeled(w, "gateway_http_requests_total", "route", ROUTES, HTTP_REQ)
+    _family(w, "gateway_http_errors_total", "counter", "HTTP requests answered with a non-2xx status or an exception.")
+    _labeled(w, "gateway_http_errors_total", "route", ROUTES, HTTP_ERR)
+
+    _family(w, "gateway_commands_total", "counter", "Commands handled by verb (TCP and POST /cmd).")
+    _labeled(w, "gateway_commands_total", "verb", VERBS, CMD)
+
+    _family(w, "gateway_rs485_tx_bytes_total", "counter", "RS485 bytes sent per channel.")
+    _labeled(w, "gateway_rs485_tx_bytes_total", "ch", range(RS485_CHANNELS), RS_TX)
+    _family(w, "gateway_rs485_rx_bytes_total", "counter", "RS485 bytes received per channel.")
+    _labeled(w, "gateway_rs485_rx_bytes_total", "ch", range(RS485_CHANNELS), RS_RX)
+    _family(w, "gateway_rs485_errors_total", "counter", "RS485 UART read/write errors per channel.")
+    _labeled(w, "gateway_rs485_errors_total", "ch", range(RS485_CHANNELS), RS_ERR)
+
+    _family(w, "gateway_modbus_transactions_total", "counter", "Modbus transactions by operation.")
+    w.write('gateway_modbus_transactions_total{op="read"} %d\n' % value(MB_READ))
+    w.write('gateway_modbus_transactions_total{op="write"} %d\n' % value(MB_WRITE))
+    _family(w, "gateway_modbus_timeouts_total", "counter", "Modbus transactions that timed out.")
+    w.write("gateway_modbus_timeouts_total %d\n" % value(MB_TIMEOUT))
+    _family(w, "gateway_modbus_latency_us", "summary", "Modbus transaction latency in microseconds.")
+    w.write("gateway_modbus_latency_us_sum %d\n" % value(MB_LAT_SUM))
+    w.write("gateway_modbus_latency_us_count %d\n" % value(MB_LAT_COUNT))
+
+    _family(w, "gateway_dns_answers_total", "counter", "Captive DNS queries answered.")
+    w.write("gateway_dns_answers_total %d\n" % value(DNS_ANSWERED))
+    _family(w, "gateway_dns_nodata_total", "counter", "Captive DNS non-A queries answered with an empty NOERROR.")
+    w.write("gateway_dns_nodata_total %d\n" % value(DNS_NODATA))
+    _family(w, "gateway_dns_errors_total", "counter", "Captive DNS queries answered with FORMERR/NOTIMP/REFUSED.")
+    w.write("gateway_dns_errors_total %d\n" % value(DNS_ERRORS))
+    _family(w, "gateway_dns_forwarded_total", "counter", "Captive DNS queries forwarded to the upstream resolver.")
+    w.write("gateway_dns_forwarded_total %d\n" % value(DNS_FORWARDED))
+    _family(w, "gateway_dns_cache_hits_total", "counter", "Captive DNS queries answered from the forwarding cache.")
+    w.write("gateway_dns_cache_hits_total %d\n" % value(DNS_CACHE_HITS))
+    _family(w, "gateway_mdns_answers_total", "counter", "mDNS queries answered.")
+    w.write("gateway_mdns_answers_total %d\n" % value(MDNS_ANSWERED))
+    _family(w, "gateway_mdns_conflicts_total", "counter", "mDNS hostname conflicts that forced a rename.")
+    w.write("gateway_mdns_conflicts_total %d\n" % value(MDNS_CONFLICTS))
+
+    _family(w, "gateway_wifi_link_lost_total", "counter", "Station link drops.")
+    w.write("gateway_wifi_link_lost_total %d\n" % value(WIFI_LINK_LOST))
+    _family(w, "gateway_wifi_reconnects_total", "counter", "Successful automatic reconnects.")
+    w.write("gateway_wifi_reconnects_total %d\n" % value(WIFI_RECONNECTS))
+    _family(w, "gateway_wifi_roams_total", "counter", "Proactive roams to a stronger BSSID.")
+    w.write("gateway_wifi_roams_total %d\n" % value(WIFI_ROAMS))
+    _family(w, "gateway_net_tx_errors_total", "counter", "TCP/HTTP socket send failures.")
+    w.write("gateway_net_tx_errors_total %d\n" % value(NET_TX_ERR))
+
+    _family(w, "gateway_lcd_flush_us", "summary", "LCD frame flush (SPI transfer) time in microseconds.")
+    w.write("gateway_lcd_flush_us_sum %d\n" % value(LCD_FLUSH_US_SUM))
+    w.write("gateway_lcd_flush_us_count %d\n" % value(LCD_FLUSHES))
+    _family(w, "gateway_lcd_full_flushes_total", "counter", "LCD flushes that redrew the whole screen.")
+    w.write("gateway_lcd_full_flushes_total %d\n" % value(LCD_FULL_FLUSHES))
+    _family(w, "gateway_key_events_dropped_total", "counter", "Button events dropped because the event queue was full.")
+    w.write("gateway_key_events_dropped_total %d\n" % value(KEY_DROPPED))
+
+    _gauge(w, "gateway_heap_free_bytes", "Free MicroPython heap (gc.mem_free).", gc.mem_free())
+    _gauge(w, "gateway_wifi_rssi_dbm", "Station RSSI in dBm.", rssi)
+    if battery is not None:
+        _gauge(w, "gateway_battery_volts", "Battery bus voltage.", "%.3f" % battery["v"])
+        _gauge(w, "gateway_battery_amps", "Battery current.", "%.3f" % battery["i"])
+        _gauge(w, "gateway_battery_percent", "Estimated battery charge.", "%.0f" % battery["p"])
+    w.flush()
@@ -0,0 +1,166 @@
+# net_poller.py - 以 select.poll 同時等待所有監聽 socket（TCP 指令、HTTP、DNS、mDNS）
+# 主迴圈呼叫 run_once(timeout_ms)：有 socket 可讀就立刻處理，沒有就睡到逾時，
+# 取代「每輪試一次非阻塞 accept() + 固定 sleep」的做法，新連線不必再等下一輪。
+# 已接受的 TCP 用戶端也登記進來（watch_clients），資料到了才讀，不在迴圈內阻塞等待慢速用戶端。
+
+import errno
+import select
+import time
+
+_READ = select.POLLIN
+_ERR = getattr(select, "POLLERR", 8) | getattr(select, "POLLHUP", 16) | getattr(select, "POLLNVAL", 32)
+
+
+class NetPoller:
+    def __init__(self):
+        self._poll = select.poll()
+        # 每筆監看：[取得 socket 的函式, 可讀時的處理函式, 目前已註冊的 socket]
+        self._watches = []
+        # 每組用戶端連線：[取得目前連線清單的函式, 可讀時的處理函式 handler(sock), {已註冊的 socket: 註冊時的 key}]
+        self._groups = []
+        self._by_key = {}
+
+    def watch(self, get_sock, handler):
+        """監看 get_sock() 回傳的 socket；socket 可能稍後才建立或被替換，run_once() 會自動重新註冊。"""
+        self._watches.append([get_sock, handler, None])
+
+    def watch_clients(self, get_socks, handler):
+        """監看一組會增減的 socket（已接受的連線）；get_socks() 回傳目前的清單，可讀時呼叫 handler(sock)。"""
+        self._groups.append([get_socks, handler, {}])
+
+    def _key(self, sock):
+        # MicroPython 的 poll 回傳 socket 物件本身；CPython 回傳 fd
+        try:
+            return sock.fileno()
+        except Exception:
+            return sock
+
+    def refresh(self):
+        """比對每個監看的 socket 是否換了，換了就更新註冊。"""
+        for w in self._watches:
+            sock = w[0]()
+            old = w[2]
+            if sock is old:
+                continue
+            if old is not None:
+                self._by_key.pop(self._key(old), None)
+                try:
+                    self._poll.unregister(old)
+                except Exception:
+                    pass
+            w[2] = sock
+            if sock is not None:
+                self._poll.register(sock, _READ)
+                self._by_key[self._key(sock)] = w
+        for g in self._groups:
+            socks = g[0]()
+            reg = g[2]
+            for sock in [s for s in reg if s not in socks]:
+                # 連線已由服務關閉：關閉後 fileno() 失效，以註冊時記下的 key 取消
+                key = reg.pop(sock)
+                self._by_key.pop(key, None)
+                try:
+                    self._poll.unregister(sock)
+                except Exception:
+                    try:
+                        self._poll.unregister(key)
+                    except Exception:
+                        pass
+            for sock in socks:
+                if sock not in reg:
+                    key = self._key(sock)
+                    self._poll.register(sock, _READ)
+                    reg[sock] = key
+                    # 與單一 socket 的監看同格式；handler 需要知道是哪一條連線
+                    self._by_key[key] = [None, lambda s=sock, h=g[1]: h(s), sock]
+
+    def run_once(self, timeout_ms: int) -> int:
+        """最多等待 timeout_ms，處理所有可讀的 socket，回傳處理的數量。"""
+        self.refresh()
+        # 沒有任何 socket 時 poll 仍會等到逾時，等同 sleep
+        handled = 0
+        for ev in self._poll.poll(timeout_ms):
+            w = self._by_key.get(ev[0])
+            if w is None:
+                w = self._by_key.get(self._key(ev[0]))
+            if w is None:
+                continue
+            if ev[1] & _ERR and not ev[1] & _READ and w[0] is not None:
+                # socket 已失效：取消註冊但保留記錄，避免 refresh() 又把同一個 socket 註冊回來；
+                # 服務重新建立 socket 後才會再註冊新的。用戶端連線照常交給 handler，由 recv 的結果決定關閉
+                try:
+                    self._poll.unregister(w[2])
+                except Exception:
+                    pass
+                self._by_key.pop(self._key(w[2]), None)
+                continue
+            try:
+                w[1]()
+            except Exception as e:
+                print("poll handler error:", e)
+            handled += 1
+        return handled
+
+
+_WOULD_BLOCK = (errno.EAGAIN, getattr(errno, "EWOULDBLOCK", errno.EAGAIN))
+
+
+def would_block(e) -> bool:
+    """非阻塞 socket 目前沒有資料（不是錯誤）。"""
+    return bool(e.args) and e.args[0] in _WOULD_BLOCK
+
+
+class ClientSet:
+    """已接受、尚未處理完的 TCP 連線：改為非阻塞，逾時或超過上限（關最舊的）時關閉。
+    socks() 交給 NetPoller.watch_clients()，可讀時由服務自己讀取並推進各連線的狀態。"""
+
+    def __init__(self, name: str, limit: int, timeout_ms: int):
+        self.name = name
+        self.limit = limit
+        self.timeout_ms = timeout_ms
+        self._conns = {}  # socket -> [逾時 ticks, 服務自訂的狀態]
+
+    def add(self, sock, state=None) -> None:
+        sock.settimeout(0.0)
+        if len(self._conns) >= self.limit:
+            now = time.ticks_ms()
+            self.drop(min(self._conns, key=lambda c: time.ticks_diff(self._conns[c][0], now)))
+        self._conns[sock] = [time.ticks_add(time.ticks_ms(), self.timeout_ms), state]
+
+    def state(self, sock):
+        """連線的狀態；已關閉（或不是這組的連線）回 None。"""
+        e = self._conns.get(sock)
+        return e[1] if e is not None else None
+
+    def __contains__(self, sock) -> bool:
+        return sock in self._conns
+
+    def drop(self, sock) -> None:
+        self._conns.pop(sock, None)
+        try:
+            sock.close()
+        except Exception:
+            pass
+
+    def socks(self):
+        """目前的連線清單；順便關掉逾時仍未送完請求的連線。"""
+        now = time.ticks_ms()
+        for sock in [c for c, e in self._conns.items() if time.ticks_diff(now, e[0]) >= 0]:
+            print("%s client timed out" % self.name)
+            self.drop(sock)
+        return list(self._conns)
+
+
+def make_service_poller():
+    """建立韌體用的 poll 迴圈：TCP 指令、HTTP 與 udp_service 的 UDP 服務（Captive DNS、mDNS）有資料時才處理。"""
+    import Server_CMD
+    import Web_Page
+    import udp_service
+
+    poller = NetPoller()
+    poller.watch(lambda: Server_CMD.server_sock, Server_CMD.poll_cmd_server)
+    poller.watch(lambda: Web_Page.http_sock, Web_Page.poll_http_server)
+    poller.watch_clients(Server_CMD.client_socks, Server_CMD.service_client)
+    poller.watch_clients(Web_Page.client_socks, Web_Page.service_client)
+    udp_service.watch(poller)
+    return poller
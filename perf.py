@@ -0,0 +1,182 @@
+# perf.py - 主迴圈與各服務的耗時統計（ticks_us）
+# 每個量測點佔一個預先配置的槽位：次數、總和、最小/最大值與 log2 直方圖（估 p99）。
+# 停用時 start() 只回傳 0、stop() 直接返回，幾乎沒有額外負擔；由 SYS PERF 與 GET /perf 讀取。
+#
+# 用法：
+#   t0 = perf.start()
+#   ...要量的工作...
+#   perf.stop(perf.LOOP, "battery", t0)
+
+import _thread
+import time
+from array import array
+
+try:
+    from config import PERF_ENABLED
+except ImportError:
+    PERF_ENABLED = False
+
+# 量測群組：主迴圈各步驟 / 每種指令 / 每個 HTTP 路徑
+LOOP = 0
+CMD = 1
+HTTP = 2
+GROUP_NAMES = ("loop", "cmd", "http")
+
+MAX_SLOTS = 32  # 所有群組共用的槽位上限；用完後新名稱不再記錄，只累計 overflow
+BUCKETS = 20  # 第 b 格收 [2^(b-1), 2^b) us，最後一格收 >= 2^18 us（約 0.26 s 以上）
+DECAY_AT = 1024  # 次數達此值就把次數/總和/直方圖減半，平均與 p99 反映最近約一千筆
+
+_enabled = bool(PERF_ENABLED)
+_slots = ({}, {}, {})  # 每個群組 name -> 槽位索引；只在第一次遇到某名稱時配置
+_names = []  # 槽位索引 -> (group, name)
+_n = array("L", [0] * MAX_SLOTS)
+_sum = array("L", [0] * MAX_SLOTS)
+_min = array("L", [0] * MAX_SLOTS)
+_max = array("L", [0] * MAX_SLOTS)
+_hist = array("H", [0] * (MAX_SLOTS * BUCKETS))
+overflow = 0  # 槽位用完而未記錄的次數
+# NET_ON_CORE1 時兩核心都會呼叫 stop()（rp2 沒有 GIL）：更新槽位與統計時持鎖；停用時不會碰到鎖
+_lock = _thread.allocate_lock()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset() -> None:
+    """清除所有統計（保留已配置的名稱）。"""
+    global overflow
+    with _lock:
+        overflow = 0
+        for i in range(MAX_SLOTS):
+            _n[i] = 0
+            _sum[i] = 0
+            _min[i] = 0
+            _max[i] = 0
+        for i in range(len(_hist)):
+            _hist[i] = 0
+
+
+def start() -> int:
+    """量測起點；停用時回傳 0。"""
+    if not _enabled:
+        return 0
+    return time.ticks_us()
+
+
+def _slot(group: int, name: str) -> int:
+    i = _slots[group].get(name)
+    if i is not None:
+        return i
+    if len(_names) >= MAX_SLOTS:
+        return -1
+    i = len(_names)
+    _names.append((group, name))
+    _slots[group][name] = i
+    return i
+
+
+def _bucket(us: int) -> int:
+    b = 0
+    while us and b < BUCKETS - 1:
+        us >>= 1
+        b += 1
+    return b
+
+
+def stop(group: int, name: str, t0: int) -> None:
+    """記錄從 t0 到現在的耗時；停用或 t0 為 0（量測開始時仍停用）時直接返回。"""
+    if not _enabled or not t0:
+        return
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    if dt < 0:
+        dt = 0
+    with _lock:
+        _record(group, name, dt)
+
+
+def _record(group: int, name: str, dt: int) -> None:
+    global overflow
+    i = _slot(group, name)
+    if i < 0:
+        overflow += 1
+        return
+    n = _n[i]
+    if n >= DECAY_AT:
+        n >>= 1
+        _sum[i] >>= 1
+        base = i * BUCKETS
+        for b in range(base, base + BUCKETS):
+            _hist[b] >>= 1
+    if n == 0 or dt < _min[i]:
+        _min[i] = dt
+    if dt > _max[i]:
+        _max[i] = dt
+    _n[i] = n + 1
+    # 單筆上限約 1 s，確保 _sum 在減半機制下不會超出 32 位元
+    _sum[i] += dt if dt < 1000000 else 1000000
+    _hist[i * BUCKETS + _bucket(dt)] += 1
+
+
+def _p99(i: int) -> int:
+    """由直方圖估 p99：回傳累積達 99% 的那一格上界（不超過 max）。"""
+    base = i * BUCKETS
+    total = 0
+    for b in range(BUCKETS):
+        total += _hist[base + b]
+    if not total:
+        return 0
+    need = total - total // 100
+    acc = 0
+    for b in range(BUCKETS):
+        acc += _hist[base + b]
+        if acc >= need:
+            upper = (1 << b) - 1 if b else 0
+            return upper if upper < _max[i] else _max[i]
+    return _max[i]
+
+
+def _row(i: int) -> dict:
+    n = _n[i]
+    return {
+        "n": n,
+        "min": _min[i],
+        "avg": _sum[i] // n if n else 0,
+        "p99": _p99(i),
+        "max": _max[i],
+    }
+
+
+def snapshot() -> dict:
+    """{"enabled": bool, "loop": {name: {n,min,avg,p99,max}}, "cmd": {...}, "http": {...}}，單位 us。"""
+    out = {"enabled": _enabled, "overflow": overflow}
+    for g in GROUP_NAMES:
+        out[g] = {}
+    for i, (group, name) in enumerate(_names):
+        if _n[i]:
+            out[GROUP_NAMES[group]][name] = _row(i)
+    return out
+
+
+def report_lines():
+    """逐行產生文字報表，供 SYS PERF 使用。"""
+    for i, (group, name) in enumerate(_names):
+        if not _n[i]:
+            continue
+        r = _row(i)
+        yield "%s.%s n=%d min=%d avg=%d p99=%d max=%d" % (
+            GROUP_NAMES[group],
+            name,
+            r["n"],
+            r["min"],
+            r["avg"],
+            r["p99"],
+            r["max"],
+        )
+    if overflow:
+        yield "overflow=%d" % overflow
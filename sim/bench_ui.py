@@ -0,0 +1,57 @@
+# bench_ui.py - 主機端 UI 效能量測：每次操作送出多少 SPI 位元組、刷新幾次
+# 用法：python sim/bench_ui.py [掃描筆數，預設 40]
+
+import sys
+
+import lcd_emulator as emu
+
+
+def _measure(label, steps, action):
+    """執行 action() steps 次，每次後呼叫 present(force=True)，回傳平均統計。"""
+    from LCD_Control import present
+
+    emu.reset_stats()
+    frames = 0
+    for _ in range(steps):
+        action()
+        if present(force=True):
+            frames += 1
+    st = emu.stats()
+    per = st["spi_bytes"] / max(1, steps)
+    print(
+        "%-24s %4d presses  %8.0f B/press  %.2f flush/press  %.2f frame/press"
+        % (label, steps, per, st["flushes"] / max(1, steps), frames / max(1, steps))
+    )
+    return per
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 40
+    emu.install(scan_count=count)
+    import UI_Page as ui
+    from LCD_Control import present, W, H
+
+    full = W * H * 2
+    ui.do_scan()
+    present(force=True)
+    print("full frame = %d B" % full)
+
+    _measure("render_list (full)", 5, ui.render_list)
+    _measure("list DN (hold)", max(1, count - 1), lambda: ui.move_selection(+1))
+    _measure("list UP (hold)", max(1, count - 1), lambda: ui.move_selection(-1))
+
+    ui.show_connect_setup()
+    present(force=True)
+    _measure("render_connect (full)", 5, ui.render_connect)
+    _measure("keypad RIGHT", 5, lambda: ui.keypad_move(+1, 0))
+    _measure("keypad DN", 1, lambda: ui.keypad_move(0, +1))
+    _measure("keypad LEFT", 5, lambda: ui.keypad_move(-1, 0))
+
+    bad = emu.unrenderable_text()
+    for s, x, y in bad:
+        print("WARN: 8x8 font cannot draw %r at (%d, %d)" % (s, x, y))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
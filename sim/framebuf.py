@@ -0,0 +1,253 @@
+# framebuf.py（主機端模擬）- CPython 版 framebuf.FrameBuffer，只實作本專案用到的 RGB565
+# 像素以小端序 uint16 存放，與 RP2 上的 MicroPython 相同；8x8 字型只涵蓋 ASCII 0x20~0x7E。
+
+from array import array
+
+MONO_VLSB = 0
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS2_HMSB = 5
+GS8 = 6
+
+# 8x8 ASCII 字型（public domain font8x8_basic），每字 8 列、bit0 為最左像素
+_FONT = bytes.fromhex(
+    "0000000000000000"  # ' '
+    "183c3c1818001800"  # !
+    "3636000000000000"  # "
+    "36367f367f363600"  # #
+    "0c3e031e301f0c00"  # $
+    "006333180c666300"  # %
+    "1c361c6e3b336e00"  # &
+    "0606030000000000"  # '
+    "180c0606060c1800"  # (
+    "060c1818180c0600"  # )
+    "00663cff3c660000"  # *
+    "000c0c3f0c0c0000"  # +
+    "00000000000c0c06"  # ,
+    "0000003f00000000"  # -
+    "00000000000c0c00"  # .
+    "6030180c06030100"  # /
+    "3e63737b6f673e00"  # 0
+    "0c0e0c0c0c0c3f00"  # 1
+    "1e33301c06333f00"  # 2
+    "1e33301c30331e00"  # 3
+    "383c36337f307800"  # 4
+    "3f031f3030331e00"  # 5
+    "1c06031f33331e00"  # 6
+    "3f3330180c0c0c00"  # 7
+    "1e33331e33331e00"  # 8
+    "1e33333e30180e00"  # 9
+    "000c0c00000c0c00"  # :
+    "000c0c00000c0c06"  # ;
+    "180c0603060c1800"  # <
+    "00003f00003f0000"  # =
+    "060c1830180c0600"  # >
+    "1e3330180c000c00"  # ?
+    "3e637b7b7b031e00"  # @
+    "0c1e33333f333300"  # A
+    "3f66663e66663f00"  # B
+    "3c66030303663c00"  # C
+    "1f36666666361f00"  # D
+    "7f46161e16467f00"  # E
+    "7f46161e16060f00"  # F
+    "3c66030373667c00"  # G
+    "3333333f33333300"  # H
+    "1e0c0c0c0c0c1e00"  # I
+    "7830303033331e00"  # J
+    "6766361e36666700"  # K
+    "0f06060646667f00"  # L
+    "63777f7f6b636300"  # M
+    "63676f7b73636300"  # N
+    "1c36636363361c00"  # O
+    "3f66663e06060f00"  # P
+    "1e3333333b1e3800"  # Q
+    "3f66663e36666700"  # R
+    "1e33070e38331e00"  # S
+    "3f2d0c0c0c0c1e00"  # T
+    "3333333333333f00"  # U
+    "33333333331e0c00"  # V
+    "6363636b7f776300"  # W
+    "6363361c1c366300"  # X
+    "3333331e0c0c1e00"  # Y
+    "7f6331184c667f00"  # Z
+    "1e06060606061e00"  # [
+    "03060c1830604000"  # backslash
+    "1e18181818181e00"  # ]
+    "081c366300000000"  # ^
+    "00000000000000ff"  # _
+    "0c0c180000000000"  # `
+    "00001e303e336e00"  # a
+    "0706063e66663b00"  # b
+    "00001e3303331e00"  # c
+    "3830303e33336e00"  # d
+    "00001e333f031e00"  # e
+    "1c36060f06060f00"  # f
+    "00006e33333e301f"  # g
+    "0706366e66666700"  # h
+    "0c000e0c0c0c1e00"  # i
+    "300030303033331e"  # j
+    "070666361e366700"  # k
+    "0e0c0c0c0c0c1e00"  # l
+    "0000337f7f6b6300"  # m
+    "00001f3333333300"  # n
+    "00001e3333331e00"  # o
+    "00003b66663e060f"  # p
+    "00006e33333e3078"  # q
+    "00003b6e66060f00"  # r
+    "00003e031e301f00"  # s
+    "080c3e0c0c2c1800"  # t
+    "0000333333336e00"  # u
+    "00003333331e0c00"  # v
+    "0000636b7f7f3600"  # w
+    "000063361c366300"  # x
+    "00003333333e301f"  # y
+    "00003f190c263f00"  # z
+    "380c0c070c0c3800"  # {
+    "1818180018181800"  # |
+    "070c0c380c0c0700"  # }
+    "6e3b000000000000"  # ~
+    "ff818181818181ff"  # 0x7F：替代字元（空心方框）
+)
+
+# 記錄 8x8 字型畫不出來的文字（非 ASCII），供回歸檢查使用：[(text, x, y), ...]
+unrenderable_text = []
+
+
+class FrameBuffer:
+    """只支援 RGB565 的 FrameBuffer，API 與 MicroPython 相同。"""
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != RGB565:
+            raise ValueError("sim framebuf only supports RGB565")
+        self._buf = buffer
+        self._w = width
+        self._h = height
+        self._stride = stride or width
+        self._px = memoryview(buffer).cast("H")
+
+    # ---------- 基本像素 ----------
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._w and 0 <= y < self._h):
+            return None
+        i = y * self._stride + x
+        if c is None:
+            return self._px[i]
+        self._px[i] = c & 0xFFFF
+
+    def fill(self, c):
+        self.fill_rect(0, 0, self._w, self._h, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(0, x)
+        y0 = max(0, y)
+        x1 = min(self._w, x + w)
+        y1 = min(self._h, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        row = array("H", [c & 0xFFFF]) * (x1 - x0)
+        px = self._px
+        for yy in range(y0, y1):
+            off = yy * self._stride + x0
+            px[off : off + (x1 - x0)] = row
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        # Bresenham
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x0, y0, c)
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def poly(self, x, y, coords, c, f=False):
+        pts = [(x + coords[i], y + coords[i + 1]) for i in range(0, len(coords) - 1, 2)]
+        if not pts:
+            return
+        if not f:
+            for i in range(len(pts)):
+                ax, ay = pts[i]
+                bx, by = pts[(i + 1) % len(pts)]
+                self.line(ax, ay, bx, by, c)
+            return
+        # 掃描線填滿（even-odd），與 MicroPython 的取樣點一致：像素中心
+        ys = [p[1] for p in pts]
+        for yy in range(min(ys), max(ys) + 1):
+            xs = []
+            for i in range(len(pts)):
+                ax, ay = pts[i]
+                bx, by = pts[(i + 1) % len(pts)]
+                if (ay <= yy < by) or (by <= yy < ay):
+                    xs.append(ax + (yy - ay) * (bx - ax) / (by - ay))
+            xs.sort()
+            for i in range(0, len(xs) - 1, 2):
+                xa = int(xs[i] + 0.5)
+                xb = int(xs[i + 1] + 0.5)
+                self.fill_rect(xa, yy, xb - xa + 1, 1, c)
+        for i in range(len(pts)):
+            ax, ay = pts[i]
+            bx, by = pts[(i + 1) % len(pts)]
+            self.line(ax, ay, bx, by, c)
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=0xF):
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                d = (xx * xx) / max(1, xr * xr) + (yy * yy) / max(1, yr * yr)
+                if d <= 1.0 and (f or d >= 0.7):
+                    self.pixel(x + xx, y + yy, c)
+
+    # ---------- 文字 ----------
+    def text(self, s, x, y, c=1):
+        s = str(s)
+        # MicroPython 逐 byte 繪製 UTF-8；非 ASCII 一律換成 0x7F
+        data = s.encode("utf-8")
+        if any(b < 32 or b > 127 for b in data):
+            unrenderable_text.append((s, x, y))
+        for b in data:
+            if b < 32 or b > 127:
+                b = 127
+            glyph = _FONT[(b - 32) * 8 : (b - 32) * 8 + 8]
+            for row in range(8):
+                bits = glyph[row]
+                if not bits:
+                    continue
+                for col in range(8):
+                    if bits & (1 << col):
+                        self.pixel(x + col, y + row, c)
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        raise NotImplementedError("scroll is not used by this project")
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._h):
+            for xx in range(fbuf._w):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
@@ -0,0 +1,137 @@
+# lcd_emulator.py - 在 Linux/macOS 上用 CPython 跑 LCD_Control / UI_Page
+# 以 sim/ 內的 machine、framebuf、network 等替身取代 MicroPython 模組，
+# 由 st7789.Panel 解析 SPI 指令流，統計傳輸量並把面板畫面存成 PNG/PPM。
+#
+# 用法：python sim/lcd_emulator.py [輸出資料夾]
+#   逐一繪製各畫面並存圖；若有 8x8 字型畫不出的文字（非 ASCII），回傳碼為 1。
+
+import gc
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+panel = None
+
+
+def _install_time():
+    """補上 MicroPython 專有的 time.ticks_* / sleep_ms。"""
+    if hasattr(time, "ticks_ms"):
+        return
+    _period = 1 << 30
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000) & (_period - 1)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000) & (_period - 1)
+
+    def ticks_diff(a, b):
+        d = (a - b) & (_period - 1)
+        return d - _period if d >= _period // 2 else d
+
+    def ticks_add(t, delta):
+        return (t + delta) & (_period - 1)
+
+    time.ticks_ms = ticks_ms
+    time.ticks_us = ticks_us
+    time.ticks_cpu = ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+
+
+def _install_gc():
+    """CPython 沒有 gc.mem_free/mem_alloc，以固定大小的假堆積近似。"""
+    if hasattr(gc, "mem_free"):
+        return
+    gc.mem_alloc = lambda: 0
+    gc.mem_free = lambda: 256 * 1024
+    gc.threshold = lambda *a: -1
+
+
+def install(scan_count: int = 40):
+    """設定 sys.path 與替身模組，建立面板；必須在匯入韌體模組之前呼叫。"""
+    global panel
+    for p in (ROOT_DIR, SIM_DIR):
+        if p in sys.path:
+            sys.path.remove(p)
+        sys.path.insert(0, p)
+    _install_time()
+    _install_gc()
+    import network
+    from st7789 import Panel
+
+    network.scan_results = network.fake_scan_results(scan_count)
+    if panel is None:
+        panel = Panel()
+    return panel
+
+
+def stats():
+    """目前累計的 SPI 統計（位元組數、刷新次數）。"""
+    return dict(panel.stats)
+
+
+def reset_stats():
+    panel.reset_stats()
+
+
+def save_png(path):
+    panel.save_png(path)
+
+
+def save_ppm(path):
+    panel.save_ppm(path)
+
+
+def unrenderable_text():
+    """回傳 8x8 字型無法繪製的文字紀錄 [(text, x, y), ...]。"""
+    import framebuf
+
+    return list(framebuf.unrenderable_text)
+
+
+def render_all(out_dir):
+    """依序繪製主要畫面並存圖，回傳 [(name, stats), ...]。"""
+    import UI_Page as ui
+    from LCD_Control import present
+
+    os.makedirs(out_dir, exist_ok=True)
+    screens = [
+        ("home", ui.show_home),
+        ("list", ui.do_scan),
+        ("detail", ui.show_detail),
+        ("connect", ui.show_connect_setup),
+        ("status", ui.show_status),
+    ]
+    results = []
+    for name, fn in screens:
+        reset_stats()
+        fn()
+        present(force=True)
+        save_png(os.path.join(out_dir, name + ".png"))
+        results.append((name, stats()))
+    return results
+
+
+def main(argv):
+    out_dir = argv[1] if len(argv) > 1 else os.path.join(ROOT_DIR, "sim_out")
+    install()
+    for name, st in render_all(out_dir):
+        print(
+            "%-8s spi=%7dB pixels=%7dB flushes=%d"
+            % (name, st["spi_bytes"], st["pixel_bytes"], st["flushes"])
+        )
+    bad = unrenderable_text()
+    for s, x, y in bad:
+        print("WARN: 8x8 font cannot draw %r at (%d, %d)" % (s, x, y))
+    print("screens saved to", out_dir)
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,167 @@
+# machine.py（主機端模擬）- 提供 Pin/SPI/PWM/I2C/UART 的 CPython 替身
+# Pin 電位存在全域表，方便模擬按鍵；SPI 寫入會轉交給已掛上的裝置（例如 st7789.Panel）。
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    # pin id -> 目前電位；pin id -> (handler, trigger)
+    _levels = {}
+    _irqs = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        if id not in Pin._levels:
+            Pin._levels[id] = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            Pin._levels[id] = 1 if value else 0
+
+    def __repr__(self):
+        return "Pin(%r)" % (self.id,)
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels.get(self.id, 0)
+        Pin._levels[self.id] = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None:
+            Pin._irqs.pop(self.id, None)
+        else:
+            Pin._irqs[self.id] = (handler, trigger)
+
+    # ---------- 模擬用：由測試/腳本改變輸入電位並觸發 IRQ ----------
+    @classmethod
+    def drive(cls, id, level):
+        old = cls._levels.get(id, 0)
+        level = 1 if level else 0
+        cls._levels[id] = level
+        if old == level:
+            return
+        irq = cls._irqs.get(id)
+        if not irq:
+            return
+        handler, trigger = irq
+        if (level == 0 and trigger & cls.IRQ_FALLING) or (level == 1 and trigger & cls.IRQ_RISING):
+            handler(Pin(id))
+
+
+class SPI:
+    # bus id -> 裝置回呼 fn(buf)
+    _devices = {}
+
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    @classmethod
+    def attach(cls, bus, fn):
+        cls._devices[bus] = fn
+
+    def write(self, buf):
+        fn = SPI._devices.get(self.id)
+        if fn is not None:
+            fn(buf)
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class PWM:
+    def __init__(self, pin, **kwargs):
+        self.pin = pin
+        self._freq = 0
+        self._duty = 0
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty
+        self._duty = d
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    """預設沒有任何裝置：讀寫都丟 OSError(ENODEV)，與沒接 UPS 模組時相同。"""
+
+    # (addr, reg) -> bytes；腳本可自行填入模擬暫存器內容
+    registers = {}
+
+    def __init__(self, id, **kwargs):
+        self.id = id
+
+    def _dev(self, addr):
+        if not any(a == addr for a, _ in I2C.registers):
+            raise OSError(19)
+
+    def readfrom_mem(self, addr, reg, n):
+        self._dev(addr)
+        return bytes(I2C.registers.get((addr, reg), b"\x00" * n)[:n])
+
+    def writeto_mem(self, addr, reg, buf):
+        self._dev(addr)
+        I2C.registers[(addr, reg)] = bytes(buf)
+
+    def scan(self):
+        return sorted({a for a, _ in I2C.registers})
+
+
+class UART:
+    def __init__(self, id, baudrate=115200, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.tx = bytearray()
+        self.rx = bytearray()
+
+    def write(self, buf):
+        self.tx += buf
+        return len(buf)
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, n=None):
+        if not self.rx:
+            return None
+        n = len(self.rx) if n is None else n
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def freq(hz=None):
+    return 150000000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x5a\x2b\x21"
@@ -0,0 +1,19 @@
+# micropython.py（主機端模擬）- 只提供 const 等純 Python 可等價的函式
+# 注意：刻意不提供 native/viper 裝飾器，讓使用它們的模組在主機上走純 Python 版本。
+
+
+def const(x):
+    return x
+
+
+def alloc_emergency_exception_buf(n):
+    pass
+
+
+def schedule(fn, arg):
+    fn(arg)
+    return True
+
+
+def mem_info(*args):
+    print("mem_info: not available on host")
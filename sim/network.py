@@ -0,0 +1,108 @@
+# network.py（主機端模擬）- 假的 WLAN：掃描結果與連線結果都可由腳本設定
+
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+# 掃描結果：(ssid, bssid, channel, rssi, security, hidden)
+scan_results = []
+# ssid -> psk；connect() 時比對，符合才會「連上」
+known_networks = {}
+
+
+def fake_scan_results(n: int = 40):
+    """產生 n 筆假 AP，RSSI 由強到弱。"""
+    out = []
+    for i in range(n):
+        ssid = ("Plant-AP-%02d" % i).encode()
+        bssid = bytes([0x02, 0x00, 0x00, 0x00, i >> 8, i & 0xFF])
+        out.append((ssid, bssid, 1 + i % 11, -40 - i, 3, False))
+    return out
+
+
+class WLAN:
+    _instances = {}
+
+    def __new__(cls, iface=STA_IF):
+        # 與 MicroPython 相同：同一介面回傳同一個實例
+        inst = cls._instances.get(iface)
+        if inst is None:
+            inst = object.__new__(cls)
+            inst._iface = iface
+            inst._active = False
+            inst._status = STAT_IDLE
+            inst._ifconfig = ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+            inst._config = {"essid": "", "password": "", "channel": 1}
+            inst._stations = []
+            cls._instances[iface] = inst
+        return inst
+
+    def __init__(self, iface=STA_IF):
+        pass
+
+    def active(self, v=None):
+        if v is None:
+            return self._active
+        self._active = bool(v)
+        if self._iface == AP_IF and self._active:
+            self._ifconfig = ("192.168.4.1", "255.255.255.0", "192.168.4.1", "0.0.0.0")
+
+    def scan(self):
+        return list(scan_results)
+
+    def connect(self, ssid=None, key=None, bssid=None, channel=0):
+        want = known_networks.get(ssid)
+        if want is None:
+            self._status = STAT_NO_AP_FOUND
+        elif want != (key or ""):
+            self._status = STAT_WRONG_PASSWORD
+        else:
+            self._status = STAT_GOT_IP
+            self._config["ssid"] = ssid
+            # 實際關聯的 AP：指定 BSSID 時用它，否則取掃描結果中該 SSID 訊號最強的一台
+            if not bssid:
+                for ap in sorted(scan_results, key=lambda t: t[3], reverse=True):
+                    if ap[0] == ssid.encode():
+                        bssid, channel = ap[1], ap[2]
+                        break
+            self._config["bssid"] = bssid
+            self._config["channel"] = channel or 1
+            self._ifconfig = ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def disconnect(self):
+        self._status = STAT_IDLE
+        self._config["bssid"] = None
+        self._ifconfig = ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def isconnected(self):
+        if self._iface == AP_IF:
+            return self._active
+        return self._status == STAT_GOT_IP
+
+    def status(self, param=None):
+        if param is None:
+            return self._status
+        if param == "rssi":
+            if self._status != STAT_GOT_IP:
+                raise OSError(-1)
+            return -55
+        if param == "stations":
+            return list(self._stations)
+        raise ValueError(param)
+
+    def ifconfig(self, cfg=None):
+        if cfg is None:
+            return self._ifconfig
+        self._ifconfig = tuple(cfg)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
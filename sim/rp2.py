@@ -0,0 +1,10 @@
+# rp2.py（主機端模擬）- 只提供本專案用到的 country()
+
+_country = "XX"
+
+
+def country(code=None):
+    global _country
+    if code is None:
+        return _country
+    _country = code
@@ -0,0 +1,148 @@
+# st7789.py（主機端模擬）- 解析送往 ST7789 的 SPI 指令流，維護面板上實際看到的 GRAM
+# 會統計指令/資料位元組數與 RAMWR（刷新）次數，並可把畫面輸出成 PNG/PPM。
+
+import struct
+import zlib
+
+from machine import Pin, SPI
+
+_CASET = 0x2A
+_RASET = 0x2B
+_RAMWR = 0x2C
+
+
+class Panel:
+    """模擬 240x240 ST7789：依 DC 腳位區分指令/資料，CS 為高時忽略寫入。"""
+
+    def __init__(self, width=240, height=240, bus=1, dc=8, cs=9):
+        self.width = width
+        self.height = height
+        self.dc = dc
+        self.cs = cs
+        # GRAM 以面板看到的順序存放（每像素 2 bytes，先送的 byte 為高位）
+        self.gram = bytearray(width * height * 2)
+        self._cmd = None
+        self._args = bytearray()
+        self._win = [0, 0, width - 1, height - 1]
+        self._cur_x = 0
+        self._cur_y = 0
+        self.reset_stats()
+        SPI.attach(bus, self._on_spi)
+
+    def reset_stats(self):
+        # spi_bytes: 所有 SPI 位元組；pixel_bytes: RAMWR 寫入的像素資料
+        # flushes: RAMWR 次數（每次局部或全螢幕刷新各算一次）；full_flushes: 視窗為整個螢幕者
+        self.stats = {
+            "spi_bytes": 0,
+            "cmd_bytes": 0,
+            "pixel_bytes": 0,
+            "spi_writes": 0,
+            "flushes": 0,
+            "full_flushes": 0,
+        }
+
+    def _on_spi(self, buf):
+        if Pin._levels.get(self.cs, 1):
+            return
+        data = bytes(buf)
+        st = self.stats
+        st["spi_bytes"] += len(data)
+        st["spi_writes"] += 1
+        if Pin._levels.get(self.dc, 1) == 0:
+            st["cmd_bytes"] += len(data)
+            for b in data:
+                self._command(b)
+            return
+        if self._cmd == _RAMWR:
+            st["pixel_bytes"] += len(data)
+            self._pixels(data)
+        else:
+            self._args += data
+            self._apply_args()
+
+    def _command(self, cmd):
+        self._cmd = cmd
+        self._args = bytearray()
+        if cmd == _RAMWR:
+            self._cur_x = self._win[0]
+            self._cur_y = self._win[1]
+            self.stats["flushes"] += 1
+            if self._win == [0, 0, self.width - 1, self.height - 1]:
+                self.stats["full_flushes"] += 1
+
+    def _apply_args(self):
+        a = self._args
+        if len(a) < 4:
+            return
+        lo = (a[0] << 8) | a[1]
+        hi = (a[2] << 8) | a[3]
+        if self._cmd == _CASET:
+            self._win[0] = lo
+            self._win[2] = hi
+        elif self._cmd == _RASET:
+            self._win[1] = lo
+            self._win[3] = hi
+
+    def _pixels(self, data):
+        x0, y0, x1, y1 = self._win
+        w = self.width
+        gram = self.gram
+        i = 0
+        n = len(data) - 1
+        x = self._cur_x
+        y = self._cur_y
+        while i < n:
+            if y > y1 or y >= self.height:
+                break
+            if x < w:
+                off = (y * w + x) * 2
+                gram[off] = data[i]
+                gram[off + 1] = data[i + 1]
+            i += 2
+            x += 1
+            if x > x1:
+                x = x0
+                y += 1
+        self._cur_x = x
+        self._cur_y = y
+
+    # ---------- 輸出 ----------
+    def rgb888(self):
+        """轉成 RGB888 bytes（逐列），依面板收到的 16-bit 大端序解碼。"""
+        out = bytearray(self.width * self.height * 3)
+        g = self.gram
+        j = 0
+        for i in range(0, len(g), 2):
+            v = (g[i] << 8) | g[i + 1]
+            r = (v >> 11) & 0x1F
+            gg = (v >> 5) & 0x3F
+            b = v & 0x1F
+            out[j] = (r << 3) | (r >> 2)
+            out[j + 1] = (gg << 2) | (gg >> 4)
+            out[j + 2] = (b << 3) | (b >> 2)
+            j += 3
+        return out
+
+    def save_ppm(self, path):
+        with open(path, "wb") as f:
+            f.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+            f.write(self.rgb888())
+
+    def save_png(self, path):
+        rgb = self.rgb888()
+        stride = self.width * 3
+        raw = bytearray()
+        for y in range(self.height):
+            raw.append(0)  # filter: None
+            raw += rgb[y * stride : (y + 1) * stride]
+
+        def chunk(tag, payload):
+            c = struct.pack(">I", len(payload)) + tag + payload
+            return c + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF)
+
+        ihdr = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", ihdr))
+            f.write(chunk(b"IDAT", zlib.compress(bytes(raw), 6)))
+            f.write(chunk(b"IEND", b""))
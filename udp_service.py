@@ -0,0 +1,66 @@
+# udp_service.py - Captive DNS 與 mDNS 共用的 UDP 服務：不開執行緒，socket 可讀時才呼叫處理器
+# 處理器（需有 sock 屬性與 service() 方法）在 start() 時以固定的名稱登記、stop() 時移除；
+# 輪詢主迴圈用 watch(poller) 併入 net_poller，asyncio 由 async_runtime 對每個名稱等待可讀事件，
+# 閒置時不佔 CPU。有計時工作的處理器（mDNS 的探測/公告）另提供 tick()，
+# 迴圈等待前呼叫本模組的 tick()，並以其回傳值縮短等待時間。
+# 主機（CPython）上可直接以 localhost 的真實 socket 搭配 poll_once() 測試。
+
+SLOTS = ("dns", "mdns")
+
+_handlers = {}  # 名稱 -> 處理器
+_poller = None  # poll_once() 專用的 NetPoller，第一次呼叫才建立
+
+
+def register(name: str, handler) -> None:
+    if name not in SLOTS:
+        raise ValueError("unknown UDP service: " + name)
+    _handlers[name] = handler
+
+
+def unregister(name: str, handler=None) -> None:
+    """移除登記；指定 handler 時只在仍是同一個處理器時移除（避免新實例被舊的 stop() 清掉）。"""
+    if handler is None or _handlers.get(name) is handler:
+        _handlers.pop(name, None)
+
+
+def get(name: str):
+    """目前登記的處理器；尚未啟動為 None。"""
+    return _handlers.get(name)
+
+
+def sock_of(name: str):
+    h = _handlers.get(name)
+    return h.sock if h is not None else None
+
+
+def service(name: str) -> None:
+    h = _handlers.get(name)
+    if h is not None:
+        h.service()
+
+
+def tick() -> int:
+    """呼叫各處理器的 tick()（有的話），回傳最短的建議等待 ms；沒有計時工作回 1000。"""
+    wait = 1000
+    for h in _handlers.values():
+        t = getattr(h, "tick", None)
+        if t is not None:
+            wait = min(wait, t())
+    return wait
+
+
+def watch(poller) -> None:
+    """把所有 UDP 服務加入 NetPoller；處理器稍後才啟動或重建 socket 時，poller 會自動重新註冊。"""
+    for name in SLOTS:
+        poller.watch(lambda n=name: sock_of(n), lambda n=name: service(n))
+
+
+def poll_once(timeout_ms: int) -> int:
+    """沒有主迴圈時單獨服務 UDP（測試、工具腳本）：最多等 timeout_ms，回傳處理的封包數。"""
+    global _poller
+    if _poller is None:
+        from net_poller import NetPoller
+
+        _poller = NetPoller()
+        watch(_poller)
+    return _poller.run_once(min(timeout_ms, tick()))
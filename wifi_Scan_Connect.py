@@ -2,15 +2,31 @@
 # 集中處理 WLAN 初始化、掃描結果整理與連線流程，方便 UI 直接呼叫。
 
 import time
+import random
+import _thread
 import network
 import rp2
+import metrics
+import wifi_profiles
 try:
     from dns_captive import CaptiveDNS
 except Exception:
     CaptiveDNS = None
+try:
+    from config import WIFI_AUTO_RECONNECT
+except ImportError:
+    WIFI_AUTO_RECONNECT = True
+try:
+    from config import DNS_FORWARD, DNS_LOCAL_NAMES
+except ImportError:
+    DNS_FORWARD = True
+    DNS_LOCAL_NAMES = ("pico.pi.com", "www.pico.pi.com")
 
 COUNTRY = "TW"
 CONNECT_TIMEOUT_MS = 12000
+RECONNECT_POLL_MS = 250  # auto_reconnect() 查詢 wlan.status() 的最短間隔
+BACKOFF_MIN_MS = 1000  # 第一次失敗後約等 0.5~1 s，之後每次加倍（含隨機抖動）
+BACKOFF_MAX_MS = 30000
 
 # 初始化 Wi-Fi
 try:
@@ -24,45 +40,183 @@ ap = network.WLAN(network.AP_IF)
 _ap_enabled = False
 _ap_config = {"essid": "", "password": ""}
 _last_stations = []
+_station_seen = 0
+_station_next_ms = 0
+STATION_POLL_MS = 500  # watch_ap_stations() 實際查詢 AP 的最短間隔
 _captive_dns = None
+_scan_cache = []  # 最近一次 scan_visible() 的結果，連線/重連/漫遊時用來查 BSSID 與頻道
+_scan_cache_ms = 0
+_scan_wanted = False  # request_scan() 要求、尚未執行的掃描
+
+# 自動重連狀態
+RC_UP = 0  # 已連線（或尚未有連線可恢復）
+RC_WAIT = 1  # 等待退避時間到
+RC_JOINING = 2  # 已送出 wlan.connect()，等待結果
+_rc_state = RC_WAIT  # 開機後第一次呼叫就用最近的設定檔連線
+_rc_next_ms = 0
+_rc_poll_ms = 0
+_rc_failures = 0
+_rc_index = 0
+_rc_profile = None
+# 網路服務跑在 core 1 時，UI（core 0）與 HTTP（core 1）可能同時掃描/連線，以此鎖串行化對無線晶片的操作
+_radio_lock = _thread.allocate_lock()
+
+
+_NO_IFCONFIG = ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+STATE_MAX_AGE_MS = 1000  # 狀態快照最長沿用時間；連線/斷線/AP 啟停等事件會立即作廢
+
+
+class NetState:
+    """AP/STA 狀態快照：DNS、mDNS、SYS STATUS、/wifi/status、狀態頁都讀這裡，
+    每秒最多向驅動查詢一次（或事件後的第一次讀取），手機加入 AP 時的大量 DNS 查詢不再逐筆呼叫驅動。"""
+
+    def __init__(self):
+        self.ap_active = False
+        self.ap_stations = 0
+        self.sta_active = False
+        self.sta_connected = False
+        self.ifconfig = _NO_IFCONFIG
+        self.rssi = None
+        self._stamp = 0
+        self._valid = False
+
+    def invalidate(self) -> None:
+        """連線狀態可能已改變：下一次讀取時重新查詢。"""
+        self._valid = False
+
+    def get(self):
+        """回傳自己；快照過期或已作廢時先更新。"""
+        if not self._valid or time.ticks_diff(time.ticks_ms(), self._stamp) >= STATE_MAX_AGE_MS:
+            self.refresh()
+        return self
+
+    def refresh(self) -> None:
+        """向驅動重新查詢。NET_ON_CORE1 時兩核心都可能呼叫，查詢與寫入都在 _radio_lock 內；
+        鎖被占用（例如另一核心正在掃描）時不等待，沿用舊快照，下一次讀取再試。"""
+        if not _radio_lock.acquire(0):
+            return
+        try:
+            self._query()
+        finally:
+            _radio_lock.release()
+
+    def _query(self) -> None:
+        try:
+            ap_active = _ap_enabled and ap.active()
+        except Exception:
+            ap_active = False
+        stations = ap_station_count() if ap_active else 0
+        sta_active = False
+        conn = False
+        ifc = _NO_IFCONFIG
+        rssi = None
+        try:
+            sta_active = wlan.active()
+            conn = wlan.isconnected()
+            if conn:
+                ifc = wlan.ifconfig()
+                try:
+                    rssi = wlan.status("rssi")
+                except Exception:
+                    rssi = None
+        except Exception:
+            pass
+        self.ap_active = ap_active
+        self.ap_stations = stations
+        self.sta_active = sta_active
+        self.sta_connected = conn
+        self.ifconfig = ifc
+        self.rssi = rssi
+        self._stamp = time.ticks_ms()
+        self._valid = True
+
+    @property
+    def sta_ip(self) -> str:
+        """STA IP；未連線為 "0.0.0.0"。"""
+        return self.ifconfig[0]
+
+
+net_state = NetState()
+
+
+def sta_ip() -> str:
+    """目前 STA IP（讀快照），供 mDNS 的 ip_getter 使用。"""
+    return net_state.get().sta_ip
 
 
 def _dns_target_ip():
     """DNS 回應用 IP：若有裝置連在內建 AP，強制回 AP IP，否則回 STA IP。"""
     # 只要還有人連著 PicoSetup，就讓 www.pico.pi.com 保持在 192.168.4.1，
     # 避免 STA 連上家用 Wi-Fi 後 DNS 轉向新 IP，導致手機（仍在 AP）無法互動。
-    try:
-        if _ap_enabled and ap.active() and ap_station_count() > 0:
-            return "192.168.4.1"
-    except Exception:
-        # 若無法判斷則繼續嘗試回 STA IP
-        pass
-    try:
-        if wlan.isconnected():
-            ip = wlan.ifconfig()[0]
-            if ip:
-                return ip
-    except Exception:
-        pass
+    st = net_state.get()
+    if st.ap_active and st.ap_stations > 0:
+        return "192.168.4.1"
+    if st.sta_connected and st.sta_ip and st.sta_ip != "0.0.0.0":
+        return st.sta_ip
     return "192.168.4.1"
 
 
+# 作業系統連線檢查專用的主機名稱：分流時仍在本機回答，交給 Web_Page 的連線檢查快速回應。
+# 只列專供檢查用的名稱；www.apple.com、clients3.google.com 等一般網站也會被拿來檢查，
+# 但在本機回答會讓 AP 上的用戶端打不開這些網站，一律轉送（需要時可自行加進 DNS_LOCAL_NAMES）
+_PROBE_HOSTS = (
+    "connectivitycheck.gstatic.com",
+    "connectivitycheck.android.com",
+    "captive.apple.com",
+    "www.msftconnecttest.com",
+    "www.msftncsi.com",
+    "detectportal.firefox.com",
+)
+_upstream_ip = ""
+_upstream_addr = None
+
+
+def _dns_upstream():
+    """Captive DNS 的上游：STA 已連線時為 STA 取得的 DNS 伺服器 (ip, 53)，否則 None（全部本機回答）。"""
+    global _upstream_ip, _upstream_addr
+    if not DNS_FORWARD:
+        return None
+    st = net_state.get()
+    ip = st.ifconfig[3] if st.sta_connected else ""
+    if ip == "0.0.0.0":
+        ip = ""
+    if ip != _upstream_ip:
+        # IP 改變時才建立新的位址 tuple，每個查詢不必重新配置
+        _upstream_ip = ip
+        _upstream_addr = (ip, 53) if ip else None
+    return _upstream_addr
+
+
 def _ensure_captive_dns():
-    """啟動 DNS 假門牌（AP/STA 共用），讓 www.pico.pi.com 之類的名稱指向目前 IP。"""
+    """啟動 DNS 假門牌（AP/STA 共用），讓 www.pico.pi.com 之類的名稱指向目前 IP；
+    STA 連上後其他名稱轉送給上游 DNS（DNS_FORWARD）。"""
     global _captive_dns
     if CaptiveDNS is None:
         return
     if _captive_dns is None:
-        _captive_dns = CaptiveDNS(ip="192.168.4.1", ip_getter=_dns_target_ip)
+        _captive_dns = CaptiveDNS(
+            ip="192.168.4.1",
+            ip_getter=_dns_target_ip,
+            upstream=_dns_upstream,
+            local_names=tuple(DNS_LOCAL_NAMES) + _PROBE_HOSTS,
+            forward_from="192.168.4.",  # 只替 AP 上的用戶端轉送
+        )
     try:
         _captive_dns.start()
     except Exception as e:
         print("Captive DNS start failed:", e)
 
 
+def captive_dns():
+    """目前的 CaptiveDNS 實例（尚未啟動 AP/連線前為 None）。"""
+    return _captive_dns
+
+
 def scan_visible():
     """掃描 AP 並回傳已排序的可見清單（忽略空白 SSID）。"""
-    raw = wlan.scan()
+    global _scan_cache, _scan_cache_ms
+    with _radio_lock:
+        raw = wlan.scan()
     filtered = []
     for ap in raw:
         ssid = (ap[0] or b"").decode("utf-8", "ignore").strip()
@@ -70,49 +224,331 @@ def scan_visible():
             continue
         filtered.append(ap)
     filtered.sort(key=lambda t: t[3], reverse=True)
+    _scan_cache = filtered
+    _scan_cache_ms = time.ticks_ms()
     return filtered
 
 
-def connect_to_ap(ssid: str, psk: str, timeout_ms: int = CONNECT_TIMEOUT_MS) -> bool:
-    """嘗試連線指定 AP，成功回 True，失敗回 False。"""
-    _ensure_captive_dns()
+def request_scan() -> None:
+    """要求背景掃描（HTTP 等不能等待 wlan.scan() 的地方呼叫）；由主迴圈的 service_scan() 執行。"""
+    global _scan_wanted
+    _scan_wanted = True
+
+
+def service_scan() -> None:
+    """主迴圈（core 0）每輪呼叫：有掃描要求時做一次。wlan.scan() 會阻塞約 1~2 s，
+    但不在任何 HTTP 連線的處理中進行，NET_ON_CORE1 時也不會擋住 core 1 的網路服務。"""
+    global _scan_wanted
+    if not _scan_wanted:
+        return
+    _scan_wanted = False
+    try:
+        scan_visible()
+    except Exception as e:
+        print("scan failed:", e)
+
+
+def cached_scan():
+    """最近一次掃描結果與其經過時間 (list, age_ms)；從未掃描過 age_ms 為 None。"""
+    if not _scan_cache_ms:
+        return _scan_cache, None
+    return _scan_cache, time.ticks_diff(time.ticks_ms(), _scan_cache_ms)
+
+
+def _scan_lookup(ssid: str):
+    """掃描快取中該 SSID 訊號最強的 (bssid, channel)；沒看過回 (None, 0)。"""
+    want = ssid.encode()
+    for ap in _scan_cache:
+        if ap[0] == want:
+            return ap[1], ap[2]
+    return None, 0
+
+
+def _link_bssid():
+    """目前實際關聯的 (bssid, channel)，由驅動讀回；未連線、驅動不支援或另一核心正在用無線晶片時回 (None, 0)。
+    與 NetState.refresh 相同不等 _radio_lock，呼叫端已能處理讀不到的情況。"""
+    if not _radio_lock.acquire(0):
+        return None, 0
     try:
-        # 先斷線避免舊連線資訊干擾，再重新激活 STA
         try:
-            wlan.disconnect()
+            b = wlan.config("bssid")
         except Exception:
-            pass
-        wlan.active(True)
-        wlan.connect(ssid, psk)
-        t0 = time.ticks_ms()
-        while not wlan.isconnected() and time.ticks_diff(time.ticks_ms(), t0) < timeout_ms:
-            time.sleep_ms(150)
+            return None, 0
+        if not b or len(b) != 6 or not any(b):
+            return None, 0
+        try:
+            ch = wlan.config("channel")
+        except Exception:
+            ch = 0
+    finally:
+        _radio_lock.release()
+    return bytes(b), ch or 0
+
+
+def link_ssid() -> str:
+    """目前 STA 所連的 SSID，由驅動讀回（開機前就已連上、不是經 connector 連線時也讀得到）；
+    讀不到或另一核心正在用無線晶片時回空字串。"""
+    if not _radio_lock.acquire(0):
+        return ""
+    try:
+        s = wlan.config("ssid")
     except Exception:
+        return ""
+    finally:
+        _radio_lock.release()
+    if isinstance(s, bytes):
+        s = s.decode("utf-8", "ignore")
+    return s or ""
+
+
+def _remember_link(ssid: str, psk: str) -> None:
+    """連上後存設定檔：BSSID/頻道取實際關聯的 AP（漫遊或換 AP 後不會沿用舊值），讀不到就只存 SSID。"""
+    bssid, channel = _link_bssid()
+    wifi_profiles.remember(ssid, psk, bssid, channel)
+
+
+def roam_candidate(ssid: str, min_rssi: int, max_age_ms: int):
+    """掃描快取（不超過 max_age_ms）中同 SSID、RSSI >= min_rssi 且不是目前所連 AP 的 BSSID；
+    回傳 (bssid, channel, rssi)，沒有則 None。"""
+    if not _scan_cache or time.ticks_diff(time.ticks_ms(), _scan_cache_ms) > max_age_ms:
+        return None
+    # 以驅動讀回的 BSSID 為準：開機或自動重連時未指定 BSSID，connector.bssid 會是 None
+    current = _link_bssid()[0] or connector.bssid
+    want = ssid.encode()
+    for ap in _scan_cache:
+        if ap[0] == want and ap[3] >= min_rssi and ap[1] != current:
+            return ap[1], ap[2], ap[3]
+    return None
+
+
+# 連線進度（WifiConnector.state）
+CS_IDLE = "idle"
+CS_JOINING = "joining"  # 已送出連線，等待與 AP 完成關聯/認證
+CS_DHCP = "dhcp"  # 已關聯，等待取得 IP
+CS_CONNECTED = "connected"
+CS_NO_AP = "no_ap"
+CS_WRONG_PASSWORD = "wrong_password"
+CS_FAILED = "failed"
+CS_TIMEOUT = "timeout"
+_CS_BUSY = (CS_JOINING, CS_DHCP)
+
+# wlan.status() -> 進度；0（link down）在剛送出連線時也會短暫出現，視為 joining 直到逾時
+_STATUS_STATE = {
+    0: CS_JOINING,
+    1: CS_JOINING,
+    2: CS_DHCP,
+    3: CS_CONNECTED,
+    -1: CS_FAILED,
+    -2: CS_NO_AP,
+    -3: CS_WRONG_PASSWORD,
+}
+
+
+class WifiConnector:
+    """非阻塞 STA 連線：start() 送出連線後立即返回，由主迴圈 / asyncio task 反覆呼叫 step() 推進。
+    驅動回報失敗（找不到 AP、密碼錯誤…）時立即結束，不必等到逾時；state 為目前進度。
+    step() 只在主迴圈（asyncio 模式為 _reconnect_task）呼叫一處；auto_reconnect、LCD 連線畫面只讀 state。"""
+
+    def __init__(self):
+        self.state = CS_IDLE
+        self.ssid = ""
+        self.status = None  # 最後一次讀到的 wlan.status()
+        self.owner = None  # "user"（LCD/網頁）或 "auto"（自動重連）
+        self._psk = ""
+        self.bssid = None  # 本次連線指定的 BSSID（未指定為 None）
+        self._channel = 0
+        self._save = False
+        self._deadline = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.state in _CS_BUSY
+
+    def start(self, ssid: str, psk: str, bssid=None, channel: int = 0, timeout_ms: int = CONNECT_TIMEOUT_MS, owner: str = "user", save: bool = True) -> None:
+        """送出連線要求（會中斷目前的連線/嘗試）；save=True 時連上後存成 Wi-Fi 設定檔。"""
+        _ensure_captive_dns()
+        self.ssid = ssid
+        self.owner = owner
+        self.status = None
+        self._psk = psk
+        self.bssid = bssid
+        self._channel = channel
+        self._save = save
+        self._deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        net_state.invalidate()
+        try:
+            # 先斷線避免舊連線資訊干擾，再重新激活 STA
+            with _radio_lock:
+                try:
+                    wlan.disconnect()
+                except Exception:
+                    pass
+                wlan.active(True)
+                if bssid:
+                    wlan.connect(ssid, psk, bssid=bssid, channel=channel)
+                else:
+                    wlan.connect(ssid, psk)
+        except Exception as e:
+            print("connect %s error: %s" % (ssid, e))
+            self.state = CS_FAILED
+            return
+        self.state = CS_JOINING
+
+    def step(self) -> str:
+        """讀一次 wlan.status() 更新 state 並回傳；沒有進行中的連線時直接回傳 state。"""
+        if self.state not in _CS_BUSY:
+            return self.state
+        try:
+            st = wlan.status()
+        except Exception:
+            st = None
+        self.status = st
+        state = _STATUS_STATE.get(st, CS_JOINING)
+        if state == CS_CONNECTED:
+            self.state = CS_CONNECTED
+            net_state.invalidate()
+            if self._save:
+                _remember_link(self.ssid, self._psk)
+        elif state in _CS_BUSY and time.ticks_diff(time.ticks_ms(), self._deadline) < 0:
+            self.state = state
+        else:
+            self.state = state if state not in _CS_BUSY else CS_TIMEOUT
+            net_state.invalidate()
+            try:
+                with _radio_lock:
+                    wlan.disconnect()
+            except Exception:
+                pass
+        return self.state
+
+    def cancel(self) -> None:
+        """放棄進行中的連線。"""
+        if self.busy:
+            try:
+                with _radio_lock:
+                    wlan.disconnect()
+            except Exception:
+                pass
+        self.state = CS_IDLE
+        net_state.invalidate()
+
+    def info(self) -> dict:
+        return {"ssid": self.ssid, "state": self.state, "status": self.status}
+
+
+# 只有一顆無線晶片：LCD、網頁與自動重連共用同一個連線器
+connector = WifiConnector()
+
+
+def _rc_join(now) -> None:
+    """送出一次重連（不等待結果）：依序輪流使用各設定檔；
+    第一輪指定上次的 BSSID/頻道（掃描快取較新則優先），讓晶片不必先做完整掃描，之後改為不指定。"""
+    global _rc_state, _rc_profile
+    lst = wifi_profiles.profiles()
+    p = lst[_rc_index % len(lst)]
+    bssid, channel = None, 0
+    if _rc_failures < len(lst):
+        bssid, channel = _scan_lookup(p["ssid"])
+        if bssid is None:
+            bssid, channel = wifi_profiles.bssid_bytes(p), p["channel"]
+    _rc_profile = p
+    print("auto-reconnect: joining %s%s" % (p["ssid"], " (known BSSID)" if bssid else ""))
+    connector.start(p["ssid"], p["psk"], bssid, channel, owner="auto", save=False)
+    if connector.busy:
+        _rc_state = RC_JOINING
+    else:
+        _rc_fail(now, connector.state)
+
+
+def _rc_fail(now, why) -> None:
+    """本次嘗試失敗：換下一個設定檔，並以加抖動的指數退避排定下一次。"""
+    global _rc_state, _rc_next_ms, _rc_failures, _rc_index
+    _rc_failures += 1
+    _rc_index += 1
+    shift = _rc_failures - 1 if _rc_failures < 8 else 7
+    delay = BACKOFF_MIN_MS << shift
+    if delay > BACKOFF_MAX_MS:
+        delay = BACKOFF_MAX_MS
+    # 一半固定、一半隨機，避免多台閘道器在 AP 重開後同時湧入
+    half = delay >> 1
+    delay = half + random.getrandbits(16) % (half + 1)
+    _rc_state = RC_WAIT
+    _rc_next_ms = time.ticks_add(now, delay)
+    print("auto-reconnect: %s failed (%s), retry in %d ms" % (_rc_profile["ssid"] if _rc_profile else "?", why, delay))
+
+
+def auto_reconnect():
+    """非阻塞：主迴圈每輪呼叫。STA 斷線（或開機尚未連線）時依已存設定檔重連，失敗以指數退避重試；
+    使用者（LCD/網頁）連線進行中時暫停。剛連上回 True、剛斷線回 False，其餘回 None。"""
+    global _rc_state, _rc_next_ms, _rc_poll_ms, _rc_failures, _rc_index
+    if not WIFI_AUTO_RECONNECT:
+        return None
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _rc_poll_ms) < 0:
+        return None
+    _rc_poll_ms = time.ticks_add(now, RECONNECT_POLL_MS)
+
+    if _rc_state == RC_JOINING and connector.owner == "auto":
+        # 連線進度由主迴圈的 connector.step() 推進，這裡只讀結果
+        if connector.busy:
+            return None
+        if connector.state == CS_CONNECTED:
+            p = _rc_profile
+            print("auto-reconnect: connected to", p["ssid"])
+            metrics.inc(metrics.WIFI_RECONNECTS)
+            _remember_link(p["ssid"], p["psk"])
+            _rc_state = RC_UP
+            _rc_failures = 0
+            return True
+        _rc_fail(now, connector.state)
+        return None
+    if connector.busy:
+        return None
+
+    try:
+        st = wlan.status()
+    except Exception:
+        return None
+    if st == network.STAT_GOT_IP:
+        if _rc_state == RC_UP:
+            return None
+        net_state.invalidate()
+        _rc_state = RC_UP
+        _rc_failures = 0
+        return True
+    if _rc_state == RC_UP:
+        print("STA link lost (status %d), reconnecting" % st)
+        metrics.inc(metrics.WIFI_LINK_LOST)
+        net_state.invalidate()
+        _rc_next_ms = now
+        _rc_failures = 0
+        _rc_index = 0
+        _rc_state = RC_WAIT
         return False
-    return wlan.isconnected()
+    # 重連被使用者的連線取代且未成功：回到等待
+    _rc_state = RC_WAIT
+
+    if time.ticks_diff(now, _rc_next_ms) < 0 or not wifi_profiles.profiles():
+        return None
+    if _ap_enabled and _station_seen > 0:
+        # 有手機連在設定 AP 上（可能正在輸入新密碼）：先不重連，避免 STA 掃描/換頻道讓 AP 斷線
+        return None
+    _rc_join(now)
+    return None
 
 
 def read_status():
     """取得連線狀態資訊，方便 UI 顯示。"""
-    info = {
-        "active": False,
-        "connected": False,
-        "ifconfig": (),
-        "rssi": None,
+    st = net_state.get()
+    return {
+        "active": st.sta_active,
+        "connected": st.sta_connected,
+        "ifconfig": st.ifconfig,
+        "rssi": st.rssi,
         "ap_active": _ap_enabled,
         "ap_essid": _ap_config.get("essid", ""),
+        "connect": connector.info(),
     }
-    try:
-        info["active"] = wlan.active()
-        info["connected"] = wlan.isconnected()
-        info["ifconfig"] = wlan.ifconfig()
-        try:
-            info["rssi"] = wlan.status("rssi")
-        except Exception:
-            info["rssi"] = None
-    except Exception:
-        pass
-    return info
 
 
 def start_config_ap(essid: str = "PicoSetup", password: str = "") -> bool:
@@ -128,6 +564,7 @@ def start_config_ap(essid: str = "PicoSetup", password: str = "") -> bool:
         ap.config(**cfg)
         _ap_enabled = True
         _ap_config = {"essid": essid, "password": password}
+        net_state.invalidate()
         print("Config AP started:", essid)
         _ensure_captive_dns()
         return True
@@ -145,10 +582,11 @@ def stop_config_ap() -> None:
     except Exception:
         pass
     _ap_enabled = False
+    net_state.invalidate()
 
 
 def ap_station_count() -> int:
-    """回傳目前連上的 STA 數量（AP mode）。"""
+    """回傳目前連上的 STA 數量（AP mode）；呼叫端需持有 _radio_lock。"""
     global _last_stations
     try:
         stas = ap.status("stations")
@@ -163,12 +601,29 @@ def ap_station_count() -> int:
         return 0
 
 
-def wait_for_station(min_count: int = 1, timeout_ms=None, poll_ms: int = 500) -> bool:
-    """等待有裝置連上 AP；預設不超時。"""
-    t0 = time.ticks_ms()
-    while True:
-        if ap_station_count() >= min_count:
-            return True
-        if timeout_ms is not None and time.ticks_diff(time.ticks_ms(), t0) > timeout_ms:
-            return False
-        time.sleep_ms(poll_ms)
+def watch_ap_stations():
+    """非阻塞：主迴圈每輪呼叫，AP 上的裝置數改變時印出並回傳新數量，否則回 None。"""
+    global _station_seen, _station_next_ms
+    if not _ap_enabled:
+        return None
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _station_next_ms) < 0:
+        return None
+    if not _radio_lock.acquire(0):
+        # 另一核心正在使用無線晶片：這輪跳過，下一輪再查
+        return None
+    try:
+        n = ap_station_count()
+        net_state.ap_stations = n
+    finally:
+        _radio_lock.release()
+    _station_next_ms = time.ticks_add(now, STATION_POLL_MS)
+    if n == _station_seen:
+        return None
+    if n > _station_seen:
+        print("Device connected to AP. STA count:", n)
+    else:
+        print("Device left AP. STA count:", n)
+    _station_seen = n
+    return n
+
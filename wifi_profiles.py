@@ -0,0 +1,115 @@
+# wifi_profiles.py - 已連線過的 Wi-Fi 設定檔（SSID/密碼/上次的 BSSID 與頻道），存在 flash 的 JSON 檔
+# 最近一次成功連線的排在最前面，開機或斷線後由 wifi_Scan_Connect 依序自動重連。
+# 注意：密碼以明文存放（Pico 沒有安全儲存區），需要時可用 forget() 或刪除檔案清除；
+# 密碼只在本模組與 WifiConnector 內使用，/wifi/status、SYS WIFI、狀態頁都不輸出。
+
+import json
+import os
+
+PROFILE_FILE = "wifi_profiles.json"
+MAX_PROFILES = 5
+
+_profiles = None  # [{"ssid", "psk", "bssid"(hex 字串或 ""), "channel"}, ...]，第一次使用時才讀檔
+
+
+_TMP_FILE = PROFILE_FILE + ".tmp"
+
+
+def _read(path):
+    """讀一個設定檔 JSON；檔案不存在或內容損壞回 None。"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, list) else None
+
+
+def _load():
+    global _profiles
+    if _profiles is not None:
+        return _profiles
+    _profiles = []
+    data = _read(PROFILE_FILE)
+    if data is None:
+        # 正式檔不見或損壞：改名前斷電時，完整的新內容還留在暫存檔
+        data = _read(_TMP_FILE) or []
+    for p in data:
+        if isinstance(p, dict) and p.get("ssid"):
+            _profiles.append(
+                {
+                    "ssid": p["ssid"],
+                    "psk": p.get("psk", ""),
+                    "bssid": p.get("bssid", ""),
+                    "channel": p.get("channel", 0),
+                }
+            )
+    return _profiles
+
+
+def _save() -> None:
+    """先寫暫存檔再改名蓋過正式檔（littlefs 的 rename 是原子操作），任何時間點斷電都至少留下一份完整檔案。"""
+    try:
+        with open(_TMP_FILE, "w") as f:
+            json.dump(_profiles, f)
+        try:
+            os.rename(_TMP_FILE, PROFILE_FILE)
+        except OSError:
+            # FAT 等不允許覆蓋的檔案系統：先刪再改名，中間斷電由 _load 讀暫存檔補救
+            os.remove(PROFILE_FILE)
+            os.rename(_TMP_FILE, PROFILE_FILE)
+    except OSError as e:
+        print("wifi profile save failed:", e)
+
+
+def profiles() -> list:
+    """所有設定檔（最近成功的在前）；回傳的是內部清單，請勿修改。"""
+    return _load()
+
+
+def get(ssid: str):
+    for p in _load():
+        if p["ssid"] == ssid:
+            return p
+    return None
+
+
+def bssid_bytes(p):
+    """設定檔內記錄的 BSSID（6 bytes）；沒有記錄回 None。"""
+    h = p.get("bssid") or ""
+    if len(h) != 12:
+        return None
+    try:
+        return bytes(int(h[i : i + 2], 16) for i in range(0, 12, 2))
+    except ValueError:
+        return None
+
+
+def bssid_hex(bssid) -> str:
+    """6 bytes BSSID -> "a42bb0fe019c"（設定檔內的存放格式）；None 為空字串。"""
+    return "".join("%02x" % b for b in bssid) if bssid else ""
+
+
+def remember(ssid: str, psk: str, bssid=None, channel: int = 0) -> None:
+    """連線成功後呼叫：新增或更新設定檔並移到最前面；內容與順序都沒變時不寫 flash。"""
+    lst = _load()
+    entry = {"ssid": ssid, "psk": psk, "bssid": bssid_hex(bssid), "channel": channel or 0}
+    if lst and lst[0] == entry:
+        return
+    for i, p in enumerate(lst):
+        if p["ssid"] == ssid:
+            lst.pop(i)
+            break
+    lst.insert(0, entry)
+    del lst[MAX_PROFILES:]
+    _save()
+
+
+def forget(ssid: str) -> bool:
+    lst = _load()
+    for i, p in enumerate(lst):
+        if p["ssid"] == ssid:
+            lst.pop(i)
+            _save()
+            return True
+    return False